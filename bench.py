@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+"""
+Host-side benchmarks for the AMAG ROM debugger.
+
+Usage: python3 bench.py read [--addr FC0000] [--length 4096] [--window 8]
+       python3 bench.py baud [--addr FC0000] [--length 16384] [--rates 9600,...]
+       python3 bench.py kprintf [--capture FILE] [--duration 60]
+       python3 bench.py ide [--capture FILE] [--duration 120]
+
+Start FS-UAE (make run) first; the benchmark connects to its serial port.
+kprintf needs a kernel built with make SERBENCH=1 and reads the result
+line it prints at boot (or from a serial capture). ide does the same for
+the IDEBENCH lines of a ROM built with make rom IDE_BENCH=1.
+"""
+
+import argparse
+import asyncio
+import re
+import sys
+import time
+
+from debugger_client import (open_debugger, DebuggerError, DEFAULT_HOST, DEFAULT_PORT,
+                             PIPELINE_WINDOW, PROMPT, LINE_SIZE, BIN_FRAME, BIN_HEADER,
+                             BAUD_RATES, DEFAULT_BAUD)
+from memtrace import read_file, read_live
+
+BAUD = 9600
+CHARS_PER_SEC = BAUD / 10   # 8N1: start + 8 data + stop bits
+
+# serbench.c times with CIA-B TOD, which counts PAL horizontal lines
+CPU_HZ = 7093790
+TOD_HZ = 15625
+_SERBENCH_RE = re.compile(rb'SERBENCH lines=(\d+) bytes=(\d+) baud=(\d+) poll=(\d+) '
+                          rb'ring=(\d+) drain=(\d+) waits=(\d+)')
+
+# ide_bench in src/rom/ide.s
+SECTOR_SIZE = 512
+_IDEBENCH_RE = re.compile(rb'IDEBENCH (?:mode=(\w+) (?:block=(\d+) sectors=(\d+) ticks=(\d+)'
+                          rb'|failed at LBA (\d+))|done)\r?\n')
+
+
+async def line_wire_bytes(dbg, addr):
+    """Bytes the ROM sends back for one m.l line (echo, dump and prompt)"""
+    dbg.send(f'm.l {addr:X}')
+    await dbg.writer.drain()
+    reply = await dbg.read_until(PROMPT)
+    return len(reply) + len(PROMPT)
+
+
+async def timed_read(dbg, addr, length, window):
+    dbg.cache.clear()
+    start = time.perf_counter()
+    data = await dbg.read_memory(addr, length, window)
+    return data, time.perf_counter() - start
+
+
+async def bench_read(args):
+    """Time read_memory pipelined, one command per round trip, cached, and read_binary"""
+    dbg = await open_debugger(args.host, args.port, attempts=10, retry_delay=1)
+    async with dbg:
+        await dbg.sync(timeout=10)
+
+        wire = await line_wire_bytes(dbg, args.addr)
+        ceiling = CHARS_PER_SEC / wire * LINE_SIZE
+
+        print(f"Reading {args.length} bytes at ${args.addr:08X}")
+        print(f"  {wire} bytes on the wire per {LINE_SIZE}-byte line")
+        print(f"  {BAUD} baud ceiling: {ceiling:8.1f} bytes/s")
+
+        results = {}
+        for window in sorted({1, args.window}):
+            data, elapsed = await timed_read(dbg, args.addr, args.length, window)
+            results[window] = data
+            rate = len(data) / elapsed if elapsed else 0
+            print(f"  window {window:3d}:      {rate:8.1f} bytes/s  ({elapsed:.2f}s, "
+                  f"{100 * rate / ceiling:.0f}% of {BAUD} baud)")
+
+        # Second pass over the same range is served from the page cache
+        start = time.perf_counter()
+        cached = await dbg.read_memory(args.addr, args.length, args.window)
+        elapsed = time.perf_counter() - start
+        stats = dbg.cache.stats()
+        print(f"  cached:          {elapsed * 1000:8.1f} ms  ({stats['hits']} hits, "
+              f"{stats['misses']} misses, {stats['bytes_saved']} bytes not re-read)")
+        results['cached'] = cached
+
+        # cmd_binary: 11 bytes of framing per 256-byte frame, plus ACKs
+        start = time.perf_counter()
+        results['binary'] = await dbg.read_binary(args.addr, args.length)
+        elapsed = time.perf_counter() - start
+        rate = args.length / elapsed if elapsed else 0
+        ceiling = binary_ceiling(BAUD, args.length)
+        print(f"  binary:          {rate:8.1f} bytes/s  ({elapsed:.2f}s, "
+              f"{100 * rate / ceiling:.0f}% of {BAUD} baud)")
+
+        if len(set(results.values())) != 1:
+            print("✗ FAIL: pipelined, serial and binary reads returned different data")
+            return 1
+    return 0
+
+
+def binary_ceiling(baud, length):
+    """Payload bytes/s read_binary could reach at baud (8N1, framing included)"""
+    frames = -(-length // BIN_FRAME)
+    return baud / 10 * length / (length + frames * (BIN_HEADER + 4))
+
+
+async def bench_baud(args):
+    """read_binary throughput at each serial speed cmd_baud supports"""
+    dbg = await open_debugger(args.host, args.port, attempts=10, retry_delay=1)
+    async with dbg:
+        await dbg.sync(timeout=10)
+        print(f"read_binary of {args.length} bytes at ${args.addr:08X}")
+        print(f"{'baud':>8}{'bytes/s':>11}{'ceiling':>10}{'':>6}  switch")
+        reference = None
+        failed = False
+        for rate in args.rates:
+            start = time.perf_counter()
+            switched = await dbg.set_baud(rate)
+            switch_time = time.perf_counter() - start
+            if not switched:
+                print(f"{rate:8d}  ✗ no answer at this rate, still at {dbg.baud}")
+                failed = True
+                continue
+            start = time.perf_counter()
+            data = await dbg.read_binary(args.addr, args.length)
+            elapsed = time.perf_counter() - start
+            rate_seen = args.length / elapsed if elapsed else 0
+            ceiling = binary_ceiling(rate, args.length)
+            print(f"{rate:8d}{rate_seen:11.1f}{ceiling:10.1f}{100 * rate_seen / ceiling:5.0f}%"
+                  f"  {switch_time * 1000:.0f} ms")
+            if reference is None:
+                reference = data
+            elif data != reference:
+                print(f"✗ FAIL: data read at {rate} baud differs")
+                failed = True
+        await dbg.set_baud(DEFAULT_BAUD)
+    return 1 if failed else 0
+
+
+def serbench_result(chunks):
+    """Fields of the first SERBENCH result line in a byte stream, or None"""
+    seen = b''
+    for chunk in chunks:
+        seen = seen[-200:] + chunk
+        match = _SERBENCH_RE.search(seen)
+        if match:
+            names = ('lines', 'bytes', 'baud', 'poll', 'ring', 'drain', 'waits')
+            return dict(zip(names, (int(group) for group in match.groups())))
+    return None
+
+
+async def bench_kprintf(args):
+    """CPU time a kprintf burst costs its caller, polled vs. ring buffer"""
+    try:
+        chunks = (read_file(args.capture) if args.capture
+                  else read_live(args.host, args.port, args.duration))
+        result = serbench_result(chunks)
+    except OSError as e:
+        print(f"Error: {e}")
+        return 1
+    if not result:
+        print("No SERBENCH line (kernel not built with make SERBENCH=1?)")
+        return 1
+
+    def ms(ticks):
+        return 1000 * ticks / TOD_HZ
+
+    def cycles(ticks):
+        return ticks * CPU_HZ // TOD_HZ
+
+    wire = 1000 * result['bytes'] * 10 / result['baud']
+    poll, ring = result['poll'], result['ring']
+    print(f"kprintf burst: {result['lines']} lines, {result['bytes']} bytes "
+          f"at {result['baud']} baud ({wire:.1f} ms on the wire)")
+    print(f"  polled:      {ms(poll):8.1f} ms {cycles(poll):12,d} cycles in kprintf")
+    print(f"  ring buffer: {ms(ring):8.1f} ms {cycles(ring):12,d} cycles in kprintf, "
+          f"then {ms(result['drain']):.1f} ms draining")
+    back = poll - ring
+    print(f"  given back:  {cycles(back):,d} cycles ({100 * back / poll if poll else 0:.1f}%), "
+          f"{cycles(back) // result['lines']:,d} per line")
+    if result['waits']:
+        print(f"✗ ring buffer filled {result['waits']} times, the burst did not fit")
+        return 1
+    if ring >= poll:
+        print("✗ FAIL: buffered kprintf was no faster than polled")
+        return 1
+    print("✓ kprintf returns before the bytes are sent")
+    return 0
+
+
+def idebench_results(chunks):
+    """IDEBENCH lines up to 'done' in a byte stream: list of dicts, or None"""
+    seen = b''
+    results = []
+    for chunk in chunks:
+        seen += chunk
+        while True:
+            match = _IDEBENCH_RE.search(seen)
+            if not match:
+                seen = seen[-200:]
+                break
+            seen = seen[match.end():]
+            mode, block, sectors, ticks, failed = match.groups()
+            if not mode:
+                return results
+            if failed:
+                results.append({'mode': mode.decode(), 'failed': int(failed)})
+            else:
+                results.append({'mode': mode.decode(), 'block': int(block),
+                                'sectors': int(sectors), 'ticks': int(ticks)})
+    return None
+
+
+async def bench_ide(args):
+    """Boot-time IDE throughput per transfer mode, from the ROM's IDEBENCH lines"""
+    try:
+        chunks = (read_file(args.capture) if args.capture
+                  else read_live(args.host, args.port, args.duration))
+        results = idebench_results(chunks)
+    except OSError as e:
+        print(f"Error: {e}")
+        return 1
+    if not results:
+        print("No IDEBENCH lines (ROM not built with make rom IDE_BENCH=1?)")
+        return 1
+
+    failed = False
+    base = None
+    for r in results:
+        if 'failed' in r:
+            print(f"✗ {r['mode']:<9} read failed at LBA {r['failed']} (image under 4MB?)")
+            failed = True
+            continue
+        secs = r['ticks'] / TOD_HZ
+        rate = r['sectors'] * SECTOR_SIZE / 1024 / secs if secs else 0
+        base = base or rate
+        print(f"  {r['mode']:<9} block {r['block']:>3}: {r['sectors']} sectors in "
+              f"{1000 * secs:8.1f} ms {rate:8.1f} KB/s {rate / base if base else 0:5.2f}x")
+    if failed:
+        return 1
+    if len(results) < 3:
+        print("  (drive refused READ MULTIPLE, no multiple pass)")
+    print("✓ IDE benchmark complete")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    sub = parser.add_subparsers(dest='bench', required=True)
+
+    read = sub.add_parser('read', help='bulk memory read throughput')
+    read.add_argument('--addr', type=lambda s: int(s.lstrip('$'), 16), default=0xFC0000)
+    read.add_argument('--length', type=int, default=4096)
+    read.add_argument('--window', type=int, default=PIPELINE_WINDOW)
+    read.set_defaults(func=bench_read)
+
+    baud = sub.add_parser('baud', help='binary read throughput at each serial speed')
+    baud.add_argument('--addr', type=lambda s: int(s.lstrip('$'), 16), default=0xFC0000)
+    baud.add_argument('--length', type=int, default=16384)
+    baud.add_argument('--rates', type=lambda s: [int(r) for r in s.split(',')],
+                      default=BAUD_RATES)
+    baud.set_defaults(func=bench_baud)
+
+    kprintf = sub.add_parser('kprintf', help='CPU cycles the TX ring buffer gives back')
+    kprintf.add_argument('--capture', help='raw serial capture instead of the live port')
+    kprintf.add_argument('--duration', type=float, default=60,
+                         help='seconds to wait for the result line')
+    kprintf.set_defaults(func=bench_kprintf)
+
+    ide = sub.add_parser('ide', help='IDE read throughput per transfer mode')
+    ide.add_argument('--capture', help='raw serial capture instead of the live port')
+    ide.add_argument('--duration', type=float, default=120,
+                     help='seconds to wait for the result lines')
+    ide.set_defaults(func=bench_ide)
+
+    args = parser.parse_args()
+    try:
+        return asyncio.run(args.func(args))
+    except (DebuggerError, OSError) as e:
+        print(f"Error: {e}")
+        return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
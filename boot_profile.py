@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+"""
+Boot timeline profiler: where does boot time go?
+
+Usage: python3 boot_profile.py [--runs 3] [--stub] [--config configs/a600.fs-uae]
+                               [--baseline FILE] [--update-baseline]
+
+Starts an emulator instance (see emulator.py), stamps every serial line
+with a monotonic clock as it arrives and maps the lines to boot phases.
+Each phase starts at its first marker line and lasts until the next phase
+starts, so it covers the ROM work done between the two messages plus the
+time to send them at 9600 baud.
+
+Runs are saved as JSON. Against a baseline (another saved file) the median
+of each phase is compared and a phase that got slower by more than
+--threshold is reported as a regression (exit status 1).
+
+The ROM also times the kernel load and, for a kernel packed by
+pack_kernel.py, the unpacking, without the serial output in between.
+Those are reported next to the phases; against a baseline booted with
+the other kind of kernel they show whether the saved reads beat the
+decode time.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import re
+import statistics
+import sys
+import time
+
+from debugger_client import wait_ready, DebuggerError, DEFAULT_HOST
+from emulator import Emulator, DEFAULT_CONFIG, DEFAULT_WORKDIR, BASE_PORT
+
+PROFILE_DIR = 'build/boot_profile'
+BASELINE = os.path.join(PROFILE_DIR, 'baseline.json')
+BOOT_TIMEOUT = 60           # Seconds from launch to the end of boot
+QUIET_TIMEOUT = 10          # Seconds without output before giving up
+THRESHOLD = 0.20            # Slowdown that counts as a regression
+MIN_DELTA = 0.05            # Seconds; ignore jitter on short phases
+
+# (phase, first line of the phase), in boot order. 'startup' runs from the
+# emulator launch to the first byte on the serial port.
+PHASES = [
+    ('startup', None),
+    ('autoconfig', 'Autoconfig: Scanning'),     # configure_zorro_ii
+    ('memory', 'Autoconfig: Done'),             # build_memory_table, serial_init
+    ('banner', 'AMAG ROM'),                     # print_memory_map, init_display
+    ('rdb', 'RDB:'),                            # find_rdb
+    ('partition', 'PART:'),                     # load_partition
+    ('fat16', 'FAT16:'),                        # load_system_bin
+    ('unpack', 'UNPACK:'),                      # unpack_kernel (packed kernels)
+    ('kernel', 'Jumping to kernel'),            # kernel startup up to kprintf
+]
+
+# Timers the ROM prints, in CIA-B TOD ticks (PAL lines)
+ROM_TIMERS = [
+    ('load', re.compile(r'FAT16: \d+ IDE commands, \d+ sectors, (\d+) ticks')),
+    ('unpack', re.compile(r'UNPACK: Done in (\d+) ticks')),
+]
+TOD_HZ = 15625
+
+# Lines that end the boot: the kernel is up, or the ROM gave up and
+# entered the debugger
+END_MARKERS = ('Kernel starting successfully!', 'AMAG Debugger')
+
+
+def split_lines(pending, chunk, stamp, lines):
+    """Append complete lines in pending+chunk to lines as (stamp, text)
+
+    The ROM ends lines with either LF CR or CR LF, so any run of line
+    breaks is one separator. Returns the unterminated tail.
+    """
+    pending += chunk.replace(b'\r', b'\n')
+    *complete, pending = pending.split(b'\n')
+    for raw in complete:
+        text = raw.decode('ascii', errors='replace').strip()
+        if text:
+            lines.append((stamp, text))
+    return pending
+
+
+async def capture(dbg, started, timeout=BOOT_TIMEOUT):
+    """Timestamped serial lines from launch to an end marker
+
+    Returns (lines, end) with times in seconds since launch; end is None
+    if the boot never got there.
+    """
+    lines = []
+    pending = bytes(dbg.buffer)
+    dbg.buffer.clear()
+    deadline = started + timeout
+    while True:
+        for stamp, text in lines:
+            if text.startswith(END_MARKERS):
+                return lines, stamp
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return lines, None
+        try:
+            chunk = await asyncio.wait_for(dbg.reader.read(4096),
+                                           min(remaining, QUIET_TIMEOUT))
+        except asyncio.TimeoutError:
+            return lines, None
+        if not chunk:
+            return lines, None
+        pending = split_lines(pending, chunk, time.monotonic() - started, lines)
+
+
+def phase_times(lines, end):
+    """{phase: seconds} for the phases seen between launch and end
+
+    A phase only moves forward: a marker for an earlier phase (the kernel
+    printing 'Memory' for instance) stays in the current one.
+    """
+    current, since = 0, 0.0
+    times = {}
+    for stamp, text in lines:
+        if end is not None and stamp > end:
+            break
+        for index in range(current + 1, len(PHASES)):
+            if text.startswith(PHASES[index][1]):
+                times[PHASES[current][0]] = stamp - since
+                current, since = index, stamp
+                break
+        if text.startswith(END_MARKERS):
+            break
+    if end is not None:
+        times[PHASES[current][0]] = end - since
+    return times
+
+
+def rom_timers(lines):
+    """{timer: seconds} from the ROM's own timing lines"""
+    timers = {}
+    for _, text in lines:
+        for name, pattern in ROM_TIMERS:
+            match = pattern.search(text)
+            if match:
+                timers[name] = int(match.group(1)) / TOD_HZ
+    return timers
+
+
+async def profile_once(args):
+    """Boot one emulator and return the run as a dict"""
+    emulator = Emulator(0, args.config, args.workdir, args.base_port, args.stub)
+    await emulator.start()
+    try:
+        dbg, _ = await wait_ready(DEFAULT_HOST, emulator.port, until='connect',
+                                  timeout=BOOT_TIMEOUT, started=emulator.started)
+        try:
+            lines, end = await capture(dbg, emulator.started)
+        finally:
+            await dbg.close()
+    finally:
+        await emulator.stop()
+    return {
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'config': args.config,
+        'stub': args.stub,
+        'complete': end is not None,
+        'total': end,
+        'phases': phase_times(lines, end),
+        'rom': rom_timers(lines),
+        'lines': [[round(stamp, 4), text] for stamp, text in lines],
+    }
+
+
+def medians(runs):
+    """Median seconds per phase over the complete runs"""
+    complete = [run for run in runs if run['complete']] or runs
+    result = {}
+    for phase, _ in PHASES:
+        samples = [run['phases'][phase] for run in complete if phase in run['phases']]
+        if samples:
+            result[phase] = statistics.median(samples)
+    totals = [run['total'] for run in complete if run['total'] is not None]
+    if totals:
+        result['total'] = statistics.median(totals)
+    return result
+
+
+def rom_medians(runs):
+    """Median seconds per ROM timer over the complete runs"""
+    complete = [run for run in runs if run['complete']] or runs
+    result = {}
+    for name, _ in ROM_TIMERS:
+        samples = [run['rom'][name] for run in complete if name in run.get('rom', {})]
+        if samples:
+            result[name] = statistics.median(samples)
+    return result
+
+
+def report_rom(current, baseline=None):
+    """Print the ROM's load timers; compare packed and raw kernel boots"""
+    if not current:
+        return
+    print()
+    header = f"{'rom timer':<12}{'time':>10}"
+    if baseline:
+        header += f"{'baseline':>11}"
+    print(header)
+    for name, _ in ROM_TIMERS:
+        if name in current:
+            row = f"{name:<12}{1000 * current[name]:8.1f}ms"
+            if baseline and name in baseline:
+                row += f"{1000 * baseline[name]:9.1f}ms"
+            print(row)
+    if not baseline or 'load' not in current or 'load' not in baseline:
+        return
+    if ('unpack' in current) == ('unpack' in baseline):
+        return
+    packed, raw = (current, baseline) if 'unpack' in current else (baseline, current)
+    saved = raw['load'] - packed['load']
+    cost = packed['unpack']
+    mark = "✓" if saved > cost else "✗"
+    print(f"{mark} Packed kernel: {1000 * saved:.1f}ms less loading, "
+          f"{1000 * cost:.1f}ms unpacking ({1000 * (saved - cost):+.1f}ms net)")
+
+
+def load_runs(path):
+    with open(path) as f:
+        return json.load(f)['runs']
+
+
+def save_runs(path, runs):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump({'runs': runs}, f, indent=1)
+
+
+def report(current, baseline=None, threshold=THRESHOLD):
+    """Print the phase table; return the phases that regressed"""
+    total = current.get('total') or sum(current.values())
+    regressed = []
+    header = f"{'phase':<12}{'time':>9}{'share':>7}"
+    if baseline:
+        header += f"{'baseline':>10}{'change':>9}"
+    print(header)
+    for phase in [name for name, _ in PHASES] + ['total']:
+        if phase not in current:
+            continue
+        seconds = current[phase]
+        row = f"{phase:<12}{seconds:8.2f}s{100 * seconds / total if total else 0:6.0f}%"
+        if baseline and phase in baseline:
+            before = baseline[phase]
+            change = (seconds - before) / before if before else 0.0
+            row += f"{before:9.2f}s{100 * change:+8.0f}%"
+            if change > threshold and seconds - before > MIN_DELTA:
+                row += "  ✗ REGRESSION"
+                regressed.append(phase)
+        print(row)
+    return regressed
+
+
+async def profile(args):
+    runs = []
+    for number in range(1, args.runs + 1):
+        run = await profile_once(args)
+        runs.append(run)
+        status = f"{run['total']:.2f}s" if run['complete'] else "did not finish"
+        print(f"Run {number}/{args.runs}: {status}")
+
+    path = args.save or os.path.join(PROFILE_DIR, time.strftime('run-%Y%m%d-%H%M%S.json'))
+    save_runs(path, runs)
+    print(f"Saved {len(runs)} run(s) to {path}\n")
+
+    if not any(run['complete'] for run in runs):
+        print("✗ FAIL: no run reached the end of boot; last lines:")
+        for stamp, text in runs[-1]['lines'][-5:]:
+            print(f"  {stamp:8.3f}s  {text}")
+        return 1
+
+    baseline = rom_baseline = None
+    if os.path.exists(args.baseline) and not args.update_baseline:
+        baseline_runs = load_runs(args.baseline)
+        baseline = medians(baseline_runs)
+        rom_baseline = rom_medians(baseline_runs)
+    regressed = report(medians(runs), baseline, args.threshold)
+    report_rom(rom_medians(runs), rom_baseline)
+
+    if args.update_baseline:
+        save_runs(args.baseline, runs)
+        print(f"\nBaseline updated: {args.baseline}")
+    elif baseline is None:
+        print(f"\nNo baseline at {args.baseline} (use --update-baseline)")
+    elif regressed:
+        print(f"\n✗ {len(regressed)} phase(s) slower than the baseline: {', '.join(regressed)}")
+        return 1
+    else:
+        print("\n✓ No phase regressed")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Profile the boot sequence from serial output")
+    parser.add_argument('--runs', type=int, default=3, help='boots to profile')
+    parser.add_argument('--config', default=DEFAULT_CONFIG)
+    parser.add_argument('--workdir', default=DEFAULT_WORKDIR)
+    parser.add_argument('--base-port', type=int, default=BASE_PORT)
+    parser.add_argument('--stub', action='store_true',
+                        help='use debugger_stub.py instead of FS-UAE')
+    parser.add_argument('--save', metavar='FILE', help=f'run file (default: {PROFILE_DIR}/run-*.json)')
+    parser.add_argument('--baseline', metavar='FILE', default=BASELINE)
+    parser.add_argument('--update-baseline', action='store_true',
+                        help='store these runs as the new baseline')
+    parser.add_argument('--threshold', type=float, default=THRESHOLD,
+                        help='slowdown that counts as a regression (0.2 = 20%%)')
+    args = parser.parse_args()
+
+    try:
+        return asyncio.run(profile(args))
+    except (DebuggerError, OSError) as e:
+        print(f"Error: {e}")
+        return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
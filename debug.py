@@ -2,115 +2,143 @@
 """
 Interactive Amiga Debugger
 Launches FS-UAE and provides interactive serial debugging session.
+
+Usage: python3 debug.py [--baud 115200] [--no-symbols]
+
+--baud switches the ROM debugger's serial speed once it is up (the `s`
+command), and stays at 9600 if the new rate does not answer.
+
+Addresses in the output that fall inside kick.rom or SYSTEM.BIN are
+followed by their symbol, e.g. PC:$00FC1262 <debugger_entry+$C> (see
+symbols.py). That includes the hits of the ROM's `f` search command;
+scripts get them as a list from debugger_client's find().
+
+`d <addr> [count]` is handled here rather than by the ROM: it disassembles
+count (decimal, default 16) instructions at addr from one binary read,
+and a bare `d` carries on where the last listing stopped. Decoded code
+is kept until an m write, r change or g may have altered it (see
+disasm68k.py).
 """
 
-import socket
-import subprocess
+import argparse
+import asyncio
 import sys
-import time
-import threading
-import select
 import os
 import signal
+import time
 import tty
 import termios
 
+from debugger_client import wait_ready, DebuggerError, PROMPT, BAUD_RATES, DEFAULT_BAUD
+from disasm68k import Disassembler, listing
+from symbols import load_symbols, StreamAnnotator
+
+READY_TIMEOUT = 60          # make run builds the ROM and deploys first
+ANNOTATE_IDLE = 0.05        # Print a held-back partial address after this long
+LOCAL_COMMANDS = ('d',)     # Run on the host; the ROM never sees them
+DISASM_COUNT = 16           # Instructions per d listing
+
 class AmigaDebugger:
-    def __init__(self):
+    def __init__(self, baud=None, symbols=True):
+        self.baud = baud
+        self.symbols = symbols
         self.fsuae_process = None
-        self.sock = None
+        self.launched = None
+        self.dbg = None
         self.running = False
-        self.reader_thread = None
-        self.prompt_ready = threading.Event()  # Signals when Amiga prompt is seen
+        self.reader_task = None
+        self.annotator = None
+        self.disasm = None
+        self.disasm_next = None     # Where a bare d continues
+        self.prompt_ready = asyncio.Event()  # Set each time the Amiga prompt is seen
 
-    def start_emulator(self):
+    async def start_emulator(self):
         """Start FS-UAE in the background"""
         print("Starting FS-UAE emulator...")
-        self.fsuae_process = subprocess.Popen(
-            ['make', 'run'],
-            stdout=subprocess.DEVNULL,
-            stderr=subprocess.DEVNULL,
-            preexec_fn=os.setsid  # Create new process group for clean shutdown
+        self.launched = time.monotonic()
+        self.fsuae_process = await asyncio.create_subprocess_exec(
+            'make', 'run',
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.DEVNULL,
+            start_new_session=True  # Create new process group for clean shutdown
         )
 
-        # Wait for emulator to start and serial port to be ready
-        print("Waiting for emulator to initialize...", end='', flush=True)
-        for i in range(6):
-            time.sleep(0.5)
-            print('.', end='', flush=True)
-        print(" OK")
-
-    def connect_serial(self):
-        """Connect to the serial port"""
-        print("Connecting to serial port (localhost:5555)...", end='', flush=True)
-        max_attempts = 5
-        for attempt in range(max_attempts):
-            try:
-                self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                self.sock.connect(('localhost', 5555))
-                print(" Connected!")
-                return True
-            except ConnectionRefusedError:
-                if attempt < max_attempts - 1:
-                    print('.', end='', flush=True)
-                    time.sleep(1)
-                else:
-                    print(" Failed!")
-                    return False
-        return False
-
-    def read_serial_output(self):
-        """Thread function to continuously read and display serial output"""
-        self.sock.settimeout(0.1)
-        buffer = []  # Accumulate text to check for debugger banner
+    async def connect_serial(self):
+        """Connect to the serial port as soon as the ROM is up"""
+        print("Waiting for the Amiga on localhost:5555...", end='', flush=True)
+        try:
+            # Stop at the debugger banner; the reader task prints the boot log
+            self.dbg, progress = await wait_ready(until='debugger', timeout=READY_TIMEOUT,
+                                                  started=self.launched)
+        except (DebuggerError, OSError) as e:
+            print(f" Failed! ({e})")
+            return False
+        print(f" Connected! ({progress})")
+        return True
+
+    async def switch_baud(self):
+        """Negotiate self.baud before handing the line to the user"""
+        print(self.dbg.boot_log or await self.dbg.sync(READY_TIMEOUT), end='', flush=True)
+        print(f"\nSwitching to {self.baud} baud...", end='', flush=True)
+        if await self.dbg.set_baud(self.baud):
+            print(" ✓")
+        else:
+            print(f" ✗ no answer, staying at {DEFAULT_BAUD}")
+        # Fresh prompt for the reader task
+        self.dbg.send('')
+        await self.dbg.writer.drain()
+
+    async def read_serial_output(self):
+        """Task that continuously reads and displays serial output"""
+        tail = b''  # Last few bytes, to spot a prompt split across chunks
+        annotator = self.annotator
 
         while self.running:
             try:
-                data = self.sock.recv(4096)
-                if data:
-                    text = data.decode('ascii', errors='replace')
-                    # Print without newline if it doesn't end with one
-                    print(text, end='', flush=True)
-                    # Signal when we see the prompt after the debugger banner
-                    if not self.prompt_ready.is_set():
-                        buffer.append(text)
-                        combined = ''.join(buffer[-10:])  # Keep last 10 chunks to limit memory
-                        # Look for various prompt patterns
-                        # Debug: uncomment to see what we're looking for
-                        # if 'Debugger' in text:
-                        #     print(f"\n[DEBUG] Received: {repr(combined[-50:])}\n", flush=True)
-                        if ('> \n' in combined or combined.endswith('> ') or
-                            (combined.count('>') > 0 and combined.strip().endswith('>'))):
-                            self.prompt_ready.set()
+                if annotator and annotator.pending:
+                    # A '$' with too few digits so far: likely typed input
+                    try:
+                        data = await asyncio.wait_for(self.dbg.read_some(), ANNOTATE_IDLE)
+                    except asyncio.TimeoutError:
+                        print(annotator.flush(), end='', flush=True)
+                        continue
                 else:
-                    # Empty data means connection closed (FS-UAE quit)
-                    if self.running:
-                        print("\n\n[ERROR] Serial connection closed (FS-UAE may have quit)")
-                        self.running = False
-                    break
-            except socket.timeout:
-                continue
+                    data = await self.dbg.read_some()
             except Exception as e:
                 if self.running:
                     print(f"\n[Serial read error: {e}]")
                     self.running = False
                 break
 
-    def read_char(self):
-        """Read a single character in raw mode (no echo)"""
-        fd = sys.stdin.fileno()
-        old_settings = termios.tcgetattr(fd)
-        try:
-            tty.setraw(fd)
-            ch = sys.stdin.read(1)
-        finally:
-            termios.tcsetattr(fd, termios.TCSADRAIN, old_settings)
-        return ch
+            if not data:
+                # Empty data means connection closed (FS-UAE quit)
+                if self.running:
+                    print("\n\n[ERROR] Serial connection closed (FS-UAE may have quit)")
+                    self.running = False
+                break
 
-    def send_command(self, cmd):
+            text = data.decode('ascii', errors='replace')
+            print(annotator.feed(text) if annotator else text, end='', flush=True)
+            tail = (tail + data)[-len(PROMPT) * 2:]
+            if PROMPT in tail:
+                self.prompt_ready.set()
+                tail = b''
+
+    def load_annotator(self):
+        """StreamAnnotator over the built ROM and kernel, or None"""
+        if not self.symbols:
+            return None
+        symbols = load_symbols()
+        if not symbols.tables:
+            return None
+        print(f"[{len(symbols)} symbols loaded]")
+        return StreamAnnotator(symbols)
+
+    async def send_command(self, cmd):
         """Send a command to the debugger"""
         try:
-            self.sock.sendall(cmd.encode() + b'\n')
+            self.dbg.send(cmd)
+            await self.dbg.writer.drain()
         except (BrokenPipeError, ConnectionResetError):
             print("\n\n[ERROR] Serial connection lost (FS-UAE may have quit)")
             self.running = False
@@ -118,93 +146,207 @@ class AmigaDebugger:
             print(f"\n[ERROR] Failed to send command: {e}")
             self.running = False
 
-    def interactive_session(self):
+    async def open_stdin(self):
+        """Wrap stdin in an asyncio stream so input and output share one loop"""
+        loop = asyncio.get_running_loop()
+        reader = asyncio.StreamReader()
+        try:
+            await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), sys.stdin)
+        except ValueError:
+            # Regular file redirected to stdin: nothing to wait for
+            reader.feed_data(sys.stdin.buffer.read())
+            reader.feed_eof()
+        return reader
+
+    async def read_tty_command(self, stdin):
+        """Pass keystrokes through as typed; return (line, local) on Enter
+
+        A line starting with a local command is echoed here instead.
+        """
+        cmd = []
+        local = False
+        while True:
+            ch = (await stdin.read(1)).decode(errors='replace')
+            if not cmd:
+                local = ch.lower() in LOCAL_COMMANDS
+            if ch in ('\r', '\n'):
+                if local:
+                    print('\r\n', end='', flush=True)
+                else:
+                    self.dbg.writer.write(b'\r')  # Send CR to trigger command
+                break
+            elif ch in ('', '\x04'):  # Ctrl-D
+                raise EOFError
+            elif ch == '\x03':  # Ctrl-C
+                raise KeyboardInterrupt
+            elif ch in ('\x08', '\x7f'):  # Backspace: dbg_read_line erases too
+                if cmd:
+                    cmd.pop()
+                    if local:
+                        print('\b \b', end='', flush=True)
+                if not local:
+                    self.dbg.writer.write(ch.encode())
+            else:
+                cmd.append(ch)
+                if local:
+                    print(ch, end='', flush=True)
+                else:
+                    self.dbg.writer.write(ch.encode())  # Send char immediately
+        await self.dbg.writer.drain()
+        line = ''.join(cmd)
+        if not local:
+            self.dbg.typed(line)
+        return line, local
+
+    async def run_local(self, cmd, newline):
+        """Run a host-side command with the reader task paused"""
+        self.reader_task.cancel()
+        try:
+            await self.reader_task
+        except asyncio.CancelledError:
+            pass
+        if self.annotator and self.annotator.pending:
+            print(self.annotator.flush(), end='')
+        if newline == '\n':
+            print(cmd)              # Stands in for the ROM's echo
+
+        try:
+            for line in await self.disassemble(cmd.split()):
+                print(line, end=newline)
+        except ValueError:
+            print("Usage: d <addr> [count]", end=newline)
+        except DebuggerError as e:
+            print(f"✗ {e}", end=newline)
+        sys.stdout.flush()
+
+        # Fresh prompt, printed by the restarted reader
+        self.prompt_ready.clear()
+        self.reader_task = asyncio.create_task(self.read_serial_output())
+        await self.send_command('')
+
+    async def disassemble(self, args):
+        """Lines for d <addr> [count]"""
+        if args[0].lower() != 'd':
+            raise ValueError
+        args = args[1:]
+        if len(args) > 2 or (not args and self.disasm_next is None):
+            raise ValueError
+        addr = int(args[0].lstrip('$'), 16) if args else self.disasm_next
+        count = int(args[1]) if len(args) > 1 else DISASM_COUNT
+        if not 0 < count <= 256:
+            raise ValueError
+        if not self.disasm:
+            self.disasm = Disassembler(self.dbg)
+        data, base, insns = await self.disasm.disassemble(addr, count)
+        if insns:
+            self.disasm_next = insns[-1].addr + insns[-1].size
+        symbols = self.annotator.symbols if self.annotator else None
+        return list(listing(insns, data, base, symbols))
+
+    async def interactive_session(self):
         """Run interactive debugging session"""
-        # Start reader thread
+        # Start reader task
+        self.annotator = self.load_annotator()
         self.running = True
-        self.reader_thread = threading.Thread(target=self.read_serial_output, daemon=True)
-        self.reader_thread.start()
+        self.reader_task = asyncio.create_task(self.read_serial_output())
 
         # Wait for Amiga's initial prompt
-        if not self.prompt_ready.wait(timeout=10):
+        try:
+            await asyncio.wait_for(self.prompt_ready.wait(), timeout=10)
+        except asyncio.TimeoutError:
             print("\n[WARNING] Amiga prompt not detected, continuing anyway...")
 
+        is_tty = sys.stdin.isatty()
+        stdin = await self.open_stdin()
+        fd = sys.stdin.fileno()
+        old_settings = termios.tcgetattr(fd) if is_tty else None
+
         try:
+            if is_tty:
+                # Raw mode: keystrokes go straight to the Amiga, which echoes them
+                tty.setraw(fd)
+
             while self.running:
                 try:
-                    # Check if reader thread died (connection lost)
-                    if not self.reader_thread.is_alive():
-                        print("\n[ERROR] Connection lost, exiting...")
+                    # Check if reader task died (connection lost)
+                    if self.reader_task.done():
+                        print("\r\n[ERROR] Connection lost, exiting...")
                         break
 
                     # Read command from user
-                    if sys.stdin.isatty():
+                    if is_tty:
                         # Build command character by character in raw mode
-                        cmd = []
-                        while True:
-                            ch = self.read_char()
-                            if ch in ('\r', '\n'):
-                                self.sock.sendall(b'\r')  # Send CR to trigger command
-                                break
-                            elif ch == '\x04':  # Ctrl-D
-                                raise EOFError
-                            elif ch == '\x03':  # Ctrl-C
-                                raise KeyboardInterrupt
-                            else:
-                                cmd.append(ch)
-                                self.sock.sendall(ch.encode())  # Send char immediately
-                        cmd = ''.join(cmd)
+                        cmd, local = await self.read_tty_command(stdin)
                     else:
-                        cmd = sys.stdin.readline()
+                        cmd = (await stdin.readline()).decode(errors='replace')
                         if not cmd:
                             break
                         cmd = cmd.rstrip('\n')
+                        local = cmd[:1].lower() in LOCAL_COMMANDS
 
                     # Check for exit commands
                     if cmd.lower() in ['quit', 'exit', 'q']:
-                        print("\nExiting debugger...")
+                        print("\r\nExiting debugger...")
                         break
 
-                    # Send command (only for non-TTY mode, TTY already sent)
-                    if cmd and not sys.stdin.isatty():
-                        self.send_command(cmd)
+                    if local:
+                        await self.run_local(cmd, '\r\n' if is_tty else '\n')
+                        if not is_tty:
+                            try:
+                                await asyncio.wait_for(self.prompt_ready.wait(), timeout=10)
+                            except asyncio.TimeoutError:
+                                pass
+                        continue
 
-                    # Small delay to let output arrive
-                    time.sleep(0.1)
+                    # Send command (only for non-TTY mode, TTY already sent)
+                    if cmd and not is_tty:
+                        self.prompt_ready.clear()
+                        await self.send_command(cmd)
+                        # Pace piped input by the prompt rather than a delay
+                        try:
+                            await asyncio.wait_for(self.prompt_ready.wait(), timeout=10)
+                        except asyncio.TimeoutError:
+                            pass
 
                 except EOFError:
-                    print("\nExiting debugger...")
+                    print("\r\nExiting debugger...")
                     break
                 except KeyboardInterrupt:
-                    print("\nUse 'quit' to exit or Ctrl-D")
+                    print("\r\nUse 'quit' to exit or Ctrl-D")
                     continue
 
         finally:
             self.running = False
+            if old_settings is not None:
+                termios.tcsetattr(fd, termios.TCSADRAIN, old_settings)
 
-    def cleanup(self):
+    async def cleanup(self):
         """Clean up resources"""
         print("\nCleaning up...")
 
-        # Stop reader thread
+        # Stop reader task
         self.running = False
-        if self.reader_thread and self.reader_thread.is_alive():
-            self.reader_thread.join(timeout=1)
+        if self.reader_task and not self.reader_task.done():
+            self.reader_task.cancel()
+            try:
+                await self.reader_task
+            except asyncio.CancelledError:
+                pass
 
-        # Close socket
-        if self.sock:
+        # Close connection
+        if self.dbg:
             try:
-                self.sock.close()
+                await self.dbg.close()
             except:
                 pass
-            self.sock = None
+            self.dbg = None
 
         # Stop emulator
         if self.fsuae_process:
             try:
                 # Kill entire process group
                 os.killpg(os.getpgid(self.fsuae_process.pid), signal.SIGTERM)
-                self.fsuae_process.wait(timeout=2)
+                await asyncio.wait_for(self.fsuae_process.wait(), timeout=2)
             except:
                 try:
                     os.killpg(os.getpgid(self.fsuae_process.pid), signal.SIGKILL)
@@ -214,20 +356,23 @@ class AmigaDebugger:
 
         print("Done.")
 
-    def run(self):
+    async def run(self):
         """Main entry point"""
         try:
             # Start emulator
-            self.start_emulator()
+            await self.start_emulator()
 
             # Connect to serial
-            if not self.connect_serial():
+            if not await self.connect_serial():
                 print("Failed to connect to serial port!")
                 print("Make sure FS-UAE is configured correctly.")
                 return 1
 
+            if self.baud and self.baud != DEFAULT_BAUD:
+                await self.switch_baud()
+
             # Run interactive session
-            self.interactive_session()
+            await self.interactive_session()
 
             return 0
 
@@ -238,11 +383,18 @@ class AmigaDebugger:
             return 1
 
         finally:
-            self.cleanup()
+            await self.cleanup()
 
 
 def main():
     """Entry point"""
+    parser = argparse.ArgumentParser(description="Launch FS-UAE and debug over serial")
+    parser.add_argument('--baud', type=int, choices=BAUD_RATES,
+                        help='serial speed to switch the debugger to')
+    parser.add_argument('--no-symbols', dest='symbols', action='store_false',
+                        help='print addresses without symbol names')
+    args = parser.parse_args()
+
     # Check if ROM exists
     if not os.path.exists('src/rom/build/kick.rom'):
         print("Error: ROM not found at src/rom/build/kick.rom")
@@ -255,8 +407,8 @@ def main():
         return 1
 
     # Create and run debugger
-    debugger = AmigaDebugger()
-    return debugger.run()
+    debugger = AmigaDebugger(args.baud, args.symbols)
+    return asyncio.run(debugger.run())
 
 
 if __name__ == '__main__':
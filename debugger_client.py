@@ -0,0 +1,973 @@
+#!/usr/bin/env python3
+"""
+Client for the AMAG ROM debugger serial port.
+
+Every reply is framed by the prompt that debugger_main prints before it
+reads the next command line, so a round trip takes exactly as long as the
+ROM needs to answer - no fixed sleeps, no draining until a socket timeout.
+
+AsyncDebugger is the protocol implementation; one event loop can drive
+any number of emulator sessions. DebuggerClient wraps it for blocking use.
+"""
+
+import asyncio
+import re
+import time
+from collections import OrderedDict
+
+# debugger_main prints LF CR "> " before each command (.prompt in debugger.s)
+PROMPT = b'\n\r> '
+
+DEFAULT_HOST = 'localhost'
+DEFAULT_PORT = 5555
+DEFAULT_TIMEOUT = 5.0       # Per-command deadline in seconds
+
+# Commands kept in flight by read_memory. FS-UAE buffers socket input until
+# dbg_read_line polls for it; on a real UART the ROM would drop characters
+# that arrive while it is printing, so use window=1 there.
+PIPELINE_WINDOW = 8
+
+LINE_SIZE = 16              # Bytes per cmd_memory dump line
+
+# cmd_binary framing: SOH, length.w, address.l, data, sum2.w, sum1.w
+BIN_SOH = 0x01
+BIN_EOT = 0x04
+BIN_ACK = 0x06
+BIN_NAK = 0x15
+BIN_CANCEL = 0x18           # Anything but ACK/NAK ends the transfer
+BIN_FRAME = 256             # Max payload per frame
+BIN_HEADER = 7              # SOH, length, address
+BIN_RETRIES = 5             # Resends of one frame before giving up
+BIN_QUIET = 0.1             # Silence that means the ROM is waiting for ACK/NAK
+
+# cmd_crc: CRC-32 as zlib.crc32 computes it, at roughly this many bytes/s
+CRC_RATE = 80000
+
+# cmd_find: pattern bytes, default hit limit, and the slowest scan (masked
+# or aligned) in bytes/s; unmasked byte scans run about 350KB/s
+FIND_MAX_LEN = 32
+FIND_HITS = 16
+FIND_RATE = 150000
+FIND_SUFFIXES = {1: '', 2: '.w', 4: '.l'}
+LINE_MAX = 127              # dbg_read_line keeps this many characters
+
+# cmd_baud: rates in the ROM's baud_table, its marker and probe byte
+BAUD_RATES = [9600, 19200, 38400, 57600, 115200]
+DEFAULT_BAUD = 9600
+BAUD_SWITCHING = b'Switching baud\r\n'
+BAUD_PROBE = b'U'
+BAUD_SETTLE = 0.05          # Let the ROM reprogram SERPER before probing
+BAUD_REVERTED = 'No probe'  # cmd_baud gave up and went back to the old rate
+BAUD_PROBE_WAIT = 1.0       # How long it waits for the probe (BAUD_PROBE_LOOPS)
+BAUD_PROBE_TIMEOUT = 2 * BAUD_PROBE_WAIT
+
+# Boot stages after the serial port accepts a connection, in the order the
+# ROM prints their markers (bootstrap.s banner, debugger_main, prompt)
+BOOT_STAGES = [
+    ('rom', b'AMAG ROM'),
+    ('debugger', b'AMAG Debugger'),
+    ('prompt', PROMPT),
+]
+READY_TIMEOUT = 30.0        # Launch to prompt, including the memory test
+CONNECT_BACKOFF = (0.05, 0.5)   # First and longest delay between connects
+
+# Page cache geometry: 256-byte pages, 1024 of them (256KB) for RAM
+PAGE_SIZE = 256
+CACHE_PAGES = 1024
+
+ROM_START = 0xFC0000        # Kickstart ROM, never changes under a session
+ROM_END = 0x1000000
+IO_START = 0xA00000         # CIAs, Gayle and custom chips: never cached
+IO_END = 0xF80000
+DBG_WORK_START = 0x400      # ROM debugger's registers, stack and buffers: never cached
+DBG_WORK_END = 0x900
+SPRINTF_START = 0x3400      # SPRINTF_BUFFER, rewritten by every SerialPrintf: never cached
+SPRINTF_END = 0x3500
+UNCACHED_RAM = [(DBG_WORK_START, DBG_WORK_END), (SPRINTF_START, SPRINTF_END)]
+
+# Register names in the order panic_serial_output prints them
+REGISTER_NAMES = [f'D{i}' for i in range(8)] + [f'A{i}' for i in range(8)] + ['PC', 'SR']
+
+# Dump modes accepted by cmd_memory: suffix -> (item size, hex digits)
+DUMP_MODES = {'b': (1, 2), 'w': (2, 4), 'l': (4, 8)}
+
+_REGISTER_RE = re.compile(r'\b([DA][0-7]|PC|SR):\$([0-9A-Fa-f]+)')
+# cmd_memory prints ": " and then " XX" per item, so two spaces follow the colon
+_DUMP_RE = re.compile(r'\$([0-9A-Fa-f]{8}):((?: +[0-9A-Fa-f]+)+)')
+_LONG_DUMP_RE = re.compile(rb'\$([0-9A-F]{8}): +([0-9A-F]{8}) ([0-9A-F]{8}) ([0-9A-F]{8}) ([0-9A-F]{8})')
+_CRC_RE = re.compile(rb'CRC32 \$([0-9A-F]{8}) \$([0-9A-F]{8}) \$([0-9A-F]{8})')
+_FIND_HIT_RE = re.compile(r'^\$([0-9A-F]{8})$')
+_FOUND_RE = re.compile(r'Found (\d+)(?:, more from \$([0-9A-F]{8}))?')
+
+
+class DebuggerError(Exception):
+    """Protocol or connection failure talking to the ROM debugger"""
+
+
+class DebuggerTimeout(DebuggerError):
+    """No prompt arrived before the command deadline"""
+
+    def __init__(self, message, partial=b''):
+        super().__init__(message)
+        self.partial = partial
+
+
+def parse_registers(text):
+    """Parse panic_serial_output register dump into {name: value}"""
+    return {name.upper(): int(value, 16) for name, value in _REGISTER_RE.findall(text)}
+
+
+def parse_dump_line(text, size='b'):
+    """Parse one cmd_memory dump line; return (address, 16 bytes)"""
+    match = _DUMP_RE.search(text)
+    if not match:
+        raise DebuggerError(f"No memory dump in reply: {text.strip()!r}")
+    width, _ = DUMP_MODES[size]
+    data = b''.join(int(item, 16).to_bytes(width, 'big') for item in match.group(2).split())
+    return int(match.group(1), 16), data
+
+
+def frame_checksum(data):
+    """cmd_binary checksum over length, address and data: (sum2, sum1)"""
+    sum1 = sum2 = 0
+    for byte in data:
+        sum1 = (sum1 + byte) & 0xFFFF
+        sum2 = (sum2 + sum1) & 0xFFFF
+    return sum2, sum1
+
+
+def build_frame(addr, data):
+    """One cmd_binary frame, as the ROM sends it"""
+    body = len(data).to_bytes(2, 'big') + (addr & 0xFFFFFFFF).to_bytes(4, 'big') + data
+    sum2, sum1 = frame_checksum(body)
+    return bytes([BIN_SOH]) + body + sum2.to_bytes(2, 'big') + sum1.to_bytes(2, 'big')
+
+
+class PageCache:
+    """LRU cache of target memory pages; ROM pages are pinned"""
+
+    def __init__(self, page_size=PAGE_SIZE, capacity=CACHE_PAGES):
+        if page_size % LINE_SIZE:
+            raise ValueError(f"Page size must be a multiple of {LINE_SIZE}")
+        self.page_size = page_size
+        self.capacity = capacity
+        self.ram = OrderedDict()        # page address -> bytes, oldest first
+        self.rom = {}
+        self.hits = 0
+        self.misses = 0
+
+    def cacheable(self, addr, length):
+        """False if any part of the range is memory-mapped I/O or debugger state"""
+        if any(addr < end and addr + length > start for start, end in UNCACHED_RAM):
+            return False
+        return addr + length <= IO_START or (addr >= IO_END and addr + length <= ROM_END)
+
+    def get(self, page):
+        data = self.rom.get(page)
+        if data is None:
+            data = self.ram.get(page)
+            if data is not None:
+                self.ram.move_to_end(page)
+        if data is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return data
+
+    def put(self, page, data):
+        if ROM_START <= page < ROM_END:
+            self.rom[page] = data
+            return
+        self.ram[page] = data
+        self.ram.move_to_end(page)
+        while len(self.ram) > self.capacity:
+            self.ram.popitem(last=False)
+
+    def invalidate(self, addr, length=4):
+        """Drop the RAM pages overlapping a write"""
+        page = addr - addr % self.page_size
+        while page < addr + length:
+            self.ram.pop(page, None)
+            page += self.page_size
+
+    def invalidate_ram(self):
+        """Drop every RAM page (the target ran or was reconnected)"""
+        self.ram.clear()
+
+    def clear(self):
+        self.ram.clear()
+        self.rom.clear()
+        self.hits = self.misses = 0
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+            'bytes_saved': self.hits * self.page_size,
+            'ram_pages': len(self.ram),
+            'rom_pages': len(self.rom),
+        }
+
+
+def _parse_address(token):
+    try:
+        return int(token.lstrip('$'), 16)
+    except ValueError:
+        return None
+
+
+def parse_write(line):
+    """Return (addr, size) for an m <addr> <value> write, else None
+
+    addr is None when the ROM would reject the address.
+    """
+    args = line.split()
+    if len(args) < 3 or args[0].lower() not in ('m', 'm.b', 'm.w', 'm.l'):
+        return None
+    digits = len(args[2].lstrip('$'))
+    size = 1 if digits <= 2 else 2 if digits <= 4 else 4
+    return _parse_address(args[1]), size
+
+
+def is_ram(addr, length):
+    return addr + length <= IO_START
+
+
+class AsyncDebugger:
+    """Debugger session on an asyncio stream pair"""
+
+    def __init__(self, reader, writer, timeout=DEFAULT_TIMEOUT, cache=None):
+        self.reader = reader
+        self.writer = writer
+        self.timeout = timeout
+        self.buffer = bytearray()
+        self.cache = PageCache() if cache is None else cache
+        self.watchers = []          # More caches of target memory, e.g. disassembly
+        self.boot_log = ''          # Output before the first prompt (sync)
+        self.journal = None         # {page: bytes before the first write} when tracking
+        self.resumed = False        # Set once g has handed the CPU back
+        self.baud = DEFAULT_BAUD
+        # Called with a rate when our end of the line must follow a switch;
+        # a real UART sets it, FS-UAE's TCP serial port needs nothing
+        self.line_rate = None
+
+    async def close(self):
+        """Close the connection"""
+        if self.writer:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except OSError:
+                pass
+            self.writer = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    def send(self, line):
+        """Queue a command line without waiting for a reply"""
+        if not self.writer:
+            raise DebuggerError("Not connected")
+        # dbg_read_line ends the line on CR; a trailing LF would be read
+        # as a second, empty command and produce an extra prompt
+        self.writer.write(line.encode('ascii') + b'\r')
+        self._invalidate_for(line)
+
+    def typed(self, line):
+        """Account for a command line the user sent keystroke by keystroke"""
+        self._invalidate_for(line)
+
+    def _invalidate_for(self, line):
+        """Drop cached pages a command may change"""
+        args = line.split()
+        if not args:
+            return
+        cmd = args[0].lower()
+        if cmd == 'g':
+            self.resumed = True
+        caches = [cache for cache in [self.cache] + self.watchers if cache]
+        write = parse_write(line)
+        for cache in caches:
+            if write:
+                addr, size = write
+                if addr is not None:
+                    cache.invalidate(addr, size)
+            elif cmd == 'g' or (cmd == 'r' and len(args) >= 3):
+                # Resumed code, or a changed register it may act on, can write anywhere
+                cache.invalidate_ram()
+
+    async def _journal_range(self, addr, length):
+        """Save the original contents of RAM pages before the first write"""
+        if self.journal is None or not is_ram(addr, length):
+            return
+        page = addr - addr % PAGE_SIZE
+        while page < addr + length:
+            if page not in self.journal:
+                self.journal[page] = await self._read_lines(page, PAGE_SIZE, PIPELINE_WINDOW, None)
+            page += PAGE_SIZE
+
+    async def _fill(self, deadline, marker):
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise DebuggerTimeout(f"Timed out waiting for {marker!r}", bytes(self.buffer))
+        try:
+            chunk = await asyncio.wait_for(self.reader.read(4096), remaining)
+        except asyncio.TimeoutError:
+            raise DebuggerTimeout(f"Timed out waiting for {marker!r}", bytes(self.buffer)) from None
+        except OSError as e:
+            raise DebuggerError(f"Receive failed: {e}") from e
+        if not chunk:
+            raise DebuggerError("Connection closed (FS-UAE may have quit)")
+        self.buffer += chunk
+
+    async def peek_until(self, marker, timeout=None):
+        """Wait until marker is buffered; return its offset, consume nothing"""
+        if not self.writer:
+            raise DebuggerError("Not connected")
+        deadline = time.monotonic() + (self.timeout if timeout is None else timeout)
+        search_from = 0
+
+        while True:
+            pos = self.buffer.find(marker, search_from)
+            if pos >= 0:
+                return pos
+            # Only the tail can still complete a marker split across chunks
+            search_from = max(0, len(self.buffer) - len(marker) + 1)
+            await self._fill(deadline, marker)
+
+    async def read_until(self, marker, timeout=None):
+        """Read until marker arrives; return the bytes before it"""
+        pos = await self.peek_until(marker, timeout)
+        data = bytes(self.buffer[:pos])
+        del self.buffer[:pos + len(marker)]
+        return data
+
+    async def read_some(self):
+        """Return whatever output is buffered or arrives next (b'' on EOF)"""
+        if self.buffer:
+            data = bytes(self.buffer)
+            self.buffer.clear()
+            return data
+        return await self.reader.read(4096)
+
+    async def wait_prompt(self, timeout=None):
+        """Wait for the next prompt; return everything printed before it"""
+        data = await self.read_until(PROMPT, timeout)
+        return data.decode('ascii', errors='replace')
+
+    async def sync(self, timeout=None, poke_after=None):
+        """Get to a fresh prompt, even if the boot prompt was already consumed
+
+        Waits up to poke_after (default: the whole timeout) for a pending
+        prompt before asking for a new one.
+        """
+        try:
+            output = await self.wait_prompt(timeout if poke_after is None else poke_after)
+        except DebuggerTimeout:
+            # An empty line makes debugger_main print another prompt
+            self.send('')
+            output = await self.wait_prompt(timeout)
+        if not self.boot_log:
+            self.boot_log = output
+        return output
+
+    async def command(self, cmd, timeout=None):
+        """Run one command and return its output (echo and prompt removed)"""
+        if self.journal is not None:
+            write = parse_write(cmd)
+            if write and write[0] is not None:
+                await self._journal_range(*write)
+        self.send(cmd)
+        await self.writer.drain()
+        reply = await self.wait_prompt(timeout)
+        # dbg_read_line echoes every character it accepts
+        if reply.startswith(cmd):
+            reply = reply[len(cmd):]
+        return reply
+
+    async def registers(self):
+        """Return the saved register set as {name: value}"""
+        regs = parse_registers(await self.command('r'))
+        missing = [name for name in REGISTER_NAMES if name not in regs]
+        if missing:
+            raise DebuggerError(f"Register dump incomplete, missing {', '.join(missing)}")
+        return regs
+
+    async def set_reg(self, name, value):
+        """Set a saved register (D0-D7, A0-A7, PC, SR)"""
+        reply = await self.command(f'r {name} {value:X}')
+        if 'OK' not in reply:
+            raise DebuggerError(f"Setting {name} failed: {reply.strip()}")
+
+    async def read_mem(self, addr, size='b'):
+        """Dump 16 bytes at addr with m/m.w/m.l; never served from the cache"""
+        if size not in DUMP_MODES:
+            raise ValueError(f"Bad dump size {size!r}")
+        reply = await self.command(f'm.{size} {addr:X}')
+        line_addr, data = parse_dump_line(reply, size)
+        if line_addr != addr:
+            raise DebuggerError(f"Asked for ${addr:08X}, ROM dumped ${line_addr:08X}")
+        return data
+
+    async def read_memory(self, addr, length, window=PIPELINE_WINDOW, timeout=None):
+        """Read length bytes from addr, serving whole pages from the cache"""
+        if length <= 0:
+            return b''
+        cache = self.cache
+        if not cache or not cache.cacheable(addr, length):
+            return await self._read_lines(addr, length, window, timeout)
+
+        size = cache.page_size
+        first = addr - addr % size
+        last = -(-(addr + length) // size) * size
+        buf = bytearray(last - first)
+
+        run_start = None
+        for page in range(first, last + size, size):
+            data = cache.get(page) if page < last else None
+            if data is None and page < last:
+                if run_start is None:
+                    run_start = page
+                continue
+            if run_start is not None:
+                # Fetch each run of missing pages in one pipelined read
+                fetched = await self._read_lines(run_start, page - run_start, window, timeout)
+                buf[run_start - first:page - first] = fetched
+                for offset in range(0, len(fetched), size):
+                    cache.put(run_start + offset, fetched[offset:offset + size])
+                run_start = None
+            if data is not None:
+                buf[page - first:page - first + size] = data
+
+        offset = addr - first
+        return bytes(buf[offset:offset + length])
+
+    async def _read_lines(self, addr, length, window, timeout):
+        """Read length bytes from addr with pipelined m.l commands"""
+        start = addr & ~(LINE_SIZE - 1)       # m.l needs an even address
+        count = (addr + length - start + LINE_SIZE - 1) // LINE_SIZE
+        buf = bytearray(count * LINE_SIZE)
+
+        received = await self._dump_lines(start, count, buf, max(1, window), timeout)
+        missing = [index for index in range(count) if not received[index]]
+        if missing:
+            # Fetch lost or garbled lines again, one round trip each
+            await self.sync(timeout)
+            for index in missing:
+                line_addr = start + index * LINE_SIZE
+                buf[index * LINE_SIZE:(index + 1) * LINE_SIZE] = await self.read_mem(line_addr, 'l')
+
+        offset = addr - start
+        return bytes(buf[offset:offset + length])
+
+    async def _pipeline(self, commands, window, timeout):
+        """Run commands with up to window in flight; return their replies
+
+        A reply is None if its prompt never arrived; the caller resyncs.
+        """
+        replies = [None] * len(commands)
+        sent = 0
+        for index in range(len(commands)):
+            while sent < len(commands) and sent - index < window:
+                self.send(commands[sent])
+                sent += 1
+            await self.writer.drain()
+            try:
+                replies[index] = await self.read_until(PROMPT, timeout)
+            except DebuggerTimeout:
+                break
+        return replies
+
+    async def _dump_lines(self, start, count, buf, window, timeout):
+        """Dump count lines with pipelined m.l; flag each line received"""
+        received = bytearray(count)
+        commands = [f'm.l {start + index * LINE_SIZE:X}' for index in range(count)]
+        for reply in await self._pipeline(commands, window, timeout):
+            match = _LONG_DUMP_RE.search(reply) if reply else None
+            if not match:
+                continue
+            # Place by the address the ROM printed, not by arrival order
+            offset = int(match.group(1), 16) - start
+            index = offset // LINE_SIZE
+            if offset % LINE_SIZE or not 0 <= index < count:
+                continue
+            buf[offset:offset + LINE_SIZE] = bytes.fromhex(
+                b''.join(match.group(2, 3, 4, 5)).decode('ascii'))
+            received[index] = 1
+
+        return received
+
+    def _crc_timeout(self, length, timeout):
+        return (timeout or self.timeout) + length / CRC_RATE
+
+    async def crc32(self, addr, length, timeout=None):
+        """CRC-32 of length bytes at addr, computed by the ROM (cmd_crc)"""
+        return (await self.crc32_ranges([(addr, length)], 1, timeout))[0]
+
+    async def crc32_ranges(self, ranges, window=PIPELINE_WINDOW, timeout=None):
+        """CRC-32 of each (addr, length), with up to window c commands in flight"""
+        if not ranges:
+            return []
+        commands = [f'c {addr:X} {length:X}' for addr, length in ranges]
+        longest = max(length for _, length in ranges)
+        replies = await self._pipeline(commands, max(1, window),
+                                       self._crc_timeout(longest, timeout))
+        results = {}
+        for reply in replies:
+            match = _CRC_RE.search(reply) if reply else None
+            if match:
+                addr, length, crc = (int(group, 16) for group in match.groups())
+                results[addr, length] = crc
+        missing = [r for r in ranges if r not in results]
+        if missing:
+            # Lost or garbled replies: ask again, one round trip each
+            await self.sync(timeout)
+            for addr, length in missing:
+                reply = await self.command(f'c {addr:X} {length:X}',
+                                           self._crc_timeout(length, timeout))
+                match = _CRC_RE.search(reply)
+                if not match:
+                    raise DebuggerError(f"CRC of ${addr:08X}+{length:X} failed: {reply.strip()!r}")
+                results[addr, length] = int(match.group(3), 16)
+        return [results[r] for r in ranges]
+
+    async def find(self, start, end, pattern, align=1, mask=None, limit=FIND_HITS,
+                   timeout=None):
+        """Addresses in [start, end) where pattern is, searched by the ROM
+
+        pattern is bytes, or a str sent as typed text. align (1, 2 or 4)
+        only reports addresses that are multiples of it; mask has one
+        byte per pattern byte, set where memory must match. Stops after
+        limit hits (0 = all of them).
+        """
+        if isinstance(pattern, str):
+            pattern = pattern.encode('ascii')
+        if not 0 < len(pattern) <= FIND_MAX_LEN:
+            raise ValueError(f"Pattern must be 1-{FIND_MAX_LEN} bytes")
+        if align not in FIND_SUFFIXES:
+            raise ValueError(f"Bad alignment {align}")
+        if pattern.isascii() and pattern.decode('ascii').isprintable() and b'"' not in pattern:
+            arg = f'"{pattern.decode("ascii")}"'
+        else:
+            arg = pattern.hex().upper()
+        if mask is not None:
+            if len(mask) != len(pattern):
+                raise ValueError("Mask must be as long as the pattern")
+            arg += ' &' + bytes(mask).hex().upper()
+        if limit != FIND_HITS:
+            arg += f' #{limit}'
+        cmd = f'f{FIND_SUFFIXES[align]} {start:X} {end:X} {arg}'
+        if len(cmd) > LINE_MAX:
+            raise ValueError(f"Find command longer than the ROM's {LINE_MAX}-character line")
+
+        span = max(0, end - start)
+        reply = await self.command(cmd, (timeout or self.timeout) + span / FIND_RATE)
+        hits = []
+        for line in reply.splitlines():
+            match = _FIND_HIT_RE.match(line.strip())
+            if match:
+                hits.append(int(match.group(1), 16))
+        found = _FOUND_RE.search(reply)
+        if not found:
+            raise DebuggerError(f"Find failed: {reply.strip()!r}")
+        if int(found.group(1)) != len(hits):
+            raise DebuggerError(f"Find reported {found.group(1)} hits, {len(hits)} arrived")
+        return hits
+
+    async def _fill_to(self, count, deadline):
+        """Wait until at least count bytes are buffered"""
+        while len(self.buffer) < count:
+            await self._fill(deadline, 'binary frame')
+
+    async def _discard_frame(self):
+        """Drop the rest of a garbled frame: wait until the ROM goes quiet"""
+        self.buffer.clear()
+        while True:
+            try:
+                chunk = await asyncio.wait_for(self.reader.read(4096), BIN_QUIET)
+            except asyncio.TimeoutError:
+                return
+            if not chunk:
+                raise DebuggerError("Connection closed (FS-UAE may have quit)")
+
+    async def _binary_refusal(self, deadline):
+        """cmd_binary's error message, or None if a garbled frame is buffered
+
+        A message is printable text ending in a prompt. A frame is not,
+        and after one the ROM waits for ACK/NAK without printing more.
+        """
+        while True:
+            pos = self.buffer.find(PROMPT)
+            text = self.buffer if pos < 0 else self.buffer[:pos]
+            if not all(32 <= ch < 127 or ch in b'\r\n' for ch in text):
+                return None
+            if pos >= 0:
+                del self.buffer[:pos + len(PROMPT)]
+                return text.decode('ascii')
+            try:
+                await self._fill(min(deadline, time.monotonic() + BIN_QUIET), 'binary frame')
+            except DebuggerTimeout:
+                return None             # Quiet without a prompt: the ROM wants ACK/NAK
+
+    async def read_binary(self, addr, length, timeout=None, retries=BIN_RETRIES):
+        """Read length bytes from addr with cmd_binary frames
+
+        About 1.04 wire bytes per payload byte instead of ~4 for m.l
+        dumps. A frame with a bad checksum, length or address is asked for
+        again with NAK, up to retries times. Never served from the cache.
+        """
+        if length <= 0:
+            return b''
+        timeout = self.timeout if timeout is None else timeout
+        cmd = f'b {addr:X} {length:X}'
+        self.send(cmd)
+        await self.writer.drain()
+        await self.read_until(cmd.encode('ascii'), timeout)     # dbg_read_line echo
+
+        data = bytearray()
+        failures = 0
+        while True:
+            deadline = time.monotonic() + timeout
+            await self._fill_to(1, deadline)
+            if self.buffer[0] == BIN_EOT:
+                del self.buffer[:1]
+                await self.wait_prompt(timeout)
+                break
+            good = self.buffer[0] == BIN_SOH
+            if not good and not data and not failures:
+                # Bad arguments: cmd_binary printed a message instead
+                reply = await self._binary_refusal(deadline)
+                if reply is not None:
+                    raise DebuggerError(f"Binary read at ${addr:08X} failed: {reply.strip()}")
+
+            if good:
+                await self._fill_to(BIN_HEADER, deadline)
+                size = int.from_bytes(self.buffer[1:3], 'big')
+                frame_addr = int.from_bytes(self.buffer[3:7], 'big')
+                expected = min(BIN_FRAME, length - len(data))
+                good = size == expected and frame_addr == (addr + len(data)) & 0xFFFFFFFF
+            if good:
+                end = BIN_HEADER + size + 4
+                await self._fill_to(end, deadline)
+                frame = self.buffer[:end]
+                good = frame_checksum(frame[1:end - 4]) == (
+                    int.from_bytes(frame[end - 4:end - 2], 'big'),
+                    int.from_bytes(frame[end - 2:end], 'big'))
+            if good:
+                data += frame[BIN_HEADER:end - 4]
+                del self.buffer[:end]
+                failures = 0
+                self.writer.write(bytes([BIN_ACK]))
+                await self.writer.drain()
+                continue
+
+            failures += 1
+            await self._discard_frame()
+            if failures > retries:
+                self.writer.write(bytes([BIN_CANCEL]))
+                await self.writer.drain()
+                await self.wait_prompt(timeout)
+                raise DebuggerError(f"Frame at ${addr + len(data):08X} failed "
+                                    f"{failures} times, transfer cancelled")
+            self.writer.write(bytes([BIN_NAK]))
+            await self.writer.drain()
+        return bytes(data)
+
+    def _set_line_rate(self, rate):
+        if self.line_rate:
+            self.line_rate(rate)
+
+    async def set_baud(self, rate, timeout=None):
+        """Switch both ends of the serial line to rate with cmd_baud
+
+        Follows the ROM to the new rate, probes, and checks a full prompt
+        round trip at the new rate. Returns True if the switch held; on
+        any failure both ends are back at the old rate and it returns False.
+        """
+        if rate not in BAUD_RATES:
+            raise ValueError(f"Unsupported rate {rate} (one of {BAUD_RATES})")
+        if rate == self.baud:
+            return True
+        old = self.baud
+        timeout = self.timeout if timeout is None else timeout
+        self.send(f's {rate}')
+        await self.writer.drain()
+
+        deadline = time.monotonic() + timeout
+        while BAUD_SWITCHING not in self.buffer:
+            if PROMPT in self.buffer:
+                reply = await self.wait_prompt(timeout)
+                raise DebuggerError(f"Baud switch refused: {reply.strip()}")
+            await self._fill(deadline, BAUD_SWITCHING)
+        await self.read_until(BAUD_SWITCHING, timeout)
+
+        self._set_line_rate(rate)
+        await asyncio.sleep(BAUD_SETTLE)
+        self.writer.write(BAUD_PROBE)
+        await self.writer.drain()
+        try:
+            reply = await self.wait_prompt(BAUD_PROBE_TIMEOUT)
+        except DebuggerTimeout as e:
+            reply = e.partial.decode('ascii', errors='replace')
+        else:
+            if 'OK' in reply:
+                self.baud = rate
+                await self.command('', BAUD_PROBE_TIMEOUT)     # Verify a round trip
+                return True
+            if BAUD_REVERTED in reply:
+                self._set_line_rate(old)
+                return False
+
+        # Reply lost or garbled. The probe timeout outlasts the ROM's wait,
+        # so it has either taken the probe (new rate, "OK") or reverted
+        # (old rate, "No probe"). Go by whichever rate answers, and by the
+        # text where both do, as over FS-UAE's TCP port.
+        self._set_line_rate(old)
+        self.buffer.clear()
+        try:
+            reply += await self.sync(BAUD_PROBE_TIMEOUT, poke_after=BAUD_PROBE_TIMEOUT / 2)
+            if 'OK' not in reply or BAUD_REVERTED in reply:
+                return False
+        except DebuggerTimeout:
+            pass
+        self._set_line_rate(rate)
+        self.buffer.clear()
+        await self.sync(timeout, poke_after=BAUD_PROBE_TIMEOUT / 2)
+        self.baud = rate
+        return True
+
+    async def write_mem(self, addr, value, size='l'):
+        """Write a byte, word or long (cmd_memory sizes by digit count)"""
+        if size not in DUMP_MODES:
+            raise ValueError(f"Bad write size {size!r}")
+        _, digits = DUMP_MODES[size]
+        reply = await self.command(f'm {addr:X} {value:0{digits}X}')
+        if 'OK' not in reply:
+            raise DebuggerError(f"Write to ${addr:08X} failed: {reply.strip()}")
+
+    async def write_memory(self, addr, data, window=PIPELINE_WINDOW, timeout=None):
+        """Write data at addr with pipelined m writes, longs where aligned"""
+        await self._journal_range(addr, len(data))
+        commands = []
+        pos = 0
+        while pos < len(data):
+            here = addr + pos
+            # cmd_memory sizes the write by the number of digits given
+            size = 1 if here & 1 else min(4, len(data) - pos)
+            size = 2 if size == 3 else size
+            commands.append(f'm {here:X} {data[pos:pos + size].hex().upper()}')
+            pos += size
+        replies = await self._pipeline(commands, max(1, window), timeout)
+        for command, reply in zip(commands, replies):
+            if reply is None or b'OK' not in reply:
+                await self.sync(timeout)
+                raise DebuggerError(f"Write failed: {command}")
+
+    async def go(self, addr=None, timeout=None):
+        """Resume execution; the ROM prints no prompt until it is re-entered"""
+        self.send('g' if addr is None else f'g {addr:X}')
+        await self.writer.drain()
+        await self.read_until(b'Continuing...', timeout)
+
+
+async def open_debugger(host=DEFAULT_HOST, port=DEFAULT_PORT, timeout=DEFAULT_TIMEOUT,
+                        attempts=10, retry_delay=0.25, cache=None):
+    """Connect to the serial port, retrying while the emulator starts
+
+    Pass the previous session's cache to keep its ROM pages; RAM pages are
+    dropped because the target may have run while nobody was watching.
+    """
+    if cache is not None:
+        cache.invalidate_ram()
+    for attempt in range(attempts):
+        try:
+            reader, writer = await asyncio.wait_for(
+                asyncio.open_connection(host, port), timeout)
+            return AsyncDebugger(reader, writer, timeout, cache)
+        except (OSError, asyncio.TimeoutError):
+            if attempt == attempts - 1:
+                raise
+            await asyncio.sleep(retry_delay)
+
+
+class BootProgress:
+    """When each boot stage was reached, in seconds since launch"""
+
+    def __init__(self, started=None):
+        self.started = time.monotonic() if started is None else started
+        self.reached = {}           # stage -> seconds since started
+
+    def mark(self, stage):
+        self.reached[stage] = time.monotonic() - self.started
+
+    def durations(self):
+        """[(stage, seconds spent getting there from the previous stage)]"""
+        result = []
+        previous = 0.0
+        for stage, at in self.reached.items():
+            result.append((stage, at - previous))
+            previous = at
+        return result
+
+    def __str__(self):
+        stages = ', '.join(f"{stage} {seconds:.2f}s" for stage, seconds in self.durations())
+        total = max(self.reached.values(), default=0.0)
+        return f"{stages}; ready after {total:.2f}s"
+
+
+async def wait_ready(host=DEFAULT_HOST, port=DEFAULT_PORT, until='prompt',
+                     timeout=READY_TIMEOUT, started=None, fresh=True, cache=None):
+    """Connect as soon as the emulator listens and wait for a boot stage
+
+    Stages are 'connect' and then BOOT_STAGES; each counts as reached
+    only when its marker arrives. Waiting until 'prompt' leaves the
+    session ready for commands with the boot output in dbg.boot_log;
+    earlier stages leave everything buffered. With fresh=False the
+    machine is already at the prompt and printed its boot log to an
+    earlier connection. Returns (AsyncDebugger, BootProgress).
+    """
+    progress = BootProgress(started)
+    deadline = time.monotonic() + timeout
+    delay, longest = CONNECT_BACKOFF
+
+    while True:
+        try:
+            reader, writer = await asyncio.open_connection(host, port)
+            break
+        except OSError as e:
+            if time.monotonic() + delay > deadline:
+                raise DebuggerTimeout(f"Nothing listening on {host}:{port}: {e}") from None
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, longest)
+    progress.mark('connect')
+
+    if cache is not None:
+        cache.invalidate_ram()
+    dbg = AsyncDebugger(reader, writer, cache=cache)
+    try:
+        if not fresh:
+            await dbg.sync(min(dbg.timeout, max(0.0, deadline - time.monotonic())),
+                           poke_after=0.25)
+            progress.mark('prompt')
+            return dbg, progress
+        for stage, marker in BOOT_STAGES:
+            if until == 'connect':
+                break
+            remaining = max(0.0, deadline - time.monotonic())
+            if stage == 'prompt':
+                await dbg.sync(remaining)
+            else:
+                await dbg.peek_until(marker, remaining)
+            progress.mark(stage)
+            if stage == until:
+                break
+    except DebuggerError:
+        await dbg.close()
+        raise
+    return dbg, progress
+
+
+class DebuggerClient:
+    """Blocking wrapper that runs an AsyncDebugger on a private event loop"""
+
+    def __init__(self, host=DEFAULT_HOST, port=DEFAULT_PORT, timeout=DEFAULT_TIMEOUT):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.loop = asyncio.new_event_loop()
+        self.cache = PageCache()        # Survives reconnects
+        self.session = None
+
+    def _run(self, coro):
+        if not self.session:
+            coro.close()
+            raise DebuggerError("Not connected")
+        return self.loop.run_until_complete(coro)
+
+    @property
+    def connected(self):
+        return self.session is not None
+
+    def connect(self, attempts=10, retry_delay=0.25):
+        """Connect to the serial port, retrying while the emulator starts"""
+        self.session = self.loop.run_until_complete(
+            open_debugger(self.host, self.port, self.timeout, attempts, retry_delay, self.cache))
+        return True
+
+    def wait_ready(self, until='prompt', timeout=READY_TIMEOUT, started=None, fresh=True):
+        """Connect as soon as the emulator is up; return BootProgress"""
+        self.session, progress = self.loop.run_until_complete(
+            wait_ready(self.host, self.port, until, timeout, started, fresh, self.cache))
+        return progress
+
+    def close(self):
+        """Close the connection"""
+        if self.session:
+            self.loop.run_until_complete(self.session.close())
+            self.session = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def send(self, line):
+        self._run(self._send(line))
+
+    async def _send(self, line):
+        self.session.send(line)
+        await self.session.writer.drain()
+
+    def read_until(self, marker, timeout=None):
+        return self._run(self.session.read_until(marker, timeout))
+
+    def wait_prompt(self, timeout=None):
+        return self._run(self.session.wait_prompt(timeout))
+
+    def sync(self, timeout=None):
+        return self._run(self.session.sync(timeout))
+
+    def command(self, cmd, timeout=None):
+        return self._run(self.session.command(cmd, timeout))
+
+    def registers(self):
+        return self._run(self.session.registers())
+
+    def set_reg(self, name, value):
+        return self._run(self.session.set_reg(name, value))
+
+    def read_mem(self, addr, size='b'):
+        return self._run(self.session.read_mem(addr, size))
+
+    def read_memory(self, addr, length, window=PIPELINE_WINDOW, timeout=None):
+        return self._run(self.session.read_memory(addr, length, window, timeout))
+
+    def read_binary(self, addr, length, timeout=None, retries=BIN_RETRIES):
+        return self._run(self.session.read_binary(addr, length, timeout, retries))
+
+    def crc32(self, addr, length, timeout=None):
+        return self._run(self.session.crc32(addr, length, timeout))
+
+    def crc32_ranges(self, ranges, window=PIPELINE_WINDOW, timeout=None):
+        return self._run(self.session.crc32_ranges(ranges, window, timeout))
+
+    def find(self, start, end, pattern, align=1, mask=None, limit=FIND_HITS, timeout=None):
+        return self._run(self.session.find(start, end, pattern, align, mask, limit, timeout))
+
+    def set_baud(self, rate, timeout=None):
+        return self._run(self.session.set_baud(rate, timeout))
+
+    def write_mem(self, addr, value, size='l'):
+        return self._run(self.session.write_mem(addr, value, size))
+
+    def write_memory(self, addr, data, window=PIPELINE_WINDOW, timeout=None):
+        return self._run(self.session.write_memory(addr, data, window, timeout))
+
+    def go(self, addr=None, timeout=None):
+        return self._run(self.session.go(addr, timeout))
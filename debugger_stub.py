@@ -0,0 +1,614 @@
+#!/usr/bin/env python3
+"""
+Stand-in for the AMAG ROM debugger, for running the host tools without FS-UAE.
+
+Serves the debugger.s command set over TCP with the ROM's exact output
+formats. Memory is an image of what bootstrap.s leaves behind when it
+drops into the debugger without a boot disk: kick.rom at $FC0000 (or a
+synthetic header if it has not been built), 1MB chip RAM with the vector
+table and memory map filled in, and 1MB of fast RAM at $200000 (the
+board configs/*.fs-uae set up).
+
+The stub cannot execute 68000 code. After `g` it behaves as if the target
+went straight back into debugger_entry.
+
+Usage: python3 debugger_stub.py [--port 5555] [--rom src/rom/build/kick.rom]
+                                [--noise P]
+
+--noise garbles each binary transfer frame with probability P, to
+exercise the client's retransmits. Tests that need particular frames
+garbled set StubDebugger.garble instead.
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import re
+import struct
+import sys
+import time
+import zlib
+
+from debugger_client import (DEFAULT_PORT, REGISTER_NAMES, BIN_ACK, BIN_NAK, BIN_EOT,
+                             BIN_FRAME, BAUD_RATES, BAUD_PROBE, BAUD_PROBE_WAIT, BAUD_SWITCHING,
+                             build_frame)
+
+DEFAULT_ROM = 'src/rom/build/kick.rom'
+
+# Memory layout (hardware.i)
+CHIP_SIZE = 0x100000            # 1MB, mirrored up to $200000
+FAST_BASE = 0x200000
+FAST_SIZE = 0x100000            # fast_memory = 1024 in configs/*.fs-uae
+ROM_START = 0xFC0000
+ROM_SIZE = 0x40000
+
+REG_DUMP_AREA = 0x400           # saved_d0..saved_a7, saved_sr, saved_pc
+SAVED_SR = REG_DUMP_AREA + 0x40
+SAVED_PC = REG_DUMP_AREA + 0x44
+DBG_LAST_ADDR = 0x8D4
+MEMMAP_TABLE = 0x3250
+KERNEL_CHIP = 0x4000
+KERNEL_STACK = 0x2000
+
+MEM_TYPE_CHIP = 1
+MEM_TYPE_FAST = 2
+MEM_TYPE_ROM = 5
+MEM_TYPE_RESERVED = 6
+
+# Stand-ins for ROM labels the stub has no symbols for
+DEBUGGER_ENTRY = ROM_START + 0x1256
+HANDLER_BASE = ROM_START + 0x0400
+
+FIND_MAX_LEN = 32               # cmd_find
+FIND_HITS = 16
+FIND_CHUNK = 0x100000           # Bytes of memory searched per regex pass
+
+MEM_TYPE_NAMES = {
+    MEM_TYPE_RESERVED: 'Reserved',
+    MEM_TYPE_CHIP: 'Chip',
+    MEM_TYPE_FAST: 'Fast',
+    MEM_TYPE_ROM: 'ROM',
+}
+
+BANNER = b"\n\rAMAG Debugger v0.1\n\rType '?' for help\n\r"
+PROMPT = b'\n\r> '
+HELP_TEXT = (
+    b"\n\r"
+    b"Commands:\n\r"
+    b"  r              Display all registers\n\r"
+    b"  r <reg> <hex>  Set register (D0-D7,A0-A7,PC,SR)\n\r"
+    b"  m[.b] <addr>   Memory dump as bytes\n\r"
+    b"  m.w <addr>     Memory dump as words\n\r"
+    b"  m.l <addr>     Memory dump as longs\n\r"
+    b"  m <addr> <hex> Write memory (1-2=byte,3-4=word,5-8=long)\n\r"
+    b"  b <addr> <len> Binary memory transfer (host tools)\n\r"
+    b"  c <addr> <len> CRC32 of a memory range (host tools)\n\r"
+    b"  f[.w/.l] <start> <end> <hex|\"text\"> [&mask] [#hits]\n\r"
+    b"                 Search memory (end exclusive, #0 = all hits)\n\r"
+    b"  s <baud>       Switch serial speed (host tools)\n\r"
+    b"  g              Continue execution\n\r"
+    b"  g <addr>       Continue from address\n\r"
+    b"  ?              This help\n\r"
+)
+
+
+class MemoryImage:
+    """Sparse 24-bit address space: chip RAM, fast RAM and ROM"""
+
+    def __init__(self, rom=None):
+        self.chip = bytearray(CHIP_SIZE)
+        self.fast = bytearray(FAST_SIZE)
+        self.rom = bytearray(ROM_SIZE)
+        if rom:
+            self.rom[:len(rom)] = rom[:ROM_SIZE]
+        else:
+            # ROM header (bootstrap.s): SSP, PC, 'AMAG', version, flags
+            struct.pack_into('>LL4sHH', self.rom, 0, 0x3FFC, ROM_START + 0x10, b'AMAG', 1, 0)
+
+    def _locate(self, addr):
+        addr &= 0xFFFFFF
+        if addr < FAST_BASE:
+            return self.chip, addr % CHIP_SIZE
+        if addr < FAST_BASE + FAST_SIZE:
+            return self.fast, addr - FAST_BASE
+        if addr >= ROM_START:
+            return self.rom, addr - ROM_START
+        return None, 0              # I/O and unmapped space read as 0
+
+    def read(self, addr, length):
+        area, offset = self._locate(addr)
+        end_area, end = self._locate(addr + length - 1)
+        if area is not None and area is end_area and end == offset + length - 1:
+            return bytes(area[offset:offset + length])      # One area, no wrap
+        data = bytearray(length)
+        for i in range(length):
+            area, offset = self._locate(addr + i)
+            if area is not None:
+                data[i] = area[offset]
+        return bytes(data)
+
+    def write(self, addr, data):
+        for i, value in enumerate(data):
+            area, offset = self._locate(addr + i)
+            if area is not None and area is not self.rom:
+                area[offset] = value
+
+    def read_long(self, addr):
+        return struct.unpack('>L', self.read(addr, 4))[0]
+
+    def write_long(self, addr, value):
+        self.write(addr, struct.pack('>L', value & 0xFFFFFFFF))
+
+
+def build_image(rom=None):
+    """Memory as bootstrap.s leaves it when no boot disk is found"""
+    mem = MemoryImage(rom)
+
+    # install_exception_vectors: every vector from $08 points into the ROM
+    for vector in range(2, 256):
+        mem.write_long(vector * 4, HANDLER_BASE + vector * 4)
+
+    # build_memory_table
+    table = [
+        (0, KERNEL_CHIP, MEM_TYPE_RESERVED, 1),
+        (KERNEL_CHIP, CHIP_SIZE - KERNEL_CHIP, MEM_TYPE_CHIP, 1),
+        (FAST_BASE, FAST_SIZE - KERNEL_STACK, MEM_TYPE_FAST, 1),
+        (FAST_BASE + FAST_SIZE - KERNEL_STACK, KERNEL_STACK, MEM_TYPE_RESERVED, 1),
+        (ROM_START, ROM_SIZE, MEM_TYPE_ROM, 0),
+        (0, 0, 0, 0),
+    ]
+    for i, entry in enumerate(table):
+        mem.write(MEMMAP_TABLE + i * 12, struct.pack('>LLHH', *entry))
+
+    # debugger_entry: registers as the boot code left them
+    mem.write_long(REG_DUMP_AREA + 0x3C, 0x3FF0)                   # A7
+    mem.write(SAVED_SR, struct.pack('>H', 0x2700))
+    mem.write_long(SAVED_PC, DEBUGGER_ENTRY)
+    return mem
+
+
+def boot_log(mem):
+    """Serial output from reset up to debugger_main"""
+    lines = [b"AMAG ROM v0.1\n\r", b"Memory Map:\n\r"]
+    addr = MEMMAP_TABLE
+    while True:
+        base, size, mem_type, flags = struct.unpack('>LLHH', mem.read(addr, 12))
+        if base == 0 and size == 0:
+            break
+        name = MEM_TYPE_NAMES.get(mem_type, 'Unknown')
+        line = f"  ${base:08X}-${base + size - 1:08X}: {name} (${size >> 10:08X} KB)"
+        if flags & 1:
+            line += " [DMA]"
+        lines.append(line.encode('ascii') + b"\n\r")
+        addr += 12
+    lines.append(b"Boot success - GREEN SCREEN\n\r")
+    lines.append(b"RDB: Scanning blocks 0-15...\r\n")
+    lines.append(b"RDB: Not found in blocks 0-15\r\n")
+    return b''.join(lines)
+
+
+def parse_hex(text, pos):
+    """parse_hex: optional $, then hex digits; return (value, digits, pos)"""
+    if pos < len(text) and text[pos] == '$':
+        pos += 1
+    value = digits = 0
+    while pos < len(text) and text[pos].upper() in '0123456789ABCDEF':
+        value = ((value << 4) | int(text[pos], 16)) & 0xFFFFFFFF
+        digits += 1
+        pos += 1
+    return value, digits, pos
+
+
+def hex_bytes(text, pos):
+    """cmd_find's .hex_bytes: digit pairs; return (bytes or None, pos)"""
+    end = pos
+    while end < len(text) and text[end].upper() in '0123456789ABCDEF':
+        end += 1
+    digits = end - pos
+    if digits % 2 or digits > 2 * FIND_MAX_LEN:
+        return None, end
+    return bytes.fromhex(text[pos:end]), end
+
+
+def skip_whitespace(text, pos):
+    while pos < len(text) and text[pos] in ' \t':
+        pos += 1
+    return pos
+
+
+class BinaryTransfer:
+    """cmd_binary in progress: one frame out per ACK or NAK received"""
+
+    def __init__(self, mem, addr, length, noise=0.0, rng=None, garble=None):
+        self.mem = mem
+        self.addr = addr
+        self.remaining = length
+        self.noise = noise
+        self.rng = rng or random.Random()
+        self.garble = garble or {}
+        self.sent = 0               # Frames sent, resends included
+
+    def frame(self):
+        size = min(BIN_FRAME, self.remaining)
+        frame = bytearray(build_frame(self.addr, self.mem.read(self.addr, size)))
+        if self.sent in self.garble:
+            frame[self.garble[self.sent]] ^= 0x5A
+        elif self.noise and self.rng.random() < self.noise:
+            frame[self.rng.randrange(len(frame))] ^= 0x5A        # SOH included
+        self.sent += 1
+        return bytes(frame)
+
+    def reply(self, ch):
+        """Handle a host byte; return (output, finished)"""
+        if ch == BIN_NAK:
+            return self.frame(), False
+        if ch != BIN_ACK:
+            return b"Transfer cancelled", True
+        size = min(BIN_FRAME, self.remaining)
+        self.addr = (self.addr + size) & 0xFFFFFFFF
+        self.remaining -= size
+        if not self.remaining:
+            return bytes([BIN_EOT]), True
+        return self.frame(), False
+
+
+class BaudSwitch:
+    """cmd_baud waiting for the probe; other bytes are line noise"""
+
+    def __init__(self, debugger, rate):
+        self.debugger = debugger
+        self.rate = rate
+        self.deadline = time.monotonic() + BAUD_PROBE_WAIT
+
+    def reply(self, ch):
+        if ch != BAUD_PROBE[0]:
+            return b'', False
+        self.debugger.baud = self.rate
+        return b"OK", True
+
+    def expire(self):
+        return b"No probe, baud unchanged"
+
+
+class StubDebugger:
+    """debugger_main and its command handlers, on a MemoryImage"""
+
+    def __init__(self, mem, noise=0.0):
+        self.mem = mem
+        self.noise = noise
+        self.garble = {}            # Frame sent -> byte to garble, for each b
+        self.baud = BAUD_RATES[0]
+        self.transfer = None        # Command reading raw bytes (b, s) until it finishes
+
+    def enter(self):
+        """debugger_entry/debugger_main: reset state, print the banner"""
+        self.mem.write_long(DBG_LAST_ADDR, 0)
+        return BANNER
+
+    def register_offset(self, name):
+        if name in REGISTER_NAMES[:16]:
+            return REG_DUMP_AREA + REGISTER_NAMES.index(name) * 4
+        return {'PC': SAVED_PC, 'SR': SAVED_SR}.get(name)
+
+    def execute(self, line):
+        """parse_command; return (output, resumed)"""
+        pos = skip_whitespace(line, 0)
+        if pos == len(line):
+            return b'', False
+        cmd = line[pos].upper()
+        if cmd == 'R':
+            return self.cmd_registers(line), False
+        if cmd == 'M':
+            mode = 0
+            if line[pos + 1:pos + 2] == '.':
+                mode = {'W': 1, 'L': 2}.get(line[pos + 2:pos + 3].upper(), 0)
+            return self.cmd_memory(line, mode), False
+        if cmd == 'G':
+            return self.cmd_go(line)
+        if cmd == 'B':
+            return self.cmd_binary(line), False
+        if cmd == 'C':
+            return self.cmd_crc(line), False
+        if cmd == 'F':
+            return self.cmd_find(line), False
+        if cmd == 'S':
+            return self.cmd_baud(line), False
+        if cmd == '?':
+            return HELP_TEXT, False
+        return b"Unknown command (type ? for help)", False
+
+    def cmd_registers(self, line):
+        pos = skip_whitespace(line, 1)
+        if pos == len(line):
+            return self.register_dump()
+        # Only the first letter is folded to upper case, as in debugger.s
+        name = line[pos].upper() + line[pos + 1:pos + 2]
+        offset = self.register_offset(name)
+        if offset is None:
+            return b"Bad register name"
+        value, digits, _ = parse_hex(line, skip_whitespace(line, pos + 2))
+        if not digits:
+            return b"Bad hex value"
+        if name == 'SR':
+            self.mem.write(offset, struct.pack('>H', value & 0xFFFF))
+        else:
+            self.mem.write_long(offset, value)
+        return b"OK"
+
+    def register_dump(self):
+        """panic_serial_output"""
+        regs = [self.mem.read_long(REG_DUMP_AREA + i * 4) for i in range(16)]
+        out = "\n\r=== SYSTEM DEBUG ===\n\r"
+        for row in range(4):
+            prefix = 'DA'[row // 2]
+            first = (row % 2) * 4
+            out += ' '.join(f"{prefix}{first + i}:${regs[row * 4 + i]:08X}" for i in range(4))
+            out += "\n\r"
+        sr = struct.unpack('>H', self.mem.read(SAVED_SR, 2))[0]
+        out += f"PC:${self.mem.read_long(SAVED_PC):08X} SR:${sr:04X}\n\r"
+        return out.encode('ascii')
+
+    def cmd_memory(self, line, mode):
+        pos = line.upper().index('M') + 1
+        if line[pos:pos + 1] == '.':
+            pos += 2
+        pos = skip_whitespace(line, pos)
+        if pos == len(line):
+            addr = (self.mem.read_long(DBG_LAST_ADDR) + 16) & 0xFFFFFFFF
+        else:
+            addr, digits, pos = parse_hex(line, pos)
+            if not digits:
+                return b"Bad address"
+        self.mem.write_long(DBG_LAST_ADDR, addr)
+
+        pos = skip_whitespace(line, pos)
+        if pos < len(line):
+            value, digits, _ = parse_hex(line, pos)
+            if not digits:
+                return b"Bad value"
+            if digits <= 2:
+                self.mem.write(addr, bytes([value & 0xFF]))
+                return b"OK (byte)\r\n"
+            if digits <= 4:
+                self.mem.write(addr, struct.pack('>H', value & 0xFFFF))
+                return b"OK (word)\r\n"
+            self.mem.write_long(addr, value)
+            return b"OK (long)\r\n"
+
+        data = self.mem.read(addr, 16)
+        width = 1 << mode
+        items = ''.join(f" {int.from_bytes(data[i:i + width], 'big'):0{width * 2}X}"
+                        for i in range(0, 16, width))
+        return f"${addr & 0xFFFFFFFF:08X}: {items}".encode('ascii')
+
+    def cmd_binary(self, line):
+        pos = skip_whitespace(line, line.upper().index('B') + 1)
+        addr, digits, pos = parse_hex(line, pos)
+        if not digits:
+            return b"Bad address"
+        length, digits, _ = parse_hex(line, skip_whitespace(line, pos))
+        if not digits or not length:
+            return b"Bad length"
+        self.transfer = BinaryTransfer(self.mem, addr, length, self.noise, garble=self.garble)
+        return self.transfer.frame()
+
+    def cmd_crc(self, line):
+        pos = skip_whitespace(line, line.upper().index('C') + 1)
+        addr, digits, pos = parse_hex(line, pos)
+        if not digits:
+            return b"Bad address"
+        length, digits, _ = parse_hex(line, skip_whitespace(line, pos))
+        if not digits or not length:
+            return b"Bad length"
+        crc = zlib.crc32(self.mem.read(addr, length))
+        return f"CRC32 ${addr:08X} ${length:08X} ${crc:08X}".encode('ascii')
+
+    def cmd_find(self, line):
+        pos = line.upper().index('F') + 1
+        shift = 0
+        if line[pos:pos + 1] == '.':
+            shift = {'W': 1, 'L': 2}.get(line[pos + 1:pos + 2].upper(), 0)
+            pos += 2
+        start, digits, pos = parse_hex(line, skip_whitespace(line, pos))
+        if not digits:
+            return b"Bad address"
+        end, digits, pos = parse_hex(line, skip_whitespace(line, pos))
+        if not digits:
+            return b"Bad address"
+
+        pos = skip_whitespace(line, pos)
+        if line[pos:pos + 1] == '"':
+            close = line.find('"', pos + 1)
+            if close < 0:
+                return b"Bad pattern"
+            pattern = line[pos + 1:close].encode('latin-1')
+            pos = close + 1
+            if len(pattern) > FIND_MAX_LEN:
+                return b"Bad pattern"
+        else:
+            pattern, pos = hex_bytes(line, pos)
+        if not pattern:
+            return b"Bad pattern"
+
+        mask = b'\xFF' * len(pattern)
+        pos = skip_whitespace(line, pos)
+        if line[pos:pos + 1] == '&':
+            mask, pos = hex_bytes(line, pos + 1)
+            if mask is None or len(mask) != len(pattern):
+                return b"Bad mask"
+            pos = skip_whitespace(line, pos)
+        limit = FIND_HITS
+        if line[pos:pos + 1] == '#':
+            digits = pos + 1
+            pos = digits
+            while pos < len(line) and line[pos].isdigit():
+                pos += 1
+            if pos == digits:
+                return b"Bad hit count"
+            limit = int(line[digits:pos]) or None
+        if skip_whitespace(line, pos) < len(line):
+            return b"Bad pattern"
+
+        step = 1 << shift
+        first = (start + step - 1) & -step & 0xFFFFFFFF
+        last = end - len(pattern)
+        hits = []
+        for addr in self.find(first, last, pattern, mask, step):
+            hits.append(addr)
+            if len(hits) == limit:
+                break
+        out = ''.join(f"\n\r${addr:08X}" for addr in hits)
+        if limit and len(hits) == limit and hits[-1] + step <= last:
+            out += f"\n\rFound {len(hits)}, more from ${hits[-1] + step:08X}"
+        else:
+            out += f"\n\rFound {len(hits)}"
+        return out.encode('ascii')
+
+    def find(self, first, last, pattern, mask, step):
+        """Addresses from first to last (inclusive) where pattern matches"""
+        allowed = b''.join(
+            b'[' + b''.join(b'\\x%02x' % v for v in range(256) if v & m == p & m) + b']'
+            for p, m in zip(pattern, mask))
+        regex = re.compile(b'(?=' + allowed + b')', re.DOTALL)
+        addr = first
+        while addr <= last:
+            count = min(FIND_CHUNK, last - addr + 1)
+            data = self.mem.read(addr, count + len(pattern) - 1)
+            for match in regex.finditer(data):
+                if match.start() >= count:
+                    break
+                if match.start() % step == 0:
+                    yield addr + match.start()
+            addr += count
+
+    def cmd_baud(self, line):
+        pos = skip_whitespace(line, line.upper().index('S') + 1)
+        end = pos
+        while end < len(line) and line[end].isdigit():
+            end += 1
+        if end == pos or int(line[pos:end]) not in BAUD_RATES:
+            return b"Bad rate (9600 19200 38400 57600 115200)"
+        self.transfer = BaudSwitch(self, int(line[pos:end]))
+        return BAUD_SWITCHING
+
+    def cmd_go(self, line):
+        pos = skip_whitespace(line, line.upper().index('G') + 1)
+        if pos < len(line):
+            addr, digits, _ = parse_hex(line, pos)
+            if not digits:
+                return b"Bad address", False
+            self.mem.write_long(SAVED_PC, addr)
+        return b"Continuing...\n\r", True
+
+
+class StubServer:
+    """One emulated machine; like FS-UAE, it serves one connection at a time"""
+
+    def __init__(self, rom=None, noise=0.0):
+        self.mem = build_image(rom)
+        self.debugger = StubDebugger(self.mem, noise)
+        self.booted = False
+        self.lock = asyncio.Lock()
+
+    async def handle(self, reader, writer):
+        async with self.lock:
+            try:
+                await self.serve(reader, writer)
+            except (ConnectionError, OSError, asyncio.CancelledError):
+                pass                        # Client left or the server is shutting down
+            finally:
+                writer.close()
+
+    async def serve(self, reader, writer):
+        if not self.booted:
+            # The first client sees the boot log, as with serial_port .../wait
+            writer.write(boot_log(self.mem) + self.debugger.enter() + PROMPT)
+            self.booted = True
+
+        line = bytearray()
+        while True:
+            deadline = getattr(self.debugger.transfer, 'deadline', None)
+            try:
+                data = await asyncio.wait_for(
+                    reader.read(4096), None if deadline is None else deadline - time.monotonic())
+            except asyncio.TimeoutError:
+                # cmd_baud gave up on the probe
+                writer.write(self.debugger.transfer.expire() + PROMPT)
+                self.debugger.transfer = None
+                continue
+            if not data:
+                return
+            out = bytearray()
+            for ch in data:
+                transfer = self.debugger.transfer
+                if transfer:
+                    # cmd_binary and cmd_baud read raw bytes, not a line
+                    output, finished = transfer.reply(ch)
+                    out += output
+                    if finished:
+                        self.debugger.transfer = None
+                        out += PROMPT
+                    continue
+                if ch in (13, 10):
+                    output, resumed = self.debugger.execute(line.decode('latin-1'))
+                    out += output
+                    if self.debugger.transfer:
+                        line.clear()
+                        continue
+                    if resumed:
+                        # Nothing runs here; the target traps straight back
+                        self.mem.write_long(SAVED_PC, DEBUGGER_ENTRY)
+                        out += self.debugger.enter()
+                    out += PROMPT
+                    line.clear()
+                elif ch in (8, 127):
+                    if line:
+                        line.pop()
+                        out += b'\x08 \x08'
+                elif len(line) < 127:
+                    line.append(ch)
+                    out.append(ch)          # dbg_read_line echo
+            writer.write(bytes(out))
+            await writer.drain()
+
+
+def load_rom(path):
+    if path and os.path.exists(path):
+        with open(path, 'rb') as f:
+            return f.read()
+    return None
+
+
+async def start_stub(host='127.0.0.1', port=0, rom_path=DEFAULT_ROM, noise=0.0):
+    """Start a stub on host:port (0 = any free port); return (server, port)"""
+    stub = StubServer(load_rom(rom_path), noise)
+    server = await asyncio.start_server(stub.handle, host, port)
+    return server, server.sockets[0].getsockname()[1]
+
+
+async def serve_forever(args):
+    server, port = await start_stub(args.host, args.port, args.rom, args.noise)
+    source = args.rom if load_rom(args.rom) else 'synthetic ROM header'
+    print(f"Debugger stub on {args.host}:{port} ({source})")
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stand-in for the AMAG ROM debugger")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--rom', default=DEFAULT_ROM)
+    parser.add_argument('--noise', type=float, default=0.0,
+                        help='probability of garbling a binary frame')
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve_forever(args))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
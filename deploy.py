@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Incremental SYSTEM.BIN deploy into the boot HDF, without mtools.
+
+Usage: python3 deploy.py [harddrives/boot.hdf] [src/kernel/build/SYSTEM.BIN]
+                         [--lba N] [--dry-run]
+
+Finds the FAT16 volume the way the ROM does (see hdf.py), then rewrites
+only the clusters whose contents differ from the new kernel. When the
+size changes the chain is trimmed or extended, both FAT copies are
+updated, and the file is moved to one contiguous run if it would
+otherwise be fragmented, so load_system_bin reads it front to back.
+"""
+
+import argparse
+import struct
+import sys
+import time
+
+from hdf import (HDF, HDFError, open_volume, runs, name_83, BLOCK_SIZE,
+                 DEFAULT_IMAGE, SYSTEM_BIN, KERNEL_MAX_SIZE)
+
+DEFAULT_KERNEL = 'src/kernel/build/SYSTEM.BIN'
+FAT16_FREE = 0x0000
+FAT16_EOF = 0xFFFF
+ATTR_ARCHIVE = 0x20
+
+
+def contiguous_run(free, length, prefer=None):
+    """First cluster of `length` free clusters in a row, or None
+
+    Tries prefer first so a file that already sits in a suitable run
+    stays where it is.
+    """
+    if prefer is not None and all(prefer + i in free for i in range(length)):
+        return prefer
+    start, count = None, 0
+    for cluster in sorted(free):
+        if start is not None and cluster == start + count:
+            count += 1
+        else:
+            start, count = cluster, 1
+        if count == length:
+            return start
+    return None
+
+
+def plan_chain(fs, old_chain, needed):
+    """Clusters for a file of `needed` clusters, reusing old_chain if it can"""
+    fat = fs.fat()
+    free = {c for c in range(2, len(fat)) if fat[c] == FAT16_FREE} | set(old_chain)
+    start = contiguous_run(free, needed, old_chain[0] if old_chain else None)
+    if start is not None:
+        return list(range(start, start + needed))
+    # No run long enough: keep what we have, then first fit
+    chain = old_chain[:needed]
+    spare = sorted(free - set(chain))
+    if len(chain) + len(spare) < needed:
+        raise HDFError(f"Volume full: need {needed} clusters, "
+                       f"{len(chain) + len(spare)} available")
+    return chain + spare[:needed - len(chain)]
+
+
+def dos_datetime(when=None):
+    """(time, date) words for a FAT directory entry"""
+    t = time.localtime(when)
+    return ((t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2),
+            ((max(t.tm_year, 1980) - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday)
+
+
+def free_slot(fs):
+    """Image offset of the first unused root directory entry"""
+    bpb = fs.bpb
+    first = fs.lba + bpb.root_dir_start
+    entries = fs.hdf.block(first, bpb.root_dir_secs)
+    for offset in range(0, len(entries), 32):
+        if entries[offset] in (0x00, 0xE5):
+            return first * BLOCK_SIZE + offset
+    raise HDFError("Root directory is full")
+
+
+def set_fat(fs, cluster, value):
+    """Write a FAT entry to every FAT copy; return True if it changed"""
+    bpb = fs.bpb
+    changed = False
+    for copy in range(bpb.num_fats):
+        offset = (fs.lba + bpb.reserved + copy * bpb.fat_size) * BLOCK_SIZE + cluster * 2
+        if struct.unpack_from('<H', fs.hdf.data, offset)[0] != value:
+            struct.pack_into('<H', fs.hdf.data, offset, value)
+            changed = True
+    return changed
+
+
+def deploy(hdf, kernel, lba=None, dry_run=False, name=SYSTEM_BIN):
+    """Bring the file in the image up to date with kernel; return stats"""
+    fs = open_volume(hdf, lambda line: None, lba)
+    cluster_bytes = fs.bpb.sec_per_clus * BLOCK_SIZE
+    needed = max(1, -(-len(kernel) // cluster_bytes))
+
+    entry = fs.find(name)
+    old_chain = fs.chain(entry.cluster) if entry and entry.cluster else []
+    chain = plan_chain(fs, old_chain, needed)
+
+    stats = {'clusters': needed, 'written': 0, 'fat': 0, 'chain': chain,
+             'moved': bool(old_chain) and chain[0] != old_chain[0]}
+    if dry_run:
+        stats['written'] = sum(
+            bytes(fs.hdf.block(fs.cluster_lba(c), fs.bpb.sec_per_clus))
+            != kernel[i * cluster_bytes:(i + 1) * cluster_bytes].ljust(cluster_bytes, b'\0')
+            for i, c in enumerate(chain))
+        return stats
+
+    # Data first, FAT and directory last: an interrupted deploy leaves the
+    # old file intact unless its own clusters were being rewritten
+    for i, cluster in enumerate(chain):
+        new = kernel[i * cluster_bytes:(i + 1) * cluster_bytes].ljust(cluster_bytes, b'\0')
+        area = fs.hdf.block(fs.cluster_lba(cluster), fs.bpb.sec_per_clus)
+        if area != new:
+            area[:] = new
+            stats['written'] += 1
+
+    for i, cluster in enumerate(chain):
+        stats['fat'] += set_fat(fs, cluster, chain[i + 1] if i + 1 < len(chain) else FAT16_EOF)
+    for cluster in set(old_chain) - set(chain):
+        stats['fat'] += set_fat(fs, cluster, FAT16_FREE)
+
+    offset = entry.offset if entry else free_slot(fs)
+    raw = fs.hdf.data[offset:offset + 32]
+    if not entry:
+        raw[:] = bytes(32)
+        raw[:11] = name if isinstance(name, bytes) else name_83(name)
+        raw[11] = ATTR_ARCHIVE
+    mtime, mdate = dos_datetime()
+    struct.pack_into('<HHHL', raw, 22, mtime, mdate, chain[0], len(kernel))
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Deploy SYSTEM.BIN into the boot HDF in place")
+    parser.add_argument('image', nargs='?', default=DEFAULT_IMAGE)
+    parser.add_argument('kernel', nargs='?', default=DEFAULT_KERNEL)
+    parser.add_argument('--lba', type=int, help='FAT16 volume start (skip RDB/PART)')
+    parser.add_argument('--dry-run', action='store_true', help='report what would change')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    try:
+        with open(args.kernel, 'rb') as f:
+            kernel = f.read()
+        if len(kernel) > KERNEL_MAX_SIZE:
+            print(f"Warning: {len(kernel)} bytes is more than the ROM loads (512KB)")
+        with HDF(args.image, writable=not args.dry_run) as hdf:
+            stats = deploy(hdf, kernel, args.lba, args.dry_run)
+    except (HDFError, OSError) as e:
+        print(f"Error: {e}")
+        return 1
+
+    layout = "contiguous" if len(runs(stats['chain']).split(',')) == 1 else "fragmented"
+    verb = "Would rewrite" if args.dry_run else "Rewrote"
+    print(f"SYSTEM.BIN: {len(kernel)} bytes in {stats['clusters']} clusters "
+          f"({layout}: {runs(stats['chain'])}{', moved' if stats['moved'] else ''})")
+    print(f"{verb} {stats['written']} of {stats['clusters']} clusters, "
+          f"{stats['fat']} FAT entries in {time.perf_counter() - start:.3f}s")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,621 @@
+#!/usr/bin/env python3
+"""
+68000 disassembler for the host tools.
+
+Usage: python3 disasm68k.py [src/rom/build/kick.rom] [--base FC0000]
+                            [--start ADDR] [--count N] [--time]
+
+Decoding is table-driven: each instruction form is a 16-bit pattern
+('0100111001110101' for rts, '0111ddd0vvvvvvvv' for moveq) compiled to a
+mask and value, and an opcode word is resolved to its form and fields
+once, then looked up in a 64K-entry table. Operands are formatted in
+vasm's Motorola syntax, with branch and PC-relative targets as absolute
+$XXXXXXXX so symbols.py can annotate them. Anything that does not decode
+comes out as dc.w.
+
+debug.py's `d <addr> [count]` command uses Disassembler, which fetches
+code with one binary read and keeps what it decoded until the memory is
+written.
+"""
+
+import argparse
+import struct
+import sys
+import time
+from collections import namedtuple
+
+from debugger_client import IO_START, IO_END, is_ram
+from symbols import load_symbols, parse_address
+
+DEFAULT_IMAGE = 'src/rom/build/kick.rom'
+ROM_BASE = 0xFC0000
+MAX_INSN_BYTES = 10             # Opcode word and up to four extension words
+RANGE_CACHE = 64                # Decoded ranges kept by Disassembler
+
+Instruction = namedtuple('Instruction', 'addr size text')
+
+SIZES = ('b', 'w', 'l')
+MOVE_SIZES = {1: 'b', 3: 'w', 2: 'l'}
+CONDITIONS = ('t', 'f', 'hi', 'ls', 'cc', 'cs', 'ne', 'eq',
+              'vc', 'vs', 'pl', 'mi', 'ge', 'lt', 'gt', 'le')
+SHIFTS = ('as', 'ls', 'rox', 'ro')
+
+# Addressing mode classes: (mode, reg) for mode 7, mode alone otherwise
+_ALL = {0, 1, 2, 3, 4, 5, 6, (7, 0), (7, 1), (7, 2), (7, 3), (7, 4)}
+_DATA = _ALL - {1}
+_MEMORY = _DATA - {0}
+_CONTROL = {2, 5, 6, (7, 0), (7, 1), (7, 2), (7, 3)}
+_ALTERABLE = {0, 1, 2, 3, 4, 5, 6, (7, 0), (7, 1)}
+_DATA_ALT = _DATA & _ALTERABLE
+_MEMORY_ALT = _MEMORY & _ALTERABLE
+_CONTROL_ALT = _CONTROL & _ALTERABLE
+
+
+def _mode_key(mode, reg):
+    return (7, reg) if mode == 7 else mode
+
+
+def _areg(n):
+    return 'sp' if n == 7 else f'a{n}'
+
+
+def _hex(value):
+    return f'${value:X}'
+
+
+def _signed(value, bits):
+    return value - (1 << bits) if value & (1 << (bits - 1)) else value
+
+
+def _disp(value):
+    return f'-${-value:X}' if value < 0 else f'${value:X}'
+
+
+def _addr(value):
+    return f'${value & 0xFFFFFFFF:08X}'
+
+
+class _Reader:
+    """Extension words after the opcode; pc is the address of the next one"""
+    __slots__ = ('words', 'i', 'base')
+
+    def __init__(self, words, i, base):
+        self.words = words
+        self.i = i
+        self.base = base            # Address of words[0]
+
+    @property
+    def pc(self):
+        return self.base + 2 * self.i
+
+    def word(self):
+        value = self.words[self.i]
+        self.i += 1
+        return value
+
+    def long(self):
+        value = (self.words[self.i] << 16) | self.words[self.i + 1]
+        self.i += 2
+        return value
+
+
+def _index(r, ext, base):
+    reg = (ext >> 12) & 7
+    name = _areg(reg) if ext & 0x8000 else f'd{reg}'
+    return f'{_disp(_signed(ext & 0xFF, 8))}({base},{name}.{"l" if ext & 0x800 else "w"})'
+
+
+def _ea(r, mode, reg, size):
+    """Format an effective address, reading its extension words"""
+    if mode == 0:
+        return f'd{reg}'
+    if mode == 1:
+        return _areg(reg)
+    if mode == 2:
+        return f'({_areg(reg)})'
+    if mode == 3:
+        return f'({_areg(reg)})+'
+    if mode == 4:
+        return f'-({_areg(reg)})'
+    if mode == 5:
+        return f'{_disp(_signed(r.word(), 16))}({_areg(reg)})'
+    if mode == 6:
+        return _index(r, r.word(), _areg(reg))
+    if reg == 0:
+        return f'{_addr(_signed(r.word(), 16) & 0xFFFFFF)}.w'
+    if reg == 1:
+        return _addr(r.long())
+    if reg == 2:
+        pc = r.pc
+        return f'{_addr(pc + _signed(r.word(), 16))}(pc)'
+    if reg == 3:
+        pc = r.pc
+        ext = r.word()
+        target = _addr(pc + _signed(ext & 0xFF, 8))
+        index = (ext >> 12) & 7
+        name = _areg(index) if ext & 0x8000 else f'd{index}'
+        return f'{target}(pc,{name}.{"l" if ext & 0x800 else "w"})'
+    return '#' + _hex(_immediate(r, size))
+
+
+def _immediate(r, size):
+    if size == 'b':
+        return r.word() & 0xFF
+    if size == 'w':
+        return r.word()
+    return r.long()
+
+
+def _reglist(mask, reverse):
+    """MOVEM register mask as d0-d3/a0/a6"""
+    if reverse:
+        mask = int(f'{mask:016b}'[::-1], 2)
+    names = [f'd{n}' for n in range(8)] + [f'a{n}' for n in range(7)] + ['sp']
+    parts = []
+    n = 0
+    while n < 16:
+        if not mask & (1 << n):
+            n += 1
+            continue
+        start = n
+        while n + 1 < 16 and mask & (1 << (n + 1)) and (n + 1) % 8:
+            n += 1
+        parts.append(names[start] if start == n else f'{names[start]}-{names[n]}')
+        n += 1
+    return '/'.join(parts)
+
+
+# --- instruction forms ---
+# Each handler takes (reader, fields) and returns the instruction text.
+
+def _op(mnemonic, width=8):
+    return mnemonic.ljust(width)
+
+
+def _fixed(text):
+    return lambda r, f: text
+
+
+def _imm_ccr(name, target):
+    return lambda r, f: f'{_op(name)}#{_hex(r.word() & (0xFF if target == "ccr" else 0xFFFF))},{target}'
+
+
+def _imm_ea(name):
+    def handler(r, f):
+        size = SIZES[f['s']]
+        imm = _immediate(r, size)
+        return f'{_op(name + "." + size)}#{_hex(imm)},{_ea(r, f["M"], f["R"], size)}'
+    return handler
+
+
+def _bit_dynamic(name):
+    return lambda r, f: f'{_op(name)}d{f["d"]},{_ea(r, f["M"], f["R"], "b")}'
+
+
+def _bit_static(name):
+    def handler(r, f):
+        bit = r.word() & 0xFF
+        return f'{_op(name)}#{bit},{_ea(r, f["M"], f["R"], "b")}'
+    return handler
+
+
+def _movep(r, f):
+    size = 'l' if f['o'] & 1 else 'w'
+    mem = f'{_disp(_signed(r.word(), 16))}({_areg(f["a"])})'
+    if f['o'] & 2:
+        return f'{_op("movep." + size)}d{f["d"]},{mem}'
+    return f'{_op("movep." + size)}{mem},d{f["d"]}'
+
+
+def _move(r, f):
+    size = MOVE_SIZES[f['S']]
+    src = _ea(r, f['M'], f['R'], size)
+    if f['D'] == 1:
+        return f'{_op("movea." + size)}{src},{_areg(f["d"])}'
+    return f'{_op("move." + size)}{src},{_ea(r, f["D"], f["d"], size)}'
+
+
+def _unary(name):
+    def handler(r, f):
+        size = SIZES[f['s']]
+        return f'{_op(name + "." + size)}{_ea(r, f["M"], f["R"], size)}'
+    return handler
+
+
+def _ea_only(name, size='l'):
+    return lambda r, f: f'{_op(name)}{_ea(r, f["M"], f["R"], size)}'
+
+
+def _movem(to_regs):
+    def handler(r, f):
+        size = 'l' if f['s'] else 'w'
+        mask = r.word()
+        regs = _reglist(mask, f['M'] == 4)
+        ea = _ea(r, f['M'], f['R'], size)
+        if to_regs:
+            return f'{_op("movem." + size)}{ea},{regs}'
+        return f'{_op("movem." + size)}{regs},{ea}'
+    return handler
+
+
+def _branch(r, f):
+    pc = r.pc
+    disp = _signed(f['v'], 8)
+    suffix = '.s'
+    if f['v'] == 0:
+        disp = _signed(r.word(), 16)
+        suffix = '.w'
+    name = {0: 'bra', 1: 'bsr'}.get(f['c'], 'b' + CONDITIONS[f['c']])
+    return f'{_op(name + suffix)}{_addr(pc + disp)}'
+
+
+def _dbcc(r, f):
+    pc = r.pc
+    return f'{_op("db" + CONDITIONS[f["c"]])}d{f["r"]},{_addr(pc + _signed(r.word(), 16))}'
+
+
+def _quick(name):
+    def handler(r, f):
+        size = SIZES[f['s']]
+        return f'{_op(name + "." + size)}#{f["q"] or 8},{_ea(r, f["M"], f["R"], size)}'
+    return handler
+
+
+def _to_dn(name, size=None):
+    def handler(r, f):
+        sz = size or SIZES[f['s']]
+        mnemonic = name if size else f'{name}.{sz}'
+        return f'{_op(mnemonic)}{_ea(r, f["M"], f["R"], sz)},d{f["d"]}'
+    return handler
+
+
+def _from_dn(name):
+    def handler(r, f):
+        size = SIZES[f['s']]
+        return f'{_op(name + "." + size)}d{f["d"]},{_ea(r, f["M"], f["R"], size)}'
+    return handler
+
+
+def _to_an(name):
+    def handler(r, f):
+        size = 'l' if f['z'] else 'w'
+        return f'{_op(name + "." + size)}{_ea(r, f["M"], f["R"], size)},{_areg(f["d"])}'
+    return handler
+
+
+def _extended(name, sized=True):
+    def handler(r, f):
+        mnemonic = f'{name}.{SIZES[f["s"]]}' if sized else name
+        if f['m']:
+            return f'{_op(mnemonic)}-({_areg(f["y"])}),-({_areg(f["x"])})'
+        return f'{_op(mnemonic)}d{f["y"]},d{f["x"]}'
+    return handler
+
+
+def _shift_reg(r, f):
+    name = SHIFTS[f['t']] + ('l' if f['L'] else 'r') + '.' + SIZES[f['s']]
+    count = f'd{f["c"]}' if f['i'] else f'#{f["c"] or 8}'
+    return f'{_op(name)}{count},d{f["r"]}'
+
+
+def _shift_mem(r, f):
+    name = SHIFTS[f['t']] + ('l' if f['L'] else 'r') + '.w'
+    return f'{_op(name)}{_ea(r, f["M"], f["R"], "w")}'
+
+
+# (pattern, handler, {field: allowed values or mode class}); first match wins.
+# Fields: M/R = EA mode/register, s = size (0-2); 'an': 'wl' rejects An
+# with .b.
+_FORMS = [
+    # Line 0: immediates, bit operations, MOVEP
+    ('0000000000111100', _imm_ccr('ori.b', 'ccr'), {}),
+    ('0000000001111100', _imm_ccr('ori.w', 'sr'), {}),
+    ('0000001000111100', _imm_ccr('andi.b', 'ccr'), {}),
+    ('0000001001111100', _imm_ccr('andi.w', 'sr'), {}),
+    ('0000101000111100', _imm_ccr('eori.b', 'ccr'), {}),
+    ('0000101001111100', _imm_ccr('eori.w', 'sr'), {}),
+    ('0000ddd1oo001aaa', _movep, {}),
+    ('0000ddd100MMMRRR', _bit_dynamic('btst'), {'ea': _DATA}),
+    ('0000ddd101MMMRRR', _bit_dynamic('bchg'), {'ea': _DATA_ALT}),
+    ('0000ddd110MMMRRR', _bit_dynamic('bclr'), {'ea': _DATA_ALT}),
+    ('0000ddd111MMMRRR', _bit_dynamic('bset'), {'ea': _DATA_ALT}),
+    ('0000100000MMMRRR', _bit_static('btst'), {'ea': _DATA - {(7, 4)}}),
+    ('0000100001MMMRRR', _bit_static('bchg'), {'ea': _DATA_ALT}),
+    ('0000100010MMMRRR', _bit_static('bclr'), {'ea': _DATA_ALT}),
+    ('0000100011MMMRRR', _bit_static('bset'), {'ea': _DATA_ALT}),
+    ('00000000ssMMMRRR', _imm_ea('ori'), {'ea': _DATA_ALT}),
+    ('00000010ssMMMRRR', _imm_ea('andi'), {'ea': _DATA_ALT}),
+    ('00000100ssMMMRRR', _imm_ea('subi'), {'ea': _DATA_ALT}),
+    ('00000110ssMMMRRR', _imm_ea('addi'), {'ea': _DATA_ALT}),
+    ('00001010ssMMMRRR', _imm_ea('eori'), {'ea': _DATA_ALT}),
+    ('00001100ssMMMRRR', _imm_ea('cmpi'), {'ea': _DATA_ALT}),
+
+    # Lines 1-3: MOVE, MOVEA
+    ('00SSdddDDDMMMRRR', _move, {}),
+
+    # Line 4: miscellaneous
+    ('0100101011111100', _fixed('illegal'), {}),
+    ('0100111001110000', _fixed('reset'), {}),
+    ('0100111001110001', _fixed('nop'), {}),
+    ('0100111001110010', lambda r, f: f'{_op("stop")}#{_hex(r.word())}', {}),
+    ('0100111001110011', _fixed('rte'), {}),
+    ('0100111001110101', _fixed('rts'), {}),
+    ('0100111001110110', _fixed('trapv'), {}),
+    ('0100111001110111', _fixed('rtr'), {}),
+    ('010011100100vvvv', lambda r, f: f'{_op("trap")}#{f["v"]}', {}),
+    ('0100111001010aaa', lambda r, f: f'{_op("link")}{_areg(f["a"])},#{_disp(_signed(r.word(), 16))}', {}),
+    ('0100111001011aaa', lambda r, f: f'{_op("unlk")}{_areg(f["a"])}', {}),
+    ('0100111001100aaa', lambda r, f: f'{_op("move.l")}{_areg(f["a"])},usp', {}),
+    ('0100111001101aaa', lambda r, f: f'{_op("move.l")}usp,{_areg(f["a"])}', {}),
+    ('0100100001000ddd', lambda r, f: f'{_op("swap")}d{f["d"]}', {}),
+    ('0100100010000ddd', lambda r, f: f'{_op("ext.w")}d{f["d"]}', {}),
+    ('0100100011000ddd', lambda r, f: f'{_op("ext.l")}d{f["d"]}', {}),
+    ('0100111010MMMRRR', _ea_only('jsr'), {'ea': _CONTROL}),
+    ('0100111011MMMRRR', _ea_only('jmp'), {'ea': _CONTROL}),
+    ('0100100001MMMRRR', _ea_only('pea'), {'ea': _CONTROL}),
+    ('010010001sMMMRRR', _movem(False), {'ea': _CONTROL_ALT | {4}}),
+    ('010011001sMMMRRR', _movem(True), {'ea': _CONTROL | {3}}),
+    ('0100ddd111MMMRRR', lambda r, f: f'{_op("lea")}{_ea(r, f["M"], f["R"], "l")},{_areg(f["d"])}',
+     {'ea': _CONTROL}),
+    ('0100ddd110MMMRRR', _to_dn('chk.w', 'w'), {'ea': _DATA}),
+    ('0100000011MMMRRR', lambda r, f: f'{_op("move.w")}sr,{_ea(r, f["M"], f["R"], "w")}',
+     {'ea': _DATA_ALT}),
+    ('0100010011MMMRRR', lambda r, f: f'{_op("move.w")}{_ea(r, f["M"], f["R"], "w")},ccr',
+     {'ea': _DATA}),
+    ('0100011011MMMRRR', lambda r, f: f'{_op("move.w")}{_ea(r, f["M"], f["R"], "w")},sr',
+     {'ea': _DATA}),
+    ('0100100000MMMRRR', _ea_only('nbcd', 'b'), {'ea': _DATA_ALT}),
+    ('0100101011MMMRRR', _ea_only('tas', 'b'), {'ea': _DATA_ALT}),
+    ('01000000ssMMMRRR', _unary('negx'), {'ea': _DATA_ALT}),
+    ('01000010ssMMMRRR', _unary('clr'), {'ea': _DATA_ALT}),
+    ('01000100ssMMMRRR', _unary('neg'), {'ea': _DATA_ALT}),
+    ('01000110ssMMMRRR', _unary('not'), {'ea': _DATA_ALT}),
+    ('01001010ssMMMRRR', _unary('tst'), {'ea': _DATA_ALT}),
+
+    # Line 5: ADDQ, SUBQ, Scc, DBcc
+    ('0101cccc11001rrr', _dbcc, {}),
+    ('0101cccc11MMMRRR', lambda r, f: f'{_op("s" + CONDITIONS[f["c"]])}{_ea(r, f["M"], f["R"], "b")}',
+     {'ea': _DATA_ALT}),
+    ('0101qqq0ssMMMRRR', _quick('addq'), {'ea': _ALTERABLE, 'an': 'wl'}),
+    ('0101qqq1ssMMMRRR', _quick('subq'), {'ea': _ALTERABLE, 'an': 'wl'}),
+
+    # Lines 6-7: branches, MOVEQ
+    ('0110ccccvvvvvvvv', _branch, {}),
+    ('0111ddd0vvvvvvvv', lambda r, f: f'{_op("moveq")}#{_signed(f["v"], 8)},d{f["d"]}', {}),
+
+    # Line 8: OR, DIV, SBCD
+    ('1000ddd011MMMRRR', _to_dn('divu.w', 'w'), {'ea': _DATA}),
+    ('1000ddd111MMMRRR', _to_dn('divs.w', 'w'), {'ea': _DATA}),
+    ('1000xxx10000myyy', _extended('sbcd', False), {}),
+    ('1000ddd0ssMMMRRR', _to_dn('or'), {'ea': _DATA}),
+    ('1000ddd1ssMMMRRR', _from_dn('or'), {'ea': _MEMORY_ALT}),
+
+    # Line 9: SUB, SUBA, SUBX
+    ('1001dddz11MMMRRR', _to_an('suba'), {'ea': _ALL}),
+    ('1001xxx1ss00myyy', _extended('subx'), {}),
+    ('1001ddd0ssMMMRRR', _to_dn('sub'), {'ea': _ALL, 'an': 'wl'}),
+    ('1001ddd1ssMMMRRR', _from_dn('sub'), {'ea': _MEMORY_ALT}),
+
+    # Line B: CMP, CMPA, CMPM, EOR
+    ('1011dddz11MMMRRR', _to_an('cmpa'), {'ea': _ALL}),
+    ('1011xxx1ss001yyy', lambda r, f: f'{_op("cmpm." + SIZES[f["s"]])}({_areg(f["y"])})+,({_areg(f["x"])})+',
+     {}),
+    ('1011ddd0ssMMMRRR', _to_dn('cmp'), {'ea': _ALL, 'an': 'wl'}),
+    ('1011ddd1ssMMMRRR', _from_dn('eor'), {'ea': _DATA_ALT}),
+
+    # Line C: AND, MUL, ABCD, EXG
+    ('1100ddd011MMMRRR', _to_dn('mulu.w', 'w'), {'ea': _DATA}),
+    ('1100ddd111MMMRRR', _to_dn('muls.w', 'w'), {'ea': _DATA}),
+    ('1100xxx10000myyy', _extended('abcd', False), {}),
+    ('1100xxx101000yyy', lambda r, f: f'{_op("exg")}d{f["x"]},d{f["y"]}', {}),
+    ('1100xxx101001yyy', lambda r, f: f'{_op("exg")}{_areg(f["x"])},{_areg(f["y"])}', {}),
+    ('1100xxx110001yyy', lambda r, f: f'{_op("exg")}d{f["x"]},{_areg(f["y"])}', {}),
+    ('1100ddd0ssMMMRRR', _to_dn('and'), {'ea': _DATA}),
+    ('1100ddd1ssMMMRRR', _from_dn('and'), {'ea': _MEMORY_ALT}),
+
+    # Line D: ADD, ADDA, ADDX
+    ('1101dddz11MMMRRR', _to_an('adda'), {'ea': _ALL}),
+    ('1101xxx1ss00myyy', _extended('addx'), {}),
+    ('1101ddd0ssMMMRRR', _to_dn('add'), {'ea': _ALL, 'an': 'wl'}),
+    ('1101ddd1ssMMMRRR', _from_dn('add'), {'ea': _MEMORY_ALT}),
+
+    # Line E: shifts and rotates
+    ('11100ttL11MMMRRR', _shift_mem, {'ea': _MEMORY_ALT}),
+    ('1110cccLssitt' + 'rrr', _shift_reg, {}),
+]
+
+
+def _compile(pattern):
+    mask = value = 0
+    fields = {}
+    for bit, ch in enumerate(reversed(pattern)):
+        if ch in '01':
+            mask |= 1 << bit
+            value |= int(ch) << bit
+        else:
+            low, width = fields.get(ch, (bit, 0))
+            fields[ch] = (min(low, bit), width + 1)
+    return mask, value, fields
+
+
+# Forms grouped by opcode line (top four bits), in _FORMS order
+_LINES = [[] for _ in range(16)]
+for _pattern, _handler, _rules in _FORMS:
+    _mask, _value, _layout = _compile(_pattern)
+    for _line in range(16):
+        if (_line << 12) & _mask == _value & 0xF000 & _mask:
+            _LINES[_line].append((_mask, _value, _layout, _handler, _rules))
+_TABLE = [None] * 0x10000       # opword -> (handler, fields), or False if invalid
+
+
+def _resolve(op):
+    """Find the form for an opcode word; cached in _TABLE"""
+    for mask, value, layout, handler, rules in _LINES[op >> 12]:
+        if op & mask != value:
+            continue
+        f = {name: (op >> low) & ((1 << width) - 1) for name, (low, width) in layout.items()}
+        if f.get('s') == 3 or f.get('S') == 0:
+            continue                # Size 11 is another instruction (or none)
+        if 'ea' in rules and _mode_key(f['M'], f['R']) not in rules['ea']:
+            continue
+        if handler is _move:
+            if f['S'] == 1 and (f['M'] == 1 or f['D'] == 1):
+                continue            # No byte moves to or from An
+            if f['D'] != 1 and _mode_key(f['D'], f['d']) not in _DATA_ALT:
+                continue
+        if rules.get('an') == 'wl' and f['M'] == 1 and f['s'] == 0:
+            continue                # An is word or long only
+        _TABLE[op] = (handler, f)
+        return _TABLE[op]
+    _TABLE[op] = False
+    return False
+
+
+def decode(words, i, base):
+    """Decode the instruction at words[i]; return (text, words used)"""
+    op = words[i]
+    entry = _TABLE[op]
+    if entry is None:
+        entry = _resolve(op)
+    if entry:
+        handler, fields = entry
+        reader = _Reader(words, i + 1, base)
+        try:
+            return handler(reader, fields), reader.i - i
+        except IndexError:
+            pass                    # Extension words run past the data
+    return f'{_op("dc.w")}${op:04X}', 1
+
+
+def disassemble(data, addr, count=None):
+    """Yield Instructions from data (loaded at addr), at most count of them"""
+    if len(data) & 1:
+        data = data[:-1]
+    words = struct.unpack(f'>{len(data) // 2}H', data)
+    i = 0
+    n = 0
+    while i < len(words) and (count is None or n < count):
+        text, used = decode(words, i, addr)
+        yield Instruction(addr + 2 * i, 2 * used, text)
+        i += used
+        n += 1
+
+
+def format_instruction(insn, data, base, symbols=None):
+    """'$ADDR  HEXWORDS  text', with symbols.py annotation if given"""
+    offset = insn.addr - base
+    raw = data[offset:offset + insn.size].hex().upper()
+    line = f'${insn.addr:08X}  {raw:<20} {insn.text}'
+    return symbols.annotate(line) if symbols else line
+
+
+def listing(insns, data, base, symbols=None):
+    """Yield formatted lines, with a 'label:' line where a symbol starts"""
+    for insn in insns:
+        if symbols:
+            found = symbols.lookup(insn.addr)
+            if found and found[1] == 0:
+                yield f'{found[0]}:'
+        yield format_instruction(insn, data, base, symbols)
+
+
+class Disassembler:
+    """Disassembly over a debugger session, cached per address range
+
+    A miss costs one read_binary of enough bytes for the instructions
+    asked for. The decoded range is kept until the session sees a
+    command that may change it: it registers with the AsyncDebugger's
+    watchers, which get the same invalidate()/invalidate_ram() calls as
+    its PageCache. I/O space is never cached.
+    """
+
+    def __init__(self, dbg, capacity=RANGE_CACHE):
+        self.dbg = dbg
+        self.capacity = capacity
+        self.ranges = []            # (start, data, [Instruction]), oldest first
+        self.hits = 0
+        self.misses = 0
+        dbg.watchers.append(self)
+
+    def _cached(self, addr, count):
+        for start, data, insns in self.ranges:
+            if start <= addr < start + len(data):
+                for n, insn in enumerate(insns):
+                    if insn.addr == addr:
+                        if len(insns) - n >= count:
+                            return data, start, insns[n:n + count]
+                        break
+        return None
+
+    async def disassemble(self, addr, count=16):
+        """(data, base, [Instruction]) for count instructions at addr"""
+        addr &= ~1
+        found = self._cached(addr, count)
+        if found:
+            self.hits += 1
+            return found
+        self.misses += 1
+        # One spare instruction's worth, so the last one asked for is whole
+        data = await self.dbg.read_binary(addr, (count + 1) * MAX_INSN_BYTES)
+        limit = addr + len(data) - MAX_INSN_BYTES
+        insns = [insn for insn in disassemble(data, addr) if insn.addr <= limit]
+        if addr + len(data) <= IO_START or addr >= IO_END:
+            self.ranges.append((addr, data, insns))
+            del self.ranges[:-self.capacity]
+        return data, addr, insns[:count]
+
+    def invalidate(self, addr, length=4):
+        """Drop decoded ranges overlapping a write"""
+        self.ranges = [r for r in self.ranges
+                       if r[0] + len(r[1]) <= addr or r[0] >= addr + length]
+
+    def invalidate_ram(self):
+        """Drop everything outside the ROM"""
+        self.ranges = [r for r in self.ranges if not is_ram(r[0], len(r[1]))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Disassemble a 68000 image")
+    parser.add_argument('image', nargs='?', default=DEFAULT_IMAGE)
+    parser.add_argument('--base', type=parse_address, default=ROM_BASE,
+                        help='load address of the image (default FC0000)')
+    parser.add_argument('--start', type=parse_address, help='first address to list')
+    parser.add_argument('--count', type=int, help='instructions to list')
+    parser.add_argument('--time', action='store_true',
+                        help='decode the whole image and report the time only')
+    parser.add_argument('--no-symbols', dest='symbols', action='store_false',
+                        help='list without labels and <symbol> annotations')
+    args = parser.parse_args()
+
+    try:
+        with open(args.image, 'rb') as f:
+            data = f.read()
+    except OSError as e:
+        print(f"Error: {e}")
+        return 1
+
+    if args.time:
+        start = time.perf_counter()
+        count = sum(1 for _ in disassemble(data, args.base))
+        elapsed = time.perf_counter() - start
+        print(f"{count} instructions in {len(data)} bytes: {elapsed:.3f}s")
+        return 0
+
+    symbols = load_symbols(rom=args.image) if args.symbols else None
+
+    start = args.base if args.start is None else args.start
+    offset = start - args.base
+    if not 0 <= offset < len(data):
+        print(f"Error: ${start:08X} is outside the image")
+        return 1
+    try:
+        insns = disassemble(data[offset:], start, args.count)
+        for line in listing(insns, data[offset:], start, symbols):
+            print(line)
+    except BrokenPipeError:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
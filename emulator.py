@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+FS-UAE instance management for running several emulators side by side.
+
+Each instance gets its own config, generated from configs/a600.fs-uae or
+configs/a500.fs-uae, with a unique serial port and a copy-on-write copy of
+the boot HDF. Instances never fight over port 5555 or write to the same
+disk image.
+
+Session keeps one booted instance warm across test modules and puts the
+machine back the way it booted between them.
+"""
+
+import asyncio
+import os
+import platform
+import re
+import shutil
+import signal
+import subprocess
+import time
+
+from debugger_client import wait_ready, DebuggerError, DEFAULT_HOST, REGISTER_NAMES
+
+DEFAULT_CONFIG = 'configs/a600.fs-uae'
+DEFAULT_WORKDIR = 'build/emulators'
+BASE_PORT = 5600            # Instance n listens on BASE_PORT + n
+BOOT_TIMEOUT = 30           # Seconds to reach the first debugger prompt
+
+# Config keys holding paths relative to the repository root
+PATH_KEYS = ('kickstart_file', 'floppy_drive_0', 'hard_drive_0')
+
+_KEY_RE = re.compile(r'^\s*([a-z0-9_]+)\s*=\s*(.*?)\s*$')
+
+
+def fs_uae_binary():
+    """FS-UAE executable, chosen the same way as the Makefile"""
+    if os.environ.get('FS_UAE'):
+        return os.environ['FS_UAE']
+    if platform.system() == 'Darwin':
+        return '/Applications/FS-UAE.app/Contents/MacOS/fs-uae'
+    return 'fs-uae'
+
+
+def cow_copy(src, dst):
+    """Copy src to dst, sharing blocks where the filesystem can"""
+    if platform.system() == 'Darwin':
+        cmd = ['cp', '-c', src, dst]             # APFS clonefile
+    else:
+        cmd = ['cp', '--reflink=auto', src, dst]  # Btrfs/XFS reflink, else copy
+    if subprocess.run(cmd, stderr=subprocess.DEVNULL).returncode != 0:
+        shutil.copyfile(src, dst)
+
+
+def read_config(path):
+    """Parse an FS-UAE config into {key: value}"""
+    values = {}
+    with open(path) as f:
+        for line in f:
+            match = _KEY_RE.match(line)
+            if match:
+                values[match.group(1)] = match.group(2)
+    return values
+
+
+def write_instance_config(base_config, path, port, hdf=None):
+    """Write base_config with its own serial port and hard drive"""
+    root = os.getcwd()
+    lines = [f"# Generated by emulator.py from {base_config}\n"]
+    with open(base_config) as f:
+        for line in f:
+            match = _KEY_RE.match(line)
+            key = match.group(1) if match else None
+            if key == 'serial_port':
+                line = f"serial_port = tcp://127.0.0.1:{port}/wait\n"
+            elif key and key.startswith('hard_drive_0'):
+                if not hdf:
+                    continue                # No boot disk: ROM drops to the debugger
+                if key == 'hard_drive_0':
+                    line = f"hard_drive_0 = {hdf}\n"
+            elif key in PATH_KEYS and not os.path.isabs(match.group(2)):
+                line = f"{key} = {os.path.join(root, match.group(2))}\n"
+            lines.append(line)
+    with open(path, 'w') as f:
+        f.writelines(lines)
+
+
+class Emulator:
+    """One FS-UAE instance with a private config, HDF and serial port"""
+
+    def __init__(self, index, base_config=DEFAULT_CONFIG, workdir=DEFAULT_WORKDIR,
+                 base_port=BASE_PORT, stub=False):
+        self.index = index
+        self.port = base_port + index
+        self.base_config = base_config
+        self.workdir = os.path.join(workdir, f'instance-{index}')
+        self.stub = stub
+        self.process = None
+        self.server = None
+        self.started = None         # time.monotonic() at launch
+
+    def prepare(self):
+        """Generate the instance config and HDF copy; return the config path"""
+        os.makedirs(self.workdir, exist_ok=True)
+        hdf = read_config(self.base_config).get('hard_drive_0')
+        copy = None
+        if hdf and os.path.exists(hdf):
+            copy = os.path.abspath(os.path.join(self.workdir, os.path.basename(hdf)))
+            cow_copy(hdf, copy)
+        config = os.path.join(self.workdir, os.path.basename(self.base_config))
+        write_instance_config(self.base_config, config, self.port, copy)
+        return config
+
+    async def start(self):
+        """Launch the emulator (or a debugger stub on the instance port)"""
+        self.started = time.monotonic()
+        if self.stub:
+            from debugger_stub import start_stub
+            self.server, _ = await start_stub(port=self.port)
+            return
+        config = self.prepare()
+        self.process = await asyncio.create_subprocess_exec(
+            fs_uae_binary(), os.path.abspath(config),
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.DEVNULL,
+            start_new_session=True  # Own process group for clean shutdown
+        )
+
+    async def connect(self, until='prompt', timeout=BOOT_TIMEOUT):
+        """Wait for a boot stage on this instance; return (dbg, BootProgress)"""
+        return await wait_ready(DEFAULT_HOST, self.port, until, timeout, self.started)
+
+    async def stop(self):
+        """Shut the instance down and remove its files"""
+        if self.server:
+            self.server.close()
+            await self.server.wait_closed()
+            self.server = None
+        if self.process:
+            try:
+                os.killpg(os.getpgid(self.process.pid), signal.SIGTERM)
+                await asyncio.wait_for(self.process.wait(), timeout=5)
+            except ProcessLookupError:
+                pass
+            except asyncio.TimeoutError:
+                os.killpg(os.getpgid(self.process.pid), signal.SIGKILL)
+            self.process = None
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+
+class Session:
+    """One emulator booted once and lent to test module after test module
+
+    Between modules reset() rewrites the RAM pages the module dirtied and
+    puts the saved registers back through r. Only a timeout, a lost
+    connection or a g (the CPU ran, so any page may have changed) costs
+    a full restart.
+    """
+
+    def __init__(self, emulator, boot_timeout=BOOT_TIMEOUT):
+        self.emulator = emulator
+        self.boot_timeout = boot_timeout
+        self.dbg = None
+        self.boot_log = ''
+        self.progress = None        # BootProgress of the latest boot
+        self.registers = None       # Saved registers right after boot
+        self.boots = 0
+        self.healthy = False
+
+    async def start(self):
+        """Boot the emulator and remember the state to return to"""
+        await self.emulator.start()
+        self.dbg, self.progress = await self.emulator.connect(timeout=self.boot_timeout)
+        self.boot_log = self.dbg.boot_log
+        self.registers = await self.dbg.registers()
+        self.dbg.journal = {}
+        self.boots += 1
+        self.healthy = True
+
+    async def restart(self):
+        """Full stop and cold boot"""
+        await self.stop()
+        await self.start()
+
+    def failed(self):
+        """Flag the session so the next reset() reboots instead"""
+        self.healthy = False
+
+    async def reset(self):
+        """Return to the boot state before handing the session on"""
+        if self.healthy and not self.dbg.resumed:
+            try:
+                await self._restore()
+                return
+            except (DebuggerError, OSError):
+                pass
+        await self.restart()
+
+    async def _restore(self):
+        dbg = self.dbg
+        journal, dbg.journal = dbg.journal, None
+
+        for page, original in sorted(journal.items()):
+            dbg.cache.invalidate(page, len(original))
+            current = await dbg.read_memory(page, len(original))
+            # Rewrite only the longwords that differ
+            offset = 0
+            while offset < len(original):
+                if current[offset:offset + 4] == original[offset:offset + 4]:
+                    offset += 4
+                    continue
+                end = offset
+                while end < len(original) and current[end:end + 4] != original[end:end + 4]:
+                    end += 4
+                await dbg.write_memory(page + offset, original[offset:end])
+                offset = end
+
+        current = await dbg.registers()
+        for name in REGISTER_NAMES:
+            if current[name] != self.registers[name]:
+                await dbg.set_reg(name, self.registers[name])
+
+        dbg.journal = {}
+
+    async def stop(self):
+        self.healthy = False
+        if self.dbg:
+            await self.dbg.close()
+            self.dbg = None
+        await self.emulator.stop()
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+Replays the ROM's FAT16 loader against a disk image and counts IDE traffic.
+
+Usage: python3 fat16_sim.py [harddrives/boot.hdf] [--lba N] [--trace]
+                            [--fat N] [--run N] [--root N] [--log FILE]
+
+filesystem.s issues one ide_read per root directory sector and one per
+run of consecutive clusters (up to 256 sectors), and caches a single FAT
+sector (FS_FAT_BUFFER, tagged by FSV_CACHED_FAT_SEC). The simulator
+follows the same steps on the image (see hdf.py) and reports the IDE
+commands, sectors transferred and FAT cache hit rate needed to load
+SYSTEM.BIN, for the ROM as it is, the one-read-per-cluster loader it
+replaced, and alternative policies:
+
+  --fat N   FAT cache: on a miss read N FAT sectors in one command
+  --run N   read runs of consecutive clusters, up to N sectors per command
+  --root N  read N root directory sectors per command
+
+LBAs are relative to the image. With a plain image FS-UAE's virtual RDB
+is counted as one read of block 0.
+
+--log checks a serial capture of the boot against the simulation: the
+ROM prints "FAT16: N IDE commands, M sectors, T ticks" after loading,
+counting from fat16_init (the RDB and partition reads come before).
+"""
+
+import argparse
+import re
+import sys
+from collections import namedtuple
+
+from hdf import HDF, HDFError, open_volume, BLOCK_SIZE, SYSTEM_BIN, FAT16_EOF_MIN, ROM_PART_BLOCK
+
+MAX_SECTORS = 256               # ide_read: 1-256 sectors per command
+
+# fat: sectors per FAT cache fill, run: sectors per data read (0 = one
+# cluster, as the ROM does), root: sectors per root directory read,
+# header: read the file's first sector for a pack_kernel.py header
+Policy = namedtuple('Policy', 'name fat run root header', defaults=(True,))
+
+CLUSTER_POLICY = Policy('per cluster', 1, 0, 1, False)
+ROM_POLICY = Policy('rom (runs)', 1, MAX_SECTORS, 1)
+POLICIES = [
+    CLUSTER_POLICY,
+    ROM_POLICY,
+    Policy('fat x8 + runs', 8, MAX_SECTORS, 1),
+    Policy('fat x8 + runs + root x4', 8, MAX_SECTORS, 4),
+]
+
+# load_system_bin's stats line; TOD ticks are PAL lines
+_STATS_RE = re.compile(r'FAT16: (\d+) IDE commands, (\d+) sectors, (\d+) ticks')
+TOD_HZ = 15625
+LOAD_PURPOSES = ('boot', 'root', 'header', 'fat', 'data')     # What FSV_STAT_* count
+
+
+class Trace:
+    """ide_read calls: (purpose, lba, sectors)"""
+
+    def __init__(self):
+        self.commands = []
+
+    def read(self, purpose, lba, sectors):
+        if not 1 <= sectors <= MAX_SECTORS:
+            raise HDFError(f"ide_read of {sectors} sectors at {lba}")
+        self.commands.append((purpose, lba, sectors))
+
+    def totals(self, purpose=None):
+        """(commands, sectors), optionally for one purpose"""
+        selected = [c for c in self.commands if purpose in (None, c[0])]
+        return len(selected), sum(c[2] for c in selected)
+
+
+class FatCache:
+    """FS_FAT_BUFFER generalised to a window of `sectors` FAT sectors"""
+
+    def __init__(self, fs, trace, sectors=1):
+        self.fs = fs
+        self.trace = trace
+        self.sectors = sectors
+        self.first = None           # FSV_CACHED_FAT_SEC: first cached sector
+        self.hits = 0
+        self.misses = 0
+
+    def next_cluster(self, cluster):
+        """fat16_get_next_cluster, reading the FAT through the cache"""
+        sector = cluster * 2 // BLOCK_SIZE
+        if self.first is not None and self.first <= sector < self.first + self.sectors:
+            self.hits += 1
+        else:
+            self.misses += 1
+            self.first = sector
+            count = min(self.sectors, self.fs.bpb.fat_size - sector)
+            self.trace.read('fat', self.fs.lba + self.fs.bpb.reserved + sector, max(1, count))
+        return self.fs.next_cluster(cluster)
+
+
+def simulate(hdf, fs, policy=ROM_POLICY, name=SYSTEM_BIN):
+    """Load a file the way the ROM would under policy; return (trace, cache, entry)"""
+    trace = Trace()
+    bpb = fs.bpb
+
+    # find_rdb reads blocks 0-15 one at a time until RDSK, load_partition
+    # reads block 1, fat16_init the boot sector
+    rdb = hdf.find_rdb()
+    for block in range(rdb.block + 1 if rdb else 1):
+        trace.read('rdb', block, 1)
+    trace.read('part', ROM_PART_BLOCK, 1)
+    trace.read('boot', fs.lba, 1)
+
+    # fat16_find_file: root directory sectors up to the matching entry
+    first = fs.lba + bpb.root_dir_start
+    entry = next((found for found in fs.root() if found.name == name), None)
+    if entry is None:
+        raise HDFError("FAT16: ERROR - File not found")
+    scanned = entry.offset // BLOCK_SIZE - first + 1
+    for sector in range(0, scanned, policy.root):
+        trace.read('root', first + sector, min(policy.root, bpb.root_dir_secs - sector))
+
+    # load_system_bin: look for a packed kernel's header, then read,
+    # count down, look up the next cluster
+    if policy.header:
+        trace.read('header', fs.cluster_lba(entry.cluster), 1)
+    cache = FatCache(fs, trace, policy.fat)
+    per_read = max(policy.run, bpb.sec_per_clus)
+    cluster_bytes = bpb.sec_per_clus * BLOCK_SIZE
+    cluster, remaining = entry.cluster, entry.size
+    while True:
+        run = [cluster]
+        following = None
+        while (remaining > len(run) * cluster_bytes
+               and (len(run) + 1) * bpb.sec_per_clus <= per_read):
+            following = cache.next_cluster(run[-1])
+            if following != run[-1] + 1:
+                break
+            run.append(following)
+            following = None
+        trace.read('data', fs.cluster_lba(run[0]), len(run) * bpb.sec_per_clus)
+        remaining -= len(run) * cluster_bytes
+        if remaining <= 0:
+            break
+        if following is None:
+            following = cache.next_cluster(run[-1])
+        if following >= FAT16_EOF_MIN:
+            break
+        cluster = following
+    return trace, cache, entry
+
+
+def check_log(path, trace):
+    """Compare the ROM's reported load stats with the simulated ROM policy"""
+    with open(path, 'rb') as f:
+        text = f.read().decode('ascii', errors='replace')
+    matches = _STATS_RE.findall(text)
+    if not matches:
+        print(f"✗ No 'FAT16: ... IDE commands' line in {path}")
+        return 1
+    commands, sectors, ticks = (int(n) for n in matches[-1])
+    expected = [0, 0]
+    for purpose in LOAD_PURPOSES:
+        count, secs = trace.totals(purpose)
+        expected[0] += count
+        expected[1] += secs
+    print(f"\nROM reported {commands} commands, {sectors} sectors in "
+          f"{1000 * ticks / TOD_HZ:.1f} ms")
+    if [commands, sectors] != expected:
+        print(f"✗ Simulation expected {expected[0]} commands, {expected[1]} sectors")
+        return 1
+    print("✓ Matches the simulation")
+    return 0
+
+
+def report(results):
+    print(f"{'policy':<26}{'cmds':>6}{'sectors':>9}{'fat cmds':>10}{'fat hit':>9}"
+          f"{'data cmds':>11}{'vs per cluster':>16}")
+    base = results[0][1].totals()[0]
+    for policy, trace, cache in results:
+        commands, sectors = trace.totals()
+        lookups = cache.hits + cache.misses
+        hit = f"{100 * cache.hits / lookups:.0f}%" if lookups else "-"
+        print(f"{policy.name:<26}{commands:6d}{sectors:9d}{trace.totals('fat')[0]:10d}"
+              f"{hit:>9}{trace.totals('data')[0]:11d}{100 * commands / base:15.0f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate the ROM FAT16 loader's IDE traffic")
+    parser.add_argument('image', nargs='?', default='harddrives/boot.hdf')
+    parser.add_argument('--lba', type=int, help='FAT16 volume start (skip RDB/PART)')
+    parser.add_argument('--fat', type=int, help='FAT sectors per cache fill')
+    parser.add_argument('--run', type=int, help='max sectors per data read')
+    parser.add_argument('--root', type=int, help='root directory sectors per read')
+    parser.add_argument('--trace', action='store_true', help='list every IDE command')
+    parser.add_argument('--log', help='serial capture of a boot to check against')
+    args = parser.parse_args()
+
+    policies = list(POLICIES)
+    if args.fat or args.run or args.root:
+        policies = [CLUSTER_POLICY, ROM_POLICY,
+                    Policy('custom', args.fat or 1, args.run or 0, args.root or 1)]
+
+    try:
+        with HDF(args.image) as hdf:
+            fs = open_volume(hdf, lambda line: None, args.lba)
+            results = []
+            for policy in policies:
+                trace, cache, entry = simulate(hdf, fs, policy)
+                results.append((policy, trace, cache))
+    except (HDFError, OSError) as e:
+        print(f"Error: {e}")
+        return 1
+
+    bpb = fs.bpb
+    print(f"SYSTEM.BIN: {entry.size} bytes, {bpb.sec_per_clus} sectors per cluster, "
+          f"FAT {bpb.fat_size} sectors at LBA {fs.lba + bpb.reserved}")
+    if args.trace:
+        policy, trace, _ = results[-1]
+        print(f"\nIDE commands ({policy.name}):")
+        for purpose, lba, sectors in trace.commands:
+            print(f"  READ {lba:8d} x{sectors:<4d} {purpose}")
+        print()
+    report(results)
+    if args.log:
+        try:
+            return check_log(args.log, results[1][1])
+        except OSError as e:
+            print(f"Error: {e}")
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,393 @@
+#!/usr/bin/env python3
+"""
+Offline inspector for the boot hard drive image (RDB + FAT16).
+
+Usage: python3 hdf.py [harddrives/boot.hdf] [--ls] [--extract NAME OUT]
+                      [--chain NAME] [--lba N]
+
+Walks the image the way the ROM does at boot: find_rdb scans blocks 0-15
+for RDSK, load_partition reads the PART block, fat16_init parses the BPB
+and fat16_find_file and load_system_bin follow SYSTEM.BIN's cluster chain.
+Each step prints what the ROM would print, plus the things the ROM does
+not check (block checksums, the rest of the PART chain, FAT chain
+consistency). The image is memory-mapped, so multi-GB images cost nothing
+to open.
+
+An image without RDSK in blocks 0-15 is a plain filesystem: FS-UAE puts a
+virtual RDB in front of it, so the FAT16 volume is read from block 0.
+"""
+
+import argparse
+import mmap
+import os
+import struct
+import sys
+from collections import namedtuple
+
+DEFAULT_IMAGE = 'harddrives/boot.hdf'
+BLOCK_SIZE = 512
+
+# partition.s
+RDB_MAGIC = b'RDSK'
+PART_MAGIC = b'PART'
+RDB_MAX_BLOCK = 16
+ROM_PART_BLOCK = 1              # load_partition always reads LBA 1
+END_OF_LIST = 0xFFFFFFFF
+
+# filesystem.s
+SYSTEM_BIN = b'SYSTEM  BIN'
+KERNEL_MAX_SIZE = 0x80000       # load_system_bin refuses anything larger
+FAT16_EOF_MIN = 0xFFF8
+FAT16_BAD = 0xFFF7
+ATTR_VOLUME = 0x08
+ATTR_LFN = 0x0F
+ATTR_DIRECTORY = 0x10
+
+RDB = namedtuple('RDB', 'block summed_longs checksum_ok block_bytes flags '
+                        'part_list fshdr_list cylinders sectors heads')
+Partition = namedtuple('Partition', 'block checksum_ok next flags name surfaces '
+                                    'blocks_per_track reserved low_cyl high_cyl '
+                                    'boot_pri dostype')
+BPB = namedtuple('BPB', 'bytes_per_sec sec_per_clus reserved num_fats root_entries '
+                        'fat_size root_dir_start root_dir_secs data_start')
+DirEntry = namedtuple('DirEntry', 'name attr cluster size offset')    # offset: in the image
+
+
+class HDFError(Exception):
+    pass
+
+
+def checksum_ok(block):
+    """Amiga block checksum: the first SummedLongs longs add up to zero"""
+    summed = struct.unpack_from('>L', block, 4)[0]
+    if not 2 <= summed <= len(block) // 4:
+        return False
+    return sum(struct.unpack_from(f'>{summed}L', block)) & 0xFFFFFFFF == 0
+
+
+def display_name(raw):
+    """'SYSTEM  BIN' -> 'SYSTEM.BIN'"""
+    base = raw[:8].decode('latin-1').rstrip()
+    ext = raw[8:11].decode('latin-1').rstrip()
+    return f"{base}.{ext}" if ext else base
+
+
+def name_83(name):
+    """'system.bin' -> b'SYSTEM  BIN', the form fat16_find_file compares"""
+    base, _, ext = name.upper().partition('.')
+    if len(base) > 8 or len(ext) > 3:
+        raise HDFError(f"Not an 8.3 name: {name}")
+    return base.ljust(8).encode('ascii') + ext.ljust(3).encode('ascii')
+
+
+class HDF:
+    """Memory-mapped hard drive image addressed by LBA, read-only by default"""
+
+    def __init__(self, path, writable=False):
+        self.path = path
+        self.writable = writable
+        self.file = open(path, 'r+b' if writable else 'rb')
+        size = os.fstat(self.file.fileno()).st_size
+        if size < BLOCK_SIZE:
+            self.file.close()
+            raise HDFError(f"{path}: too small for a disk image ({size} bytes)")
+        access = mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ
+        self.map = mmap.mmap(self.file.fileno(), 0, access=access)
+        self.data = memoryview(self.map)
+        self.blocks = size // BLOCK_SIZE
+
+    def close(self):
+        self.data.release()
+        if self.writable:
+            self.map.flush()
+        self.map.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def block(self, lba, count=1):
+        """Blocks [lba, lba+count) as a memoryview (no copy)"""
+        if lba < 0 or lba + count > self.blocks:
+            raise HDFError(f"Block {lba} is past the end of the image ({self.blocks} blocks)")
+        return self.data[lba * BLOCK_SIZE:(lba + count) * BLOCK_SIZE]
+
+    def find_rdb(self):
+        """find_rdb: the first RDSK block in 0-15, or None"""
+        for lba in range(min(RDB_MAX_BLOCK, self.blocks)):
+            block = self.block(lba)
+            if block[:4] == RDB_MAGIC:
+                return RDB(lba, struct.unpack_from('>L', block, 4)[0], checksum_ok(block),
+                           *struct.unpack_from('>LL4xLL', block, 16),
+                           *struct.unpack_from('>LLL', block, 64))
+        return None
+
+    def partition(self, lba):
+        """The PART block at lba, or None if it is not one"""
+        block = self.block(lba)
+        if block[:4] != PART_MAGIC:
+            return None
+        next_block, flags = struct.unpack_from('>LL', block, 16)
+        length = min(block[36], 31)
+        name = bytes(block[37:37 + length]).decode('latin-1')
+        # DosEnvVec at 128: surfaces, blocks/track, reserved, LowCyl, HighCyl, BootPri, DosType
+        env = struct.unpack_from('>12x L 4x L L 8x L L 16x l L', block, 128)
+        return Partition(lba, checksum_ok(block), next_block, flags, name, *env)
+
+    def partitions(self, rdb):
+        """Walk the PART chain from the RDB's PartitionList"""
+        result = []
+        lba = rdb.part_list
+        seen = set()
+        while lba != END_OF_LIST and lba not in seen:
+            seen.add(lba)
+            part = self.partition(lba)
+            if part is None:
+                raise HDFError(f"Block {lba} in the partition list is not a PART block")
+            result.append(part)
+            lba = part.next
+        return result
+
+
+class Fat16:
+    """A FAT16 volume starting at partition_lba, parsed as fat16_init does"""
+
+    def __init__(self, hdf, partition_lba):
+        self.hdf = hdf
+        self.lba = partition_lba
+        boot = hdf.block(partition_lba)
+        if boot[510] != 0x55 or boot[511] != 0xAA:
+            raise HDFError("FAT16: ERROR - Invalid boot signature")
+        bytes_per_sec, sec_per_clus, reserved, num_fats, root_entries = \
+            struct.unpack_from('<HBHBH', boot, 11)
+        fat_size = struct.unpack_from('<H', boot, 22)[0]
+        root_dir_start = reserved + num_fats * fat_size
+        # The ROM divides by 512 whatever the BPB says
+        root_dir_secs = (root_entries * 32 + 511) // 512
+        self.bpb = BPB(bytes_per_sec, sec_per_clus, reserved, num_fats, root_entries,
+                       fat_size, root_dir_start, root_dir_secs,
+                       root_dir_start + root_dir_secs)
+        if not sec_per_clus:
+            raise HDFError("FAT16: sectors per cluster is 0")
+        self.clusters = ((hdf.blocks - partition_lba - self.bpb.data_start)
+                         // sec_per_clus + 2)
+
+    def root(self):
+        """Root directory entries fat16_find_file looks at, in order"""
+        bpb = self.bpb
+        first = self.lba + bpb.root_dir_start
+        entries = self.hdf.block(first, bpb.root_dir_secs)
+        for offset in range(0, len(entries), 32):
+            raw = entries[offset:offset + 32]
+            if raw[0] == 0x00:
+                return              # End of directory
+            if raw[0] == 0xE5:
+                continue            # Deleted
+            attr = raw[11]
+            if attr & ATTR_VOLUME or attr & ATTR_LFN == ATTR_LFN:
+                continue
+            cluster, size = struct.unpack_from('<HL', raw, 26)
+            yield DirEntry(bytes(raw[:11]), attr, cluster, size, first * BLOCK_SIZE + offset)
+
+    def find(self, name=SYSTEM_BIN):
+        if isinstance(name, str):
+            name = name_83(name)
+        for entry in self.root():
+            if entry.name == name:
+                return entry
+        return None
+
+    def cluster_lba(self, cluster):
+        return self.lba + self.bpb.data_start + (cluster - 2) * self.bpb.sec_per_clus
+
+    def next_cluster(self, cluster):
+        """fat16_get_next_cluster: the FAT entry for cluster (first FAT)"""
+        sector, offset = divmod(cluster * 2, BLOCK_SIZE)
+        fat = self.hdf.block(self.lba + self.bpb.reserved + sector)
+        return struct.unpack_from('<H', fat, offset)[0]
+
+    def fat(self):
+        """The whole first FAT as a tuple of entries"""
+        bpb = self.bpb
+        table = self.hdf.block(self.lba + bpb.reserved, bpb.fat_size)
+        return struct.unpack_from(f'<{min(self.clusters, len(table) // 2)}H', table)
+
+    def chain(self, cluster):
+        """Cluster numbers from cluster to end of file; HDFError if broken"""
+        result = []
+        seen = set()
+        while cluster < FAT16_EOF_MIN:
+            if cluster < 2 or cluster >= self.clusters:
+                raise HDFError(f"Cluster {cluster} is outside the volume (2-{self.clusters - 1})")
+            if cluster in seen:
+                raise HDFError(f"Cluster chain loops back to {cluster}")
+            seen.add(cluster)
+            result.append(cluster)
+            cluster = self.next_cluster(cluster)
+            if cluster == FAT16_BAD:
+                raise HDFError(f"Cluster chain runs into a bad cluster after {result[-1]}")
+        return result
+
+    def read(self, entry):
+        """File contents, cluster by cluster as load_system_bin reads them"""
+        data = bytearray()
+        for cluster in self.chain(entry.cluster):
+            data += self.hdf.block(self.cluster_lba(cluster), self.bpb.sec_per_clus)
+            if len(data) >= entry.size:
+                break
+        if len(data) < entry.size:
+            raise HDFError(f"Chain holds {len(data)} bytes, directory says {entry.size}")
+        del data[entry.size:]
+        return bytes(data)
+
+
+def runs(clusters):
+    """[2, 3, 4, 9] -> '2-4, 9'"""
+    parts = []
+    start = prev = None
+    for cluster in clusters + [None]:
+        if prev is not None and cluster == prev + 1:
+            prev = cluster
+            continue
+        if start is not None:
+            parts.append(f"{start}" if start == prev else f"{start}-{prev}")
+        start = prev = cluster
+    return ', '.join(parts)
+
+
+def open_volume(hdf, report=print, lba=None):
+    """Follow the ROM from find_rdb to fat16_init; return a Fat16
+
+    Reports as it goes, in the ROM's words where there are any, and
+    raises HDFError where the ROM would stop booting.
+    """
+    if lba is not None:
+        report(f"FAT16 volume at LBA {lba} (given)")
+        return Fat16(hdf, lba)
+
+    report(f"{hdf.path}: {hdf.blocks} blocks ({hdf.blocks * BLOCK_SIZE / 2**20:.1f} MB)")
+    rdb = hdf.find_rdb()
+    if rdb is None:
+        report("RDB: Not found in blocks 0-15")
+        report("  Plain filesystem image: FS-UAE adds a virtual RDB, so the volume starts")
+        report("  at the first block FS-UAE places after it. Reading FAT16 from block 0.")
+        return Fat16(hdf, 0)
+
+    report(f"RDB: Found at block {rdb.block}")
+    report(f"RDB: Block size: {rdb.block_bytes} bytes")
+    report(f"RDB: Cylinders: {rdb.cylinders}")
+    report(f"RDB: Heads: {rdb.heads}")
+    report(f"RDB: Sectors: {rdb.sectors}")
+    report(f"RDB: Partition list at block: {rdb.part_list}")
+    if not rdb.checksum_ok:
+        report("  ! RDSK checksum is wrong (the ROM does not check it)")
+    if rdb.block_bytes != BLOCK_SIZE:
+        report(f"  ! Block size is not {BLOCK_SIZE}; the ROM assumes it is")
+
+    chain = hdf.partitions(rdb)
+    for part in chain:
+        report(f"  PART block {part.block}: {part.name} cylinders {part.low_cyl}-"
+               f"{part.high_cyl}, DosType ${part.dostype:08X}, boot priority {part.boot_pri}"
+               + ("" if part.checksum_ok else "  ! bad checksum"))
+    if rdb.part_list != ROM_PART_BLOCK:
+        report(f"  ! The ROM reads PART from block {ROM_PART_BLOCK}, not {rdb.part_list}")
+
+    part = hdf.partition(ROM_PART_BLOCK)
+    if part is None:
+        raise HDFError("PART: No valid partition found")
+    report("PART: Partition found!")
+    report(f"PART: Name: {part.name}")
+    report(f"PART: Cylinders: {part.low_cyl} to {part.high_cyl}")
+
+    # load_partition: LowCyl * Heads * Sectors with mulu.w, 16-bit operands
+    start = part.low_cyl * rdb.heads * rdb.sectors
+    size = (part.high_cyl - part.low_cyl + 1) * rdb.heads * rdb.sectors
+    for label, cyls in (('LowCyl', part.low_cyl), ('cylinder count', part.high_cyl - part.low_cyl + 1)):
+        if cyls * rdb.heads > 0xFFFF or rdb.heads > 0xFFFF or rdb.sectors > 0xFFFF:
+            report(f"  ! {label} * Heads overflows the ROM's 16-bit mulu")
+    if (part.surfaces, part.blocks_per_track) != (rdb.heads, rdb.sectors):
+        report(f"  ! DosEnvVec geometry {part.surfaces}x{part.blocks_per_track} differs "
+               f"from the RDB's {rdb.heads}x{rdb.sectors}; the ROM uses the RDB")
+    report(f"PART: Start LBA: {start}")
+    report(f"PART: Size: {size} blocks")
+    report(f"PART: DosType: {part.dostype:08X}")
+    if start + size > hdf.blocks:
+        report(f"  ! Partition ends at block {start + size}, past the end of the image")
+    return Fat16(hdf, start)
+
+
+def inspect(hdf, lba=None, report=print):
+    """Full ROM boot path check; return True if SYSTEM.BIN would load"""
+    try:
+        fs = open_volume(hdf, report, lba)
+        bpb = fs.bpb
+        report(f"FAT16: Bytes/sector: {bpb.bytes_per_sec}, Sec/cluster: {bpb.sec_per_clus}")
+        report(f"FAT16: Reserved: {bpb.reserved}, FATs: {bpb.num_fats}, FAT size: {bpb.fat_size}")
+        report(f"FAT16: Root entries: {bpb.root_entries}, Root start: {bpb.root_dir_start}")
+        report(f"FAT16: Data starts at sector {bpb.data_start}")
+        if bpb.bytes_per_sec != BLOCK_SIZE:
+            report(f"  ! The ROM assumes {BLOCK_SIZE} bytes per sector")
+
+        entry = fs.find()
+        if entry is None:
+            raise HDFError("FAT16: ERROR - File not found")
+        report(f"FAT16: Found! Cluster: {entry.cluster}, Size: {entry.size} bytes")
+        if entry.size > KERNEL_MAX_SIZE:
+            raise HDFError("FAT16: ERROR - File too large (>512KB)")
+        clusters = fs.chain(entry.cluster)
+        cluster_bytes = bpb.sec_per_clus * BLOCK_SIZE
+        needed = max(1, -(-entry.size // cluster_bytes))
+        report(f"  Chain: {len(clusters)} cluster(s) [{runs(clusters)}]")
+        if len(clusters) < needed:
+            raise HDFError(f"Chain has {len(clusters)} clusters, file needs {needed}")
+        if len(clusters) > needed:
+            report(f"  ! Chain has {len(clusters) - needed} cluster(s) more than the file needs")
+        report(f"FAT16: Loaded {entry.size} bytes")
+        return True
+    except HDFError as e:
+        report(str(e))
+        return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect a boot HDF the way the ROM reads it")
+    parser.add_argument('image', nargs='?', default=DEFAULT_IMAGE)
+    parser.add_argument('--lba', type=int, help='FAT16 volume start (skip RDB/PART)')
+    parser.add_argument('--ls', action='store_true', help='list the root directory')
+    parser.add_argument('--chain', metavar='NAME', help="print a file's cluster chain")
+    parser.add_argument('--extract', nargs=2, metavar=('NAME', 'OUT'),
+                        help='copy a file out of the image')
+    args = parser.parse_args()
+
+    try:
+        with HDF(args.image) as hdf:
+            if not (args.ls or args.chain or args.extract):
+                return 0 if inspect(hdf, args.lba) else 1
+
+            fs = open_volume(hdf, lambda line: None, args.lba)
+            if args.ls:
+                for entry in fs.root():
+                    kind = '<DIR>' if entry.attr & ATTR_DIRECTORY else f"{entry.size:10d}"
+                    print(f"{display_name(entry.name):<12} {kind:>10}  cluster {entry.cluster}")
+            for name in filter(None, [args.chain, args.extract and args.extract[0]]):
+                entry = fs.find(name)
+                if entry is None:
+                    raise HDFError(f"{name}: not in the root directory")
+                if name == args.chain:
+                    print(f"{display_name(entry.name)}: {runs(fs.chain(entry.cluster))}")
+                if args.extract and name == args.extract[0]:
+                    data = fs.read(entry)
+                    with open(args.extract[1], 'wb') as f:
+                        f.write(data)
+                    print(f"Wrote {len(data)} bytes to {args.extract[1]}")
+    except (HDFError, OSError) as e:
+        print(f"Error: {e}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
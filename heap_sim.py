@@ -0,0 +1,524 @@
+#!/usr/bin/env python3
+"""
+Allocator model for the kernel heaps (docs/mem_design.md) and a
+fragmentation benchmark.
+
+Usage: python3 heap_sim.py [--workload mixed] [--ops 100000] [--seed 1]
+                           [--trace FILE] [--save-trace FILE] [--kernel-size N]
+                           [--fast-size N]
+
+Heaps come from the ROM memory map (MemEntry records at MEMMAP_TABLE) the
+way mem_init sets them up: chip RAM from the CHIP entry, fast RAM from
+align_up(kernel_end, 4) to the end of the FAST entry. kernel_end is __end
+from SYSTEM.map, so .bss is included. The map is the stub's, for the 1MB
+fast RAM board configs/*.fs-uae set up; --fast-size models another board,
+with the top 8KB kept for the kernel stack as the ROM does. Each trace
+runs against three allocators:
+
+  bump        mem.c today: 4/8-byte alignment, free does nothing
+  designed    best-fit chip heap, first-fit fast heap, both coalescing
+  first-fit   first-fit with coalescing on both heaps
+
+A block is a 16-byte header (size with the free bit, physical prev,
+free list link, owner task) followed by the payload, both 8-byte aligned.
+Bookkeeping is array-backed: a max-tree over 8-byte granules finds the
+lowest free block that fits and the largest free block in O(log n), and
+best-fit bisects a sorted (size, address) list, so million-op traces run
+in seconds.
+
+Trace files have one operation per line:
+  a <id> <size> [chip|fast|any]     allocate (ALLOC_ANY by default)
+  f <id>                            free
+"""
+
+import argparse
+import os
+import random
+import struct
+import sys
+import time
+from array import array
+from bisect import bisect_left, insort
+
+from debugger_stub import build_image, MEMMAP_TABLE
+from symbols import parse_map, KERNEL_MAP, KERNEL_END_SYMBOL
+
+MEM_END = 0
+MEM_CHIP = 1
+MEM_FAST = 2
+MEM_RESERVED = 6
+MEMENTRY = struct.Struct('>LLHH')   # base, size, type, flags (mem.h)
+
+FAST_BASE = 0x200000                # Kernel load address
+DEFAULT_KERNEL = 'src/kernel/build/SYSTEM.BIN'
+KERNEL_STACK = 0x2000               # Reserved at the top of fast RAM (memory.s)
+GRANULE = 8                         # Alignment of headers and payloads
+HEADER_SIZE = 16
+MIN_SPLIT = HEADER_SIZE + GRANULE   # Smallest remainder worth a block
+
+ALLOC_ANY, ALLOC_CHIP, ALLOC_FAST = 'any', 'chip', 'fast'
+
+
+def align_up(value, align):
+    return (value + align - 1) & ~(align - 1)
+
+
+def memory_map(mem=None):
+    """MemEntry records from a memory image, up to MEM_END"""
+    mem = mem or build_image()
+    entries = []
+    addr = MEMMAP_TABLE
+    while True:
+        base, size, mem_type, flags = MEMENTRY.unpack(mem.read(addr, MEMENTRY.size))
+        if mem_type == MEM_END:
+            return entries
+        entries.append((base, size, mem_type, flags))
+        addr += MEMENTRY.size
+
+
+def resize_fast(entries, fast_size):
+    """Rebuild the FAST and kernel stack entries for a board of fast_size bytes"""
+    resized = []
+    for base, size, mem_type, flags in entries:
+        if mem_type == MEM_FAST:
+            resized.append((base, fast_size - KERNEL_STACK, mem_type, flags))
+            resized.append((base + fast_size - KERNEL_STACK, KERNEL_STACK, MEM_RESERVED, flags))
+        elif not (mem_type == MEM_RESERVED and base >= FAST_BASE):
+            resized.append((base, size, mem_type, flags))
+    return resized
+
+
+def kernel_end(path=KERNEL_MAP):
+    """__end from the kernel map (text, data and bss); None without a map"""
+    try:
+        with open(path) as f:
+            symbols = parse_map(f.read())
+    except OSError:
+        return None
+    return symbols.get(KERNEL_END_SYMBOL[1:])     # parse_map drops one underscore
+
+
+def heap_ranges(entries, kernel_end):
+    """mem_init: {'chip': (start, end), 'fast': (start, end)}"""
+    ranges = {}
+    for base, size, mem_type, _ in entries:
+        if mem_type == MEM_CHIP:
+            ranges[ALLOC_CHIP] = (base, base + size)
+        elif mem_type == MEM_FAST:
+            kend = align_up(kernel_end, 4)
+            start = kend if base < kend < base + size else base
+            ranges[ALLOC_FAST] = (start, base + size)
+    return ranges
+
+
+class BumpHeap:
+    """heap_alloc in mem.c"""
+
+    name = 'bump'
+
+    def __init__(self, start, end):
+        self.start, self.end = start, end
+        self.ptr = start
+        self.live = 0
+
+    def alloc(self, size):
+        if size == 0:
+            return None
+        ptr = align_up(self.ptr, 8 if size >= 8 else 4)
+        if ptr + size > self.end:
+            return None
+        self.ptr = ptr + size
+        self.live += size
+        return ptr
+
+    def free(self, addr, size):
+        self.live -= size           # Never reused
+
+    def avail(self):
+        return self.end - self.ptr
+
+    def largest_free(self):
+        return self.end - self.ptr
+
+    def overhead(self):
+        return 0
+
+
+class FreeListHeap:
+    """Coalescing free-list heap, best-fit or first-fit
+
+    Blocks are indexed by granule (address / 8) relative to the heap
+    start. span[g] is the total size of the block whose header is at g,
+    prev[g] the granule of its physical predecessor, free[g] its free
+    bit. First-fit keeps a max-tree over the granules with each free
+    block's size at its header granule; best-fit a sorted list of
+    (size, granule) keys.
+    """
+
+    def __init__(self, start, end, best_fit):
+        self.name = 'best-fit' if best_fit else 'first-fit'
+        self.best_fit = best_fit
+        self.base = align_up(start, GRANULE)
+        self.end = end & ~(GRANULE - 1)
+        granules = (self.end - self.base) // GRANULE
+        self.span = array('L', [0]) * granules
+        self.prev = array('l', [0]) * granules
+        self.free_bit = bytearray(granules)
+        self.leaves = 1 << max(1, (granules - 1).bit_length())
+        self.tree = None if best_fit else [0] * (2 * self.leaves)
+        self.by_size = []           # (size << 32 | granule) of free blocks
+        self.free_bytes = 0
+        self.headers = 0            # Bytes in headers of allocated blocks
+        self.blocks = 0
+
+        whole = self.end - self.base
+        self.span[0] = whole
+        self.prev[0] = -1
+        self._add_free(0, whole)
+
+    # --- bookkeeping ---
+
+    def _tree_set(self, g, value):
+        tree = self.tree
+        j = self.leaves + g
+        tree[j] = value
+        while j > 1:
+            other = tree[j ^ 1]
+            if other > value:
+                value = other
+            j >>= 1
+            if tree[j] == value:
+                break               # Nothing above changes
+            tree[j] = value
+
+    def _add_free(self, g, size):
+        self.free_bit[g] = 1
+        self.free_bytes += size
+        if self.best_fit:
+            insort(self.by_size, size << 32 | g)
+        else:
+            self._tree_set(g, size)
+
+    def _remove_free(self, g, clear=True):
+        """Take block g off the free structures; clear=False leaves its
+        tree leaf for the caller to overwrite"""
+        size = self.span[g]
+        self.free_bit[g] = 0
+        self.free_bytes -= size
+        if self.best_fit:
+            del self.by_size[bisect_left(self.by_size, size << 32 | g)]
+        elif clear:
+            self._tree_set(g, 0)
+
+    def _first_fit(self, need):
+        tree = self.tree
+        if tree[1] < need:
+            return None
+        j = 1
+        leaves = self.leaves
+        while j < leaves:
+            j <<= 1
+            if tree[j] < need:
+                j += 1
+        return j - leaves
+
+    def _best_fit(self, need):
+        i = bisect_left(self.by_size, need << 32)
+        if i == len(self.by_size):
+            return None
+        return self.by_size[i] & 0xFFFFFFFF
+
+    # --- API ---
+
+    def alloc(self, size):
+        if size == 0:
+            return None
+        need = HEADER_SIZE + align_up(size, GRANULE)
+        g = self._best_fit(need) if self.best_fit else self._first_fit(need)
+        if g is None:
+            return None
+        span = self.span
+        have = span[g]
+        if have - need >= MIN_SPLIT:
+            # Split: the remainder becomes a free block after this one.
+            # Adding it before clearing g lets the tree stop early.
+            rest = g + need // GRANULE
+            span[rest] = have - need
+            self.prev[rest] = g
+            after = rest + (have - need) // GRANULE
+            if after < len(span):
+                self.prev[after] = rest
+            self._add_free(rest, have - need)
+            self._remove_free(g)
+            span[g] = need
+        else:
+            self._remove_free(g)
+        self.headers += HEADER_SIZE
+        self.blocks += 1
+        return self.base + g * GRANULE + HEADER_SIZE
+
+    def free(self, addr, size=None):
+        g = (addr - HEADER_SIZE - self.base) // GRANULE
+        span, prev, free_bit = self.span, self.prev, self.free_bit
+        self.headers -= HEADER_SIZE
+        self.blocks -= 1
+
+        # Coalesce with free physical neighbours on both sides
+        start, total = g, span[g]
+        after = g + total // GRANULE
+        merge_after = after < len(span) and free_bit[after]
+        if merge_after:
+            total += span[after]
+            self._remove_free(after, clear=False)
+        before = prev[g]
+        if before >= 0 and free_bit[before]:
+            total += span[before]
+            self._remove_free(before, clear=False)
+            span[g] = 0
+            start = before
+        span[start] = total
+        end = start + total // GRANULE
+        if end < len(span):
+            prev[end] = start
+        self._add_free(start, total)
+        if merge_after:
+            span[after] = 0
+            if not self.best_fit:
+                self._tree_set(after, 0)
+
+    def avail(self):
+        return self.free_bytes
+
+    def largest_free(self):
+        if self.best_fit:
+            return self.by_size[-1] >> 32 if self.by_size else 0
+        return self.tree[1]
+
+    def overhead(self):
+        return self.headers
+
+
+ALLOCATORS = {
+    'bump': lambda kind, start, end: BumpHeap(start, end),
+    'designed': lambda kind, start, end: FreeListHeap(start, end, best_fit=(kind == ALLOC_CHIP)),
+    'first-fit': lambda kind, start, end: FreeListHeap(start, end, best_fit=False),
+}
+
+
+class Memory:
+    """Both heaps behind mem_alloc's ALLOC_CHIP/ALLOC_FAST/ALLOC_ANY"""
+
+    def __init__(self, allocator, ranges):
+        self.heaps = {kind: ALLOCATORS[allocator](kind, *ranges[kind]) for kind in ranges}
+
+    def alloc(self, size, flags=ALLOC_ANY):
+        if flags != ALLOC_ANY:
+            addr = self.heaps[flags].alloc(size)
+            return (flags, addr) if addr is not None else None
+        for kind in (ALLOC_FAST, ALLOC_CHIP):
+            addr = self.heaps[kind].alloc(size)
+            if addr is not None:
+                return kind, addr
+        return None
+
+    def free(self, kind, addr, size):
+        self.heaps[kind].free(addr, size)
+
+
+# --- workloads ---
+
+BITMAP_SIZES = [w * h // 8 * planes for w, h in ((320, 256), (640, 256), (320, 512))
+                for planes in (1, 2, 3, 4, 5)]
+AUDIO_SIZES = [1024 << n for n in range(8)]
+
+# Allocation sizes and heap per kind of request
+CATEGORIES = {
+    'bitmap': (lambda rng: rng.choice(BITMAP_SIZES), ALLOC_CHIP),
+    'copper': (lambda rng: rng.randrange(64, 4096, 4), ALLOC_CHIP),
+    'audio': (lambda rng: rng.choice(AUDIO_SIZES), ALLOC_CHIP),
+    'kernel': (lambda rng: int(rng.lognormvariate(4.5, 1.2)) + 1, ALLOC_ANY),
+}
+
+# (category, share of allocations, steady-state live bytes)
+WORKLOADS = {
+    'bitmap': [('bitmap', 1, 448 << 10)],
+    'copper': [('copper', 1, 256 << 10)],
+    'audio': [('audio', 1, 448 << 10)],
+    'kernel': [('kernel', 1, 2 << 20)],
+    'mixed': [('bitmap', 1, 256 << 10), ('copper', 6, 32 << 10),
+              ('audio', 2, 192 << 10), ('kernel', 12, 512 << 10)],
+}
+
+
+def synthetic(workload, ops, seed=1):
+    """Trace of (op, id, size, flags): allocations with random lifetimes
+
+    Lifetimes are exponential, with the mean chosen so each category
+    settles around its live-bytes target (Little's law: live = rate x
+    size x lifetime).
+    """
+    rng = random.Random(seed)
+    mix = WORKLOADS[workload]
+    total = sum(share for _, share, _ in mix)
+    makers, weights, lives = [], [], []
+    for category, share, live in mix:
+        size_of, flags = CATEGORIES[category]
+        mean_size = sum(size_of(rng) for _ in range(1000)) / 1000
+        makers.append((size_of, flags))
+        weights.append(share)
+        lives.append(live / mean_size * total / share)
+
+    deaths = {}
+    trace = []
+    next_id = 0
+    step = 0
+    while len(trace) < ops:
+        for block in deaths.pop(step, ()):
+            trace.append(('f', block, 0, None))
+        i = rng.choices(range(len(makers)), weights)[0]
+        size_of, flags = makers[i]
+        trace.append(('a', next_id, size_of(rng), flags))
+        life = 1 + int(rng.expovariate(1 / lives[i]))
+        deaths.setdefault(step + life, []).append(next_id)
+        next_id += 1
+        step += 1
+    return trace[:ops]
+
+
+def read_trace(path):
+    trace = []
+    with open(path) as f:
+        for line in f:
+            fields = line.split()
+            if not fields or fields[0].startswith('#'):
+                continue
+            if fields[0] == 'a':
+                trace.append(('a', int(fields[1]), int(fields[2], 0),
+                              fields[3] if len(fields) > 3 else ALLOC_ANY))
+            elif fields[0] == 'f':
+                trace.append(('f', int(fields[1]), 0, None))
+    return trace
+
+
+def write_trace(path, trace):
+    with open(path, 'w') as f:
+        for op, block, size, flags in trace:
+            f.write(f"a {block} {size} {flags}\n" if op == 'a' else f"f {block}\n")
+
+
+# --- replay ---
+
+def replay(trace, allocator, ranges, samples=100):
+    """Run a trace; return stats per heap plus timing"""
+    memory = Memory(allocator, ranges)
+    live = {}
+    failed = 0
+    sizes = {kind: 0 for kind in memory.heaps}
+    peak = dict(sizes)
+    worst = {kind: 0.0 for kind in memory.heaps}
+    every = max(1, len(trace) // samples)
+
+    def sample():
+        for kind, heap in memory.heaps.items():
+            avail = heap.avail()
+            if avail:
+                worst[kind] = max(worst[kind], 1 - heap.largest_free() / avail)
+
+    start = time.perf_counter()
+    for n, (op, block, size, flags) in enumerate(trace):
+        if op == 'a':
+            result = memory.alloc(size, flags)
+            if result is None:
+                failed += 1
+                continue
+            live[block] = (result[0], result[1], size)
+            sizes[result[0]] += size
+            if sizes[result[0]] > peak[result[0]]:
+                peak[result[0]] = sizes[result[0]]
+        else:
+            entry = live.pop(block, None)
+            if entry is None:
+                continue            # Its allocation failed
+            kind, addr, size = entry
+            memory.free(kind, addr, size)
+            sizes[kind] -= size
+        if n % every == 0:
+            sample()
+    elapsed = time.perf_counter() - start
+    sample()
+
+    heaps = {}
+    for kind, heap in memory.heaps.items():
+        avail = heap.avail()
+        heaps[kind] = {
+            'live': sizes[kind],
+            'peak': peak[kind],
+            'free': avail,
+            'largest': heap.largest_free(),
+            'fragmentation': 1 - heap.largest_free() / avail if avail else 0.0,
+            'worst': worst[kind],
+            'overhead': heap.overhead(),
+        }
+    return {'failed': failed, 'ns_per_op': elapsed * 1e9 / max(1, len(trace)),
+            'seconds': elapsed, 'heaps': heaps}
+
+
+def report(name, trace, results):
+    allocs = sum(1 for op in trace if op[0] == 'a')
+    print(f"\n{name}: {len(trace)} ops ({allocs} allocs, {len(trace) - allocs} frees)")
+    print(f"{'allocator':<11}{'heap':<6}{'failed':>7}{'peak live':>11}{'largest free':>14}"
+          f"{'frag':>6}{'worst':>7}{'headers':>9}{'ns/op':>8}")
+    for allocator, result in results:
+        for kind, heap in result['heaps'].items():
+            headers = (f"{100 * heap['overhead'] / heap['live']:.1f}%"
+                       if heap['live'] else '-')
+            print(f"{allocator:<11}{kind:<6}{result['failed']:7d}{heap['peak'] // 1024:10d}K"
+                  f"{heap['largest'] // 1024:13d}K{100 * heap['fragmentation']:5.0f}%"
+                  f"{100 * heap['worst']:6.0f}%{headers:>9}{result['ns_per_op']:8.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay allocation traces against heap models")
+    parser.add_argument('--workload', default='mixed', choices=sorted(WORKLOADS) + ['all'])
+    parser.add_argument('--ops', type=int, default=100000)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--trace', metavar='FILE', help='replay a recorded trace instead')
+    parser.add_argument('--save-trace', metavar='FILE', help='write the synthetic trace')
+    parser.add_argument('--allocator', action='append', choices=sorted(ALLOCATORS),
+                        help='allocator to run (default: all)')
+    parser.add_argument('--kernel-size', type=lambda s: int(s, 0),
+                        help='kernel size in fast RAM, bss included (default: __end in SYSTEM.map)')
+    parser.add_argument('--fast-size', type=lambda s: int(s, 0),
+                        help="fast RAM board size (default: the stub's, 1MB)")
+    args = parser.parse_args()
+
+    end = FAST_BASE + args.kernel_size if args.kernel_size is not None else kernel_end()
+    if end is None:
+        # No map: the image alone, which misses .bss
+        size = os.path.getsize(DEFAULT_KERNEL) if os.path.exists(DEFAULT_KERNEL) else 0x10000
+        end = FAST_BASE + size
+        print(f"No __end in {KERNEL_MAP}; assuming the kernel ends at ${end:08X}")
+    entries = memory_map()
+    if args.fast_size:
+        entries = resize_fast(entries, args.fast_size)
+    ranges = heap_ranges(entries, end)
+    for kind, (start, end) in sorted(ranges.items()):
+        print(f"{kind} heap: ${start:08X}-${end - 1:08X} ({(end - start) // 1024}K)")
+
+    if args.trace:
+        traces = [(args.trace, read_trace(args.trace))]
+    else:
+        names = sorted(WORKLOADS) if args.workload == 'all' else [args.workload]
+        traces = [(name, synthetic(name, args.ops, args.seed)) for name in names]
+        if args.save_trace:
+            write_trace(args.save_trace, traces[-1][1])
+
+    for name, trace in traces:
+        results = [(allocator, replay(trace, allocator, ranges))
+                   for allocator in (args.allocator or ALLOCATORS)]
+        report(name, trace, results)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+"""
+Decodes the kernel's allocation trace (mem.c built with make TRACE=1).
+
+Usage: python3 memtrace.py CAPTURE [--text] [--top N] [--sim FILE]
+       python3 memtrace.py --live [--host H] [--port P] [--duration S]
+
+The kernel writes 16-byte binary records into the serial stream between
+kprintf text. CAPTURE is a raw serial capture, e.g. from
+serial_reader.py --log. Records are picked out by their magic byte and
+checksum; everything else is text, printed with --text.
+
+The report shows each heap as mem_init set it up, its live bytes and
+high-water mark with an occupancy map, failed allocations, and the
+callers that allocated the most. --sim writes the allocations as a
+heap_sim.py trace so they can be replayed against other allocators.
+"""
+
+import argparse
+import socket
+import struct
+import sys
+import time
+from collections import namedtuple
+
+# Must match mem.c
+MT_MAGIC = 0xFE
+MT_HEAP = 1
+MT_ALLOC = 2
+MT_FREE = 3
+MT_RECORD = struct.Struct('>BBBBLLL')
+
+ALLOC_CHIP = 1 << 0
+ALLOC_FAST = 1 << 1
+MEM_CHIP = 1
+MEM_FAST = 2
+HEAP_NAMES = {MEM_CHIP: 'chip', MEM_FAST: 'fast'}
+CHIP_LIMIT = 0x200000           # Chip RAM ends below the first fast RAM
+MAP_WIDTH = 64
+
+Record = namedtuple('Record', 'op flags size addr caller')
+
+
+def flags_name(flags):
+    if flags & ALLOC_CHIP:
+        return 'chip'
+    if flags & ALLOC_FAST:
+        return 'fast'
+    return 'any'
+
+
+class Decoder:
+    """Splits a serial byte stream into text and trace records
+
+    feed() can be called with arbitrary chunks; a record split across
+    chunks is held back until the rest arrives. flush() at the end of
+    the stream hands back a record that never completed as text.
+    """
+
+    def __init__(self):
+        self.pending = bytearray()
+        self.bad = 0                # Magic bytes that failed the checksum
+
+    def feed(self, chunk):
+        """Yield ('text', bytes) and ('record', Record) in stream order"""
+        data = self.pending + chunk
+        pos = 0
+        while True:
+            magic = data.find(MT_MAGIC, pos)
+            if magic < 0:
+                break
+            if magic > pos:
+                yield 'text', bytes(data[pos:magic])
+            if len(data) - magic < MT_RECORD.size:
+                self.pending = data[magic:]
+                return
+            fields = MT_RECORD.unpack_from(data, magic)
+            check = 0
+            for byte in data[magic:magic + MT_RECORD.size]:
+                check ^= byte
+            if check == 0:              # The check byte cancels the other fifteen
+                yield 'record', Record(fields[1], fields[2], *fields[4:])
+                pos = magic + MT_RECORD.size
+            else:
+                self.bad += 1
+                yield 'text', bytes(data[magic:magic + 1])
+                pos = magic + 1
+        if pos < len(data):
+            yield 'text', bytes(data[pos:])
+        self.pending = bytearray()
+
+    def flush(self):
+        """Yield the bytes still held back as ('text', bytes)"""
+        if self.pending:
+            yield 'text', bytes(self.pending)
+        self.pending = bytearray()
+
+
+class HeapView:
+    """Allocation state rebuilt from the records"""
+
+    def __init__(self):
+        self.heaps = {}             # MEM_CHIP/MEM_FAST -> (start, size)
+        self.live = {}              # addr -> (size, caller, id)
+        self.used = {}              # heap -> live bytes
+        self.peak = {}              # heap -> high-water live bytes
+        self.top = {}               # heap -> highest end address handed out
+        self.failed = []            # Records of failed allocations
+        self.callers = {}           # caller -> [count, bytes, heaps]
+        self.events = []            # heap_sim trace
+        self.allocs = 0
+        self.next_id = 0
+
+    def heap_of(self, addr):
+        for kind, (start, size) in self.heaps.items():
+            if start <= addr < start + size:
+                return kind
+        return MEM_CHIP if addr < CHIP_LIMIT else MEM_FAST
+
+    def apply(self, rec):
+        if rec.op == MT_HEAP:
+            self.heaps[rec.flags] = (rec.addr, rec.size)
+            self.used.setdefault(rec.flags, 0)
+            self.peak.setdefault(rec.flags, 0)
+        elif rec.op == MT_ALLOC:
+            self.allocs += 1
+            if not rec.addr:
+                self.failed.append(rec)
+                return
+            heap = self.heap_of(rec.addr)
+            self.live[rec.addr] = (rec.size, rec.caller, self.next_id)
+            self.events.append(('a', self.next_id, rec.size, flags_name(rec.flags)))
+            self.next_id += 1
+            self.used[heap] = self.used.get(heap, 0) + rec.size
+            self.peak[heap] = max(self.peak.get(heap, 0), self.used[heap])
+            self.top[heap] = max(self.top.get(heap, 0), rec.addr + rec.size)
+            stats = self.callers.setdefault(rec.caller, [0, 0, set()])
+            stats[0] += 1
+            stats[1] += rec.size
+            stats[2].add(HEAP_NAMES[heap])
+        elif rec.op == MT_FREE:
+            block = self.live.pop(rec.addr, None)
+            if block:
+                size, _, block_id = block
+                self.used[self.heap_of(rec.addr)] -= size
+                self.events.append(('f', block_id, 0, None))
+
+    def occupancy(self, kind, width=MAP_WIDTH):
+        """One character per slice of the heap: '#' mostly live, '+' partly, '.' free"""
+        start, size = self.heaps[kind]
+        step = max(1, -(-size // width))
+        filled = [0] * width
+        for addr, (length, _, _) in self.live.items():
+            if self.heap_of(addr) != kind:
+                continue
+            pos, end = addr - start, addr - start + length
+            while pos < end:
+                cell = pos // step
+                cut = min(end, (cell + 1) * step)
+                if 0 <= cell < width:
+                    filled[cell] += cut - pos
+                pos = cut
+        return ''.join('#' if n * 2 >= step else '+' if n else '.' for n in filled)
+
+
+def records_from(chunks, view, text_out=None):
+    """Feed byte chunks through a Decoder into view; return the decoder"""
+    decoder = Decoder()
+    for chunk in chunks:
+        for kind, item in decoder.feed(chunk):
+            if kind == 'record':
+                view.apply(item)
+            elif text_out:
+                text_out.write(item)
+    for _, item in decoder.flush():
+        if text_out:
+            text_out.write(item)
+    return decoder
+
+
+def read_file(path, size=65536):
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(size)
+            if not chunk:
+                return
+            yield chunk
+
+
+def read_live(host, port, duration):
+    sock = socket.create_connection((host, port), timeout=2)
+    sock.settimeout(1)
+    start = time.monotonic()
+    try:
+        while duration is None or time.monotonic() - start < duration:
+            try:
+                chunk = sock.recv(4096)
+            except socket.timeout:
+                continue
+            if not chunk:
+                break
+            yield chunk
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sock.close()
+
+
+def report(view, decoder, top=10):
+    print(f"{view.allocs} allocations, {len(view.failed)} failed"
+          f"{f', {decoder.bad} bad records' if decoder.bad else ''}")
+    for kind in sorted(view.heaps):
+        start, size = view.heaps[kind]
+        used, peak = view.used.get(kind, 0), view.peak.get(kind, 0)
+        mark = view.top.get(kind, start) - start
+        print(f"\n{HEAP_NAMES[kind]} heap ${start:08X}-${start + size - 1:08X} ({size // 1024}K)")
+        print(f"  live {used} bytes ({100 * used / size:.1f}%), peak {peak}, "
+              f"high-water ${start + mark:08X} ({100 * mark / size:.1f}%)")
+        print(f"  [{view.occupancy(kind)}]")
+
+    if view.failed:
+        print()
+    for rec in view.failed[:top]:
+        print(f"✗ {flags_name(rec.flags)} alloc of {rec.size} bytes failed, caller ${rec.caller:08X}")
+
+    if view.callers:
+        print(f"\n{'caller':<12}{'allocs':>8}{'bytes':>12}  heaps")
+        ranked = sorted(view.callers.items(), key=lambda item: item[1][1], reverse=True)
+        for caller, (count, total, heaps) in ranked[:top]:
+            print(f"${caller:08X}  {count:8d}{total:12d}  {','.join(sorted(heaps))}")
+
+
+def write_sim(path, view):
+    with open(path, 'w') as f:
+        f.write("# memtrace.py: kernel allocations\n")
+        for op, block, size, flags in view.events:
+            f.write(f"a {block} {size} {flags}\n" if op == 'a' else f"f {block}\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Decode the kernel allocation trace")
+    parser.add_argument('capture', nargs='?', help='raw serial capture')
+    parser.add_argument('--live', action='store_true', help='read the serial port instead')
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=5555)
+    parser.add_argument('--duration', type=float, help='stop reading after this many seconds')
+    parser.add_argument('--text', action='store_true', help='print the kprintf text as well')
+    parser.add_argument('--top', type=int, default=10, help='callers to list')
+    parser.add_argument('--sim', metavar='FILE', help='write a heap_sim.py trace')
+    args = parser.parse_args()
+
+    if not args.capture and not args.live:
+        parser.error("give a capture file or --live")
+
+    view = HeapView()
+    text_out = sys.stdout.buffer if args.text else None
+    try:
+        chunks = (read_live(args.host, args.port, args.duration) if args.live
+                  else read_file(args.capture))
+        decoder = records_from(chunks, view, text_out)
+    except OSError as e:
+        print(f"Error: {e}")
+        return 1
+    if text_out:
+        text_out.flush()
+        print()
+
+    if not view.allocs and not view.heaps:
+        print("No trace records (kernel not built with make TRACE=1?)")
+        return 1
+    report(view, decoder, args.top)
+    if args.sim:
+        write_sim(args.sim, view)
+        print(f"\nWrote {len(view.events)} events to {args.sim}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+Pack SYSTEM.BIN so the ROM reads fewer sectors at boot.
+
+Usage: python3 pack_kernel.py [src/kernel/build/SYSTEM.BIN] [-o SYSTEM.PAK]
+                              [--hdf harddrives/boot.hdf] [--lba N] [--depth 32]
+
+The output is a 16-byte header (magic 'AMPK', unpacked size, packed
+size, checksum; big-endian longs) and LZ4 block data. LZ4 is byte
+aligned with no entropy coding, so the 68000 decodes it with a byte
+copy loop per sequence (lz4_decode in src/rom/unpack.s). Deploy the
+output as SYSTEM.BIN; load_system_bin recognises the header and still
+boots raw images.
+
+The ROM loads the file to end PK_MARGIN bytes past the unpacked image
+and unpacks in place. Every packed image is unpacked that way here
+before it is written, so one that would overwrite its own input is
+never deployed.
+
+The report shows the sectors load_system_bin reads either way; with
+--hdf they are rounded up to that volume's clusters. Whether the saved
+reads beat the decode time shows in boot_profile.py's fat16 and unpack
+phases and the ticks the ROM prints.
+"""
+
+import argparse
+import struct
+import sys
+import time
+
+from hdf import HDF, HDFError, open_volume, BLOCK_SIZE, KERNEL_MAX_SIZE
+
+DEFAULT_KERNEL = 'src/kernel/build/SYSTEM.BIN'
+DEFAULT_OUTPUT = 'src/kernel/build/SYSTEM.PAK'
+
+# unpack.s
+MAGIC = b'AMPK'
+HEADER = struct.Struct('>4sIII')        # magic, raw size, packed size, checksum
+MARGIN_EXTRA = 32                       # PK_MARGIN = packed / 256 + 32
+
+# LZ4 block format
+MIN_MATCH = 4
+LAST_LITERALS = 5                       # The last 5 bytes are always literals
+MF_LIMIT = 12                           # No match starts in the last 12 bytes
+MAX_OFFSET = 0xFFFF
+DEPTH = 32                              # Hash chain candidates per position
+
+
+class PackError(Exception):
+    pass
+
+
+def checksum(data):
+    """Sum of the big-endian longs of data, zero-padded, mod 2^32"""
+    padded = data + bytes(-len(data) % 4)
+    return sum(struct.unpack(f'>{len(padded) // 4}I', padded)) & 0xFFFFFFFF
+
+
+def margin(packed_size):
+    """Bytes the packed image ends past the unpacked one (PK_MARGIN)"""
+    return (packed_size >> 8) + MARGIN_EXTRA
+
+
+def _length(out, n):
+    while n >= 255:
+        out.append(255)
+        n -= 255
+    out.append(n)
+
+
+def _sequence(out, literals, match_len=0, offset=0):
+    lit = len(literals)
+    extra = match_len - MIN_MATCH
+    out.append(min(lit, 15) << 4 | (min(extra, 15) if offset else 0))
+    if lit >= 15:
+        _length(out, lit - 15)
+    out += literals
+    if offset:
+        out += struct.pack('<H', offset)
+        if extra >= 15:
+            _length(out, extra - 15)
+
+
+def compress(data, depth=DEPTH):
+    """LZ4 block data for data: greedy longest match over hash chains"""
+    size = len(data)
+    out = bytearray()
+    head = {}
+    chain = [-1] * size
+    limit = size - MF_LIMIT
+    match_end = size - LAST_LITERALS
+
+    def insert(pos):
+        key = data[pos:pos + MIN_MATCH]
+        chain[pos] = head.get(key, -1)
+        head[key] = pos
+
+    anchor = pos = 0
+    while pos < limit:
+        best_len = best_off = 0
+        candidate = head.get(data[pos:pos + MIN_MATCH], -1)
+        tries = depth
+        while candidate >= 0 and pos - candidate <= MAX_OFFSET and tries:
+            length = MIN_MATCH
+            while pos + length < match_end and data[candidate + length] == data[pos + length]:
+                length += 1
+            if length > best_len:
+                best_len, best_off = length, pos - candidate
+            candidate = chain[candidate]
+            tries -= 1
+        insert(pos)
+        if best_len < MIN_MATCH:
+            pos += 1
+            continue
+        _sequence(out, data[anchor:pos], best_len, best_off)
+        for skipped in range(pos + 1, min(pos + best_len, limit)):
+            insert(skipped)
+        pos += best_len
+        anchor = pos
+    _sequence(out, data[anchor:])
+    return bytes(out)
+
+
+def _decode(buf, src, end, dst):
+    """lz4_decode on one buffer: input at buf[src:end], output from dst
+
+    Copies byte by byte as the 68000 does, so output that overtakes the
+    input reads what it overwrote, as it would in the ROM.
+    """
+    base = dst
+    while True:
+        token = buf[src]
+        src += 1
+        lit = token >> 4
+        if lit == 15:
+            while True:
+                lit += buf[src]
+                src += 1
+                if buf[src - 1] != 255:
+                    break
+        for i in range(lit):
+            buf[dst + i] = buf[src + i]
+        src += lit
+        dst += lit
+        if src >= end:
+            return src, dst
+        offset = buf[src] | buf[src + 1] << 8
+        src += 2
+        if not offset or offset > dst - base:
+            raise PackError(f"bad match offset {offset} at output {dst}")
+        length = token & 15
+        if length == 15:
+            while True:
+                length += buf[src]
+                src += 1
+                if buf[src - 1] != 255:
+                    break
+        for i in range(length + MIN_MATCH):         # May overlap its own output
+            buf[dst + i] = buf[dst - offset + i]
+        dst += length + MIN_MATCH
+        if src >= end:
+            return src, dst
+
+
+def unpack(image):
+    """Unpacked data of a packed image; raises PackError if it is not one"""
+    magic, raw_size, packed_size, expected = HEADER.unpack_from(image)
+    if magic != MAGIC:
+        raise PackError("no AMPK header")
+    buf = bytearray(image[HEADER.size:HEADER.size + packed_size] + bytes(raw_size))
+    src, dst = _decode(buf, 0, packed_size, packed_size)
+    data = bytes(buf[packed_size:dst])
+    if src != packed_size or len(data) != raw_size or checksum(data) != expected:
+        raise PackError("unpacked data does not match the header")
+    return data
+
+
+def unpack_in_place(image):
+    """Unpack as the ROM does: image loaded to end margin() past the output
+
+    Returns the unpacked data, which differs from the original if the
+    output overtook input it had not read yet.
+    """
+    _, raw_size, packed_size, _ = HEADER.unpack_from(image)
+    start = (raw_size + margin(packed_size) - len(image)) & ~1    # and.w #$FFFE
+    if start < 0:
+        raise PackError("packed image is larger than the unpacked one")
+    buf = bytearray(max(start + len(image), raw_size) + 3)
+    buf[start:start + len(image)] = image
+    src = start + HEADER.size
+    _, dst = _decode(buf, src, src + packed_size, 0)
+    return bytes(buf[:dst])
+
+
+def pack(data, depth=DEPTH):
+    """Header + LZ4 data for data, checked to unpack in place"""
+    if not data:
+        raise PackError("empty kernel")
+    if data[:4] == MAGIC:
+        raise PackError("already packed")
+    packed = compress(data, depth)
+    image = HEADER.pack(MAGIC, len(data), len(packed), checksum(data)) + packed
+    if len(data) + margin(len(packed)) > KERNEL_MAX_SIZE:
+        raise PackError(f"{len(data)} bytes unpacked is more than the ROM loads (512KB)")
+    if unpack(image) != data or unpack_in_place(image) != data:
+        raise PackError("packed image does not unpack in place")
+    return image
+
+
+def sectors(size, per_read=1):
+    """Sectors read for a file of size bytes, in whole reads of per_read"""
+    reads = -(-size // (per_read * BLOCK_SIZE))
+    return max(1, reads) * per_read
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pack SYSTEM.BIN for the ROM's LZ4 loader")
+    parser.add_argument('kernel', nargs='?', default=DEFAULT_KERNEL)
+    parser.add_argument('-o', '--output', default=DEFAULT_OUTPUT)
+    parser.add_argument('--hdf', metavar='IMAGE', help='round sectors up to this volume\'s clusters')
+    parser.add_argument('--lba', type=int, help='FAT16 volume start (skip RDB/PART)')
+    parser.add_argument('--depth', type=int, default=DEPTH,
+                        help='match candidates tried per position')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    try:
+        with open(args.kernel, 'rb') as f:
+            data = f.read()
+        image = pack(data, args.depth)
+        per_read = 1
+        if args.hdf:
+            with HDF(args.hdf) as hdf:
+                per_read = open_volume(hdf, lambda line: None, args.lba).bpb.sec_per_clus
+    except (PackError, HDFError, OSError) as e:
+        print(f"✗ {args.kernel}: {e}")
+        return 1
+
+    elapsed = time.perf_counter() - start
+    raw_secs, packed_secs = sectors(len(data), per_read), sectors(len(image), per_read)
+    unit = f" ({per_read}-sector clusters)" if args.hdf else ""
+    print(f"{args.kernel}: {len(data):,d} -> {len(image):,d} bytes "
+          f"({100 * len(image) / len(data):.1f}%) in {elapsed:.2f}s")
+    print(f"Sectors read at boot{unit}: {raw_secs} -> {packed_secs} "
+          f"({raw_secs - packed_secs} fewer)")
+    print(f"Unpacks in place with {margin(len(image) - HEADER.size)} bytes of margin, "
+          f"checksum ${checksum(data):08X}")
+    if len(image) >= len(data):
+        print("✗ Packing does not shrink this kernel; deploy it raw")
+        return 1
+
+    with open(args.output, 'wb') as f:
+        f.write(image)
+    print(f"✓ Wrote {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
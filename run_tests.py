@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Sharded test runner: spreads the debugger test cases across N emulators.
+
+Usage: python3 run_tests.py [-j N] [--stub] [--config configs/a600.fs-uae]
+                            [-k PATTERN] [--no-build]
+
+Each emulator gets its own serial port and HDF copy (see emulator.py).
+Workers pull cases from a shared queue, so a slow case never holds up the
+rest of a shard. Each worker boots once and keeps its emulator warm: when
+it moves on to another test module, the session restores the RAM and
+registers it started with. Results are merged into one summary with
+per-case times.
+"""
+
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import time
+
+import test_comprehensive
+import test_ide
+import test_memory_config
+import test_sprintf
+from debugger_client import DebuggerError
+from emulator import Emulator, Session, DEFAULT_CONFIG, DEFAULT_WORKDIR, BASE_PORT
+
+SUITES = [
+    ('comprehensive', test_comprehensive.CASES),
+    ('memory_config', test_memory_config.CASES),
+    ('ide', test_ide.CASES),
+    ('sprintf', test_sprintf.CASES),
+]
+
+# The stub has no drive and its boot log stops at "RDB: Not found", so
+# these only mean something on FS-UAE
+EMULATOR_ONLY = {'ide'}
+
+
+def collect(pattern=None, stub=False):
+    """All (suite, name, case) triples, optionally filtered by substring"""
+    cases = []
+    for suite, suite_cases in SUITES:
+        if stub and suite in EMULATOR_ONLY:
+            print(f"Skipping {suite}: needs FS-UAE")
+            continue
+        for name, case in suite_cases:
+            if pattern and pattern.lower() not in f"{suite} {name}".lower():
+                continue
+            cases.append((suite, name, case))
+    return cases
+
+
+async def worker(session, queue, results):
+    """Boot one emulator and run cases from the queue until it is empty"""
+    index = session.emulator.index
+    try:
+        await session.start()
+    except (DebuggerError, OSError, asyncio.TimeoutError) as e:
+        print(f"[emu {index}] failed to start: {e}")
+        await session.stop()
+        return
+    print(f"[emu {index}] boot: {session.progress}")
+
+    suite_running = None
+    try:
+        while not queue.empty():
+            order, suite, name, case = queue.get_nowait()
+            if suite != suite_running:
+                if suite_running is not None:
+                    # Next module gets the machine as it booted
+                    await session.reset()
+                suite_running = suite
+
+            start = time.perf_counter()
+            try:
+                passed, message = await case(session.dbg)
+            except DebuggerError as e:
+                passed, message = False, f"{type(e).__name__}: {e}"
+                session.failed()
+            elapsed = time.perf_counter() - start
+            results.append((order, suite, name, passed, message, elapsed, index))
+            mark = '✓' if passed else '✗'
+            print(f"[emu {index}] {mark} {suite}: {name} ({elapsed:.2f}s)")
+
+            if not session.healthy:
+                # Timeout or lost connection: cold boot before the next case
+                await session.reset()
+    except (DebuggerError, OSError, asyncio.TimeoutError) as e:
+        print(f"[emu {index}] lost the emulator ({e}), leaving the rest to other instances")
+    finally:
+        if session.boots > 1:
+            print(f"[emu {index}] booted {session.boots} times")
+        await session.stop()
+
+
+def print_summary(results, total, wall):
+    print("\n" + "=" * 60)
+    print("TEST SUMMARY")
+    print("=" * 60)
+    for order, suite, name, passed, message, elapsed, index in sorted(results):
+        status = "✓ PASS" if passed else "✗ FAIL"
+        print(f"{status} {elapsed:6.2f}s  emu {index}  {suite}: {name}")
+        if not passed:
+            print(f"         {message}")
+
+    passed = sum(1 for r in results if r[3])
+    failed = len(results) - passed
+    not_run = total - len(results)
+    busy = sum(r[5] for r in results)
+    print()
+    print(f"Passed:       {passed}")
+    print(f"Failed:       {failed}")
+    if not_run:
+        print(f"Not run:      {not_run}")
+    print(f"Total tests:  {total}")
+    print(f"Wall time:    {wall:.2f}s ({busy:.2f}s in test cases)")
+    print()
+    if failed or not_run:
+        print(f"✗ {failed + not_run} TEST(S) FAILED")
+        return False
+    print("✓ ALL TESTS PASSED")
+    return True
+
+
+async def run(args):
+    cases = collect(args.k, args.stub)
+    queue = asyncio.Queue()
+    for order, (suite, name, case) in enumerate(cases):
+        queue.put_nowait((order, suite, name, case))
+
+    jobs = max(1, min(args.jobs, len(cases)))
+    print(f"Running {len(cases)} tests on {jobs} {'stub' if args.stub else 'emulator'}(s)")
+    sessions = [Session(Emulator(i, args.config, args.workdir, args.base_port, args.stub))
+                for i in range(jobs)]
+
+    results = []
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(session, queue, results) for session in sessions))
+    return print_summary(results, len(cases), time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the debugger tests on several emulators")
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1,
+                        help='number of emulator instances')
+    parser.add_argument('--config', default=DEFAULT_CONFIG,
+                        help='base FS-UAE config (a600 or a500)')
+    parser.add_argument('--workdir', default=DEFAULT_WORKDIR)
+    parser.add_argument('--base-port', type=int, default=BASE_PORT)
+    parser.add_argument('--stub', action='store_true',
+                        help='use debugger_stub.py instead of FS-UAE')
+    parser.add_argument('--no-build', action='store_true',
+                        help='skip make rom deploy')
+    parser.add_argument('-k', metavar='PATTERN', help='only run tests matching PATTERN')
+    args = parser.parse_args()
+
+    if not args.stub and not args.no_build:
+        if subprocess.run(['make', 'rom', 'deploy']).returncode != 0:
+            print("Build failed")
+            return 1
+
+    return 0 if asyncio.run(run(args)) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
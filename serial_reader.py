@@ -1,21 +1,44 @@
 #!/usr/bin/env python3
-"""Serial port reader for FS-UAE debugging"""
+"""Serial port reader for FS-UAE debugging
 
+Usage: python3 serial_reader.py                      Print boot output (5s)
+       python3 serial_reader.py --log FILE [--duration S] [--echo]
+       python3 serial_reader.py --query FILE [--from S] [--to S] [--grep RE]
+
+--log streams everything to an append-only FILE and keeps a side index,
+FILE.idx, with one fixed-size (timestamp, byte offset, line number) record
+per line. --query memory-maps both, so picking lines out of hours of
+kprintf output never loads the whole log. --from/--to are seconds since
+the first line.
+"""
+
+import argparse
+import mmap
+import re
 import socket
+import struct
 import sys
 import time
 
+INDEX_SUFFIX = '.idx'
+# Line start: wall-clock time of the first byte, offset in the log, line number
+INDEX_ENTRY = struct.Struct('<dQI')
+
+def _connect(host, port):
+    print(f"Connecting to {host}:{port}...", file=sys.stderr)
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.settimeout(2)
+    sock.connect((host, port))
+    print("Connected!", file=sys.stderr)
+    return sock
+
 def read_serial(host='localhost', port=5555, timeout=5):
     """Connect to FS-UAE serial port and read data"""
     try:
-        print(f"Connecting to {host}:{port}...", file=sys.stderr)
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        sock.settimeout(2)
-        sock.connect((host, port))
-        print("Connected!", file=sys.stderr)
+        sock = _connect(host, port)
 
         sock.settimeout(timeout)
-        data = b''
+        data = bytearray()
         start_time = time.time()
 
         while time.time() - start_time < timeout:
@@ -37,11 +60,236 @@ def read_serial(host='localhost', port=5555, timeout=5):
 
         sock.close()
         print(f"\n\nTotal bytes received: {len(data)}", file=sys.stderr)
-        return data
+        return bytes(data)
 
     except Exception as e:
         print(f"Error: {e}", file=sys.stderr)
         return b''
 
+class SerialLog:
+    """Append-only capture file plus its line index
+
+    Appending to an existing log continues its line numbering.
+    """
+
+    def __init__(self, path):
+        self.log = open(path, 'ab')
+        self.index = open(path + INDEX_SUFFIX, 'ab')
+        self.offset = self.log.tell()
+        self.lines = self.index.tell() // INDEX_ENTRY.size
+        self.line_start = True
+        if self.offset:
+            with open(path, 'rb') as f:
+                f.seek(-1, 2)
+                self.line_start = f.read(1) == b'\n'
+
+    def write(self, chunk, stamp):
+        """Append a chunk received at stamp, indexing each line it starts"""
+        entries = []
+        pos = 0
+        while pos < len(chunk):
+            if self.line_start:
+                entries.append(INDEX_ENTRY.pack(stamp, self.offset + pos, self.lines))
+                self.lines += 1
+            newline = chunk.find(b'\n', pos)
+            if newline < 0:
+                self.line_start = False
+                break
+            self.line_start = True
+            pos = newline + 1
+        self.log.write(chunk)
+        self.index.write(b''.join(entries))
+        self.offset += len(chunk)
+
+    def flush(self):
+        self.log.flush()
+        self.index.flush()
+
+    def close(self):
+        self.log.close()
+        self.index.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def capture(path, host='localhost', port=5555, duration=None, echo=False):
+    """Stream the serial port into a SerialLog until EOF or duration
+
+    Returns the number of bytes captured.
+    """
+    sock = _connect(host, port)
+    sock.settimeout(1)
+    # Wall-clock start, monotonic progress: timestamps never go backwards
+    wall, mono = time.time(), time.monotonic()
+    total = 0
+    with SerialLog(path) as log:
+        try:
+            while duration is None or time.monotonic() - mono < duration:
+                try:
+                    chunk = sock.recv(4096)
+                except socket.timeout:
+                    log.flush()
+                    continue
+                if not chunk:
+                    break
+                log.write(chunk, wall + time.monotonic() - mono)
+                total += len(chunk)
+                if echo:
+                    sys.stdout.buffer.write(chunk)
+                    sys.stdout.buffer.flush()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            sock.close()
+    print(f"\nCaptured {total} bytes, {log.lines} lines in {path}", file=sys.stderr)
+    return total
+
+class LogQuery:
+    """Read-only view of a SerialLog through mmap
+
+    Lines come back as (timestamp, line number, text) with the line
+    ending stripped.
+    """
+
+    def __init__(self, path):
+        self._files = [open(path, 'rb'), open(path + INDEX_SUFFIX, 'rb')]
+        self.log, self.index = (self._map(f) for f in self._files)
+        self.lines = len(self.index) // INDEX_ENTRY.size
+
+    @staticmethod
+    def _map(f):
+        f.seek(0, 2)
+        if not f.tell():
+            return b''              # mmap refuses empty files
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def close(self):
+        for m in (self.log, self.index):
+            if isinstance(m, mmap.mmap):
+                m.close()
+        for f in self._files:
+            f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self.lines
+
+    def entry(self, n):
+        """(timestamp, offset, line number) of line n"""
+        return INDEX_ENTRY.unpack_from(self.index, n * INDEX_ENTRY.size)
+
+    def span(self, n):
+        """Byte range of line n in the log"""
+        start = self.entry(n)[1]
+        end = self.entry(n + 1)[1] if n + 1 < self.lines else len(self.log)
+        return start, end
+
+    def line(self, n):
+        start, end = self.span(n)
+        text = self.log[start:end].decode('ascii', errors='replace').strip('\r\n')
+        return self.entry(n)[0], n, text
+
+    def _bisect(self, value, field):
+        """First line whose index field (0 = time, 1 = offset) exceeds value"""
+        lo, hi = 0, self.lines
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.entry(mid)[field] <= value:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def line_at(self, offset):
+        """Number of the line holding byte offset"""
+        return self._bisect(offset, 1) - 1
+
+    def first_time(self):
+        return self.entry(0)[0] if self.lines else None
+
+    def _range(self, start, end):
+        """Line numbers [first, last) with start <= timestamp < end"""
+        first = 0 if start is None else self._bisect(start - 1e-9, 0)
+        last = self.lines if end is None else self._bisect(end - 1e-9, 0)
+        return first, last
+
+    def between(self, start=None, end=None):
+        """Lines with start <= timestamp < end (wall-clock seconds)"""
+        first, last = self._range(start, end)
+        for n in range(first, last):
+            yield self.line(n)
+
+    def grep(self, pattern, start=None, end=None):
+        """Lines matching a regex, optionally within a time range
+
+        The regex is a bytes pattern run over each line without its line
+        ending, so ^ and $ match at the text whether the line ends in
+        CR LF (kprintf) or LF with the CR starting the next line (ROM).
+        """
+        if isinstance(pattern, str):
+            pattern = pattern.encode('ascii')
+        regex = re.compile(pattern)
+        first, last = self._range(start, end)
+        if first >= last:
+            return
+        size = INDEX_ENTRY.size
+        entries = INDEX_ENTRY.iter_unpack(self.index[first * size:last * size])
+        offsets = [offset for _, offset, _ in entries] + [self.span(last - 1)[1]]
+        for n in range(first, last):
+            line_start, line_end = offsets[n - first], offsets[n - first + 1]
+            text = self.log[line_start:line_end].strip(b'\r\n')
+            if regex.search(text):
+                yield self.line(n)
+
+def query(path, start=None, end=None, pattern=None):
+    """Print lines from a log; start/end are seconds since its first line"""
+    with LogQuery(path) as log:
+        origin = log.first_time()
+        if origin is None:
+            return 0
+        start = None if start is None else origin + start
+        end = None if end is None else origin + end
+        found = log.grep(pattern, start, end) if pattern else log.between(start, end)
+        count = 0
+        for stamp, n, text in found:
+            print(f"{stamp - origin:10.3f}  {n:7d}  {text}")
+            count += 1
+    return count
+
+def main():
+    parser = argparse.ArgumentParser(description="Read or capture the FS-UAE serial port")
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=5555)
+    parser.add_argument('--timeout', type=float, default=5,
+                        help='seconds to print boot output for')
+    parser.add_argument('--log', metavar='FILE', help='stream to an indexed capture file')
+    parser.add_argument('--duration', type=float, help='stop capturing after this many seconds')
+    parser.add_argument('--echo', action='store_true', help='also print what is captured')
+    parser.add_argument('--query', metavar='FILE', help='print lines from a capture file')
+    parser.add_argument('--from', dest='start', type=float, help='seconds since the first line')
+    parser.add_argument('--to', dest='end', type=float, help='seconds since the first line')
+    parser.add_argument('--grep', metavar='REGEX', help='only lines matching REGEX')
+    args = parser.parse_args()
+
+    if args.query:
+        query(args.query, args.start, args.end, args.grep)
+    elif args.log:
+        try:
+            capture(args.log, args.host, args.port, args.duration, args.echo)
+        except OSError as e:
+            print(f"Error: {e}", file=sys.stderr)
+            return 1
+    else:
+        read_serial(args.host, args.port, args.timeout)
+    return 0
+
 if __name__ == '__main__':
-    read_serial()
+    sys.exit(main())
@@ -0,0 +1,28 @@
+/*
+ * cpu.h - Status register access and critical sections
+ *
+ * See docs/interrupt_control_design.md.
+ */
+
+#ifndef CPU_H
+#define CPU_H
+
+/* Exception vector for level 1 interrupts (TBE, DSKBLK, SOFTINT) */
+#define VEC_LEVEL1  ((void (**)(void))0x64)
+
+unsigned short cpu_sr_get(void);
+void cpu_sr_set(unsigned int sr);     /* int: a long on the stack */
+void cpu_int_disable(void);
+void cpu_int_enable(void);
+
+/* Level 1 autovector entry (cpu.s), calls ser_tx_interrupt */
+void cpu_level1_isr(void);
+
+/*
+ * Save SR and mask interrupts; CRITICAL_EXIT restores whatever the
+ * caller had, so sections nest and are safe in ISR context.
+ */
+#define CRITICAL_ENTER(save)  do { (save) = cpu_sr_get(); cpu_int_disable(); } while (0)
+#define CRITICAL_EXIT(save)   cpu_sr_set(save)
+
+#endif /* CPU_H */
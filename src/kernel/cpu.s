@@ -0,0 +1,55 @@
+; cpu.s - Status register access and interrupt entry points
+;
+; See docs/interrupt_control_design.md. Each SR function is a single
+; instruction; move to/from SR is atomic on the 68000.
+
+        section CODE
+
+        xdef    _cpu_sr_get
+        xdef    _cpu_sr_set
+        xdef    _cpu_int_disable
+        xdef    _cpu_int_enable
+        xdef    _cpu_level1_isr
+
+        xref    _ser_tx_interrupt
+
+;---------------------------------------------------------------
+; unsigned short cpu_sr_get(void) - Current SR in D0
+;---------------------------------------------------------------
+_cpu_sr_get:
+        moveq   #0,d0
+        move.w  sr,d0
+        rts
+
+;---------------------------------------------------------------
+; void cpu_sr_set(unsigned int sr) - SR from the stack argument
+; The argument is a long, its low word is at 6(sp)
+;---------------------------------------------------------------
+_cpu_sr_set:
+        move.w  6(sp),sr
+        rts
+
+;---------------------------------------------------------------
+; void cpu_int_disable(void) - Mask all interrupt levels
+;---------------------------------------------------------------
+_cpu_int_disable:
+        move.w  #$2700,sr
+        rts
+
+;---------------------------------------------------------------
+; void cpu_int_enable(void) - Allow all interrupt levels
+;---------------------------------------------------------------
+_cpu_int_enable:
+        move.w  #$2000,sr
+        rts
+
+;---------------------------------------------------------------
+; Level 1 autovector ($64): TBE, DSKBLK, SOFTINT
+; Only TBE is enabled so far. Saves the registers vbcc lets a C
+; function trash; the 68000 has already masked level 1.
+;---------------------------------------------------------------
+_cpu_level1_isr:
+        movem.l d0-d1/a0-a1,-(sp)
+        jsr     _ser_tx_interrupt
+        movem.l (sp)+,d0-d1/a0-a1
+        rte
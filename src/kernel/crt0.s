@@ -11,6 +11,7 @@
         xdef    _rom_panic
 
         xref    _kernel_main
+        xref    _ser_flush
         xref    __bss_start
         xref    __bss_end
 
@@ -36,7 +37,11 @@ _start:
         addq.l  #4,sp                   ; clean up argument
 
         ; kernel_main should never return
-        ; if it does, panic
+        ; if it does, panic: send what is queued, then hand the UART
+        ; back to the ROM debugger, which polls it with TBE off
+        jsr     _ser_flush
+        move.w  #$2700,sr
+        move.w  #$0001,$DFF09A          ; INTENA: clear TBE
         move.l  _rom_panic,a0
         jmp     (a0)
 
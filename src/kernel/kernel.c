@@ -3,6 +3,7 @@
  */
 
 #include "amiga_hw.h"
+#include "cpu.h"
 #include "mem.h"
 #include "serial.h"
 #include "kprintf.h"
@@ -50,10 +51,22 @@ static void print_memory_map(MemEntry *map)
     pr_info("==================\n\n");
 }
 
+static void print_serial_stats(void)
+{
+    struct ser_stats stats;
+
+    ser_get_stats(&stats);
+    pr_info("Serial: %lu bytes queued, %lu sent, %lu dropped, %lu waits, "
+            "high water %u/%u\n",
+            stats.queued, stats.sent, stats.dropped, stats.waits,
+            stats.high_water, SER_TX_SIZE - 1);
+}
+
 void kernel_main(MemEntry *memmap)
 {
-    /* Initialize serial */
+    /* Initialize serial; output is queued and sent by the TBE interrupt */
     ser_init();
+    cpu_int_enable();
 
     pr_info("\n");
     pr_info("Kernel starting successfully!\n");
@@ -68,6 +81,12 @@ void kernel_main(MemEntry *memmap)
     pr_info("Chip RAM free: %lu bytes\n", mem_avail_chip());
     pr_info("Fast RAM free: %lu bytes\n", mem_avail_fast());
 
+#ifdef SER_BENCH
+    ser_bench();
+#endif
+
+    print_serial_stats();
+
     /* TODO: set up exception handlers */
     /* TODO: initialize display */
     /* TODO: everything else */
@@ -16,6 +16,11 @@
         xdef    __modu
         xdef    __mods
 
+        ifd     MEM_TRACE
+        xdef    _mem_alloc
+        xref    _mem_alloc_traced
+        endc
+
 ;---------------------------------------------------------------
 ; __divu - Unsigned 32-bit divide
 ; D0 / D1 -> D0 (quotient)
@@ -252,3 +257,19 @@ __mods:
 .smod_zero:
         moveq   #0,d0
         rts
+
+        ifd     MEM_TRACE
+;---------------------------------------------------------------
+; _mem_alloc - Allocation tracing entry (MEM_TRACE builds only)
+; void *mem_alloc(size, flags) -> mem_alloc_traced(size, flags, caller)
+; Adds the caller's return address so the trace can say who
+; allocated. Result in D0.
+;---------------------------------------------------------------
+_mem_alloc:
+        move.l  (sp),-(sp)      ; caller
+        move.l  12(sp),-(sp)    ; flags
+        move.l  12(sp),-(sp)    ; size
+        jsr     _mem_alloc_traced
+        lea     12(sp),sp
+        rts
+        endc
@@ -3,9 +3,16 @@
  *
  * Phase 1 allocator: simple, no free.
  * Separate heaps for chip and fast RAM.
+ *
+ * Built with MEM_TRACE (make TRACE=1), every heap set up by mem_init and
+ * every mem_alloc call is reported as a 16-byte binary record on the
+ * serial port, interleaved with kprintf text. memtrace.py decodes them.
  */
 
 #include "mem.h"
+#ifdef MEM_TRACE
+#include "serial.h"
+#endif
 
 /* Heap state */
 struct heap {
@@ -23,6 +30,55 @@ static unsigned long align_up(unsigned long val, unsigned long align)
     return (val + align - 1) & ~(align - 1);
 }
 
+#ifdef MEM_TRACE
+/*
+ * Trace record, all fields big-endian:
+ *   0  MT_MAGIC   never sent by kprintf (text is 7-bit)
+ *   1  op         MT_HEAP, MT_ALLOC (MT_FREE reserved for mem_free)
+ *   2  flags      ALLOC_* requested (MT_HEAP: MEM_CHIP/MEM_FAST)
+ *   3  check      XOR of bytes 0-2 and 4-15
+ *   4  size       requested bytes (MT_HEAP: heap size)
+ *   8  addr       returned pointer, 0 on failure (MT_HEAP: heap start)
+ *  12  caller     return address of the mem_alloc call
+ */
+#define MT_MAGIC     0xFE
+#define MT_HEAP      1
+#define MT_ALLOC     2
+#define MT_FREE      3
+#define MT_SIZE      16
+
+static void put_long(unsigned char *p, unsigned long val)
+{
+    p[0] = (unsigned char)(val >> 24);
+    p[1] = (unsigned char)(val >> 16);
+    p[2] = (unsigned char)(val >> 8);
+    p[3] = (unsigned char)val;
+}
+
+static void mem_trace(unsigned char op, unsigned char flags, unsigned long size,
+                      unsigned long addr, unsigned long caller)
+{
+    unsigned char rec[MT_SIZE];
+    unsigned char check = 0;
+    int i;
+
+    rec[0] = MT_MAGIC;
+    rec[1] = op;
+    rec[2] = flags;
+    rec[3] = 0;
+    put_long(rec + 4, size);
+    put_long(rec + 8, addr);
+    put_long(rec + 12, caller);
+
+    for (i = 0; i < MT_SIZE; i++)
+        check ^= rec[i];
+    rec[3] = check;
+
+    for (i = 0; i < MT_SIZE; i++)
+        ser_putc((char)rec[i]);
+}
+#endif
+
 void mem_init(MemEntry *map, void *kernel_end)
 {
     chip_heap.ptr = chip_heap.end = chip_heap.total = 0;
@@ -46,6 +102,13 @@ void mem_init(MemEntry *map, void *kernel_end)
             fast_heap.total = fast_heap.end - fast_heap.ptr;
         }
     }
+
+#ifdef MEM_TRACE
+    if (chip_heap.total)
+        mem_trace(MT_HEAP, MEM_CHIP, chip_heap.total, chip_heap.ptr, 0);
+    if (fast_heap.total)
+        mem_trace(MT_HEAP, MEM_FAST, fast_heap.total, fast_heap.ptr, 0);
+#endif
 }
 
 static void *heap_alloc(struct heap *h, unsigned long size)
@@ -67,7 +130,11 @@ static void *heap_alloc(struct heap *h, unsigned long size)
     return (void *)ptr;
 }
 
+#ifdef MEM_TRACE
+static void *mem_alloc_untraced(unsigned long size, unsigned int flags)
+#else
 void *mem_alloc(unsigned long size, unsigned int flags)
+#endif
 {
     void *p;
 
@@ -87,6 +154,20 @@ void *mem_alloc(unsigned long size, unsigned int flags)
     return heap_alloc(&chip_heap, size);
 }
 
+#ifdef MEM_TRACE
+/*
+ * Called by the _mem_alloc stub in libsup.s, which passes the caller's
+ * return address (vbcc has no __builtin_return_address).
+ */
+void *mem_alloc_traced(unsigned long size, unsigned int flags, unsigned long caller)
+{
+    void *p = mem_alloc_untraced(size, flags);
+
+    mem_trace(MT_ALLOC, (unsigned char)flags, size, (unsigned long)p, caller);
+    return p;
+}
+#endif
+
 unsigned long mem_avail_chip(void)
 {
     return chip_heap.end - chip_heap.ptr;
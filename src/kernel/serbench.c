@@ -0,0 +1,68 @@
+/*
+ * serbench.c - What kprintf costs the caller, polled and buffered
+ *
+ * Only built with make SERBENCH=1. Prints the same burst of lines with
+ * SER_TX_POLL and then through the ring buffer, timing each with
+ * CIA-B's TOD counter (one tick per horizontal line, 64us on PAL), and
+ * reports both on a SERBENCH result line that bench.py kprintf turns
+ * into CPU cycles.
+ */
+
+#include "amiga_hw.h"
+#include "serial.h"
+#include "kprintf.h"
+
+/* About 800 bytes: fits the ring buffer, so nothing waits */
+#define BENCH_LINES 12
+
+static unsigned long tod_read(void)
+{
+    unsigned long t;
+
+    t = (unsigned long)ciab.todhi << 16;    /* Reading hi latches the count */
+    t |= (unsigned long)ciab.todmid << 8;
+    t |= ciab.todlo;                        /* Reading lo releases it */
+    return t;
+}
+
+static unsigned long ticks_since(unsigned long start)
+{
+    return (tod_read() - start) & 0xFFFFFF;
+}
+
+static unsigned long burst(void)
+{
+    unsigned long start;
+    int i;
+
+    start = tod_read();
+    for (i = 0; i < BENCH_LINES; i++)
+        pr_info("SERBENCH %2d: the quick brown fox jumps over the lazy dog %06lx\n",
+                i, start);
+    return ticks_since(start);
+}
+
+void ser_bench(void)
+{
+    struct ser_stats before;
+    struct ser_stats after;
+    unsigned long poll;
+    unsigned long ring;
+    unsigned long drain;
+    unsigned long start;
+
+    ser_set_policy(SER_TX_POLL);
+    poll = burst();
+
+    ser_set_policy(SER_TX_BLOCK);
+    ser_get_stats(&before);
+    ring = burst();
+    start = tod_read();
+    ser_flush();
+    drain = ticks_since(start);
+    ser_get_stats(&after);
+
+    pr_info("SERBENCH lines=%d bytes=%lu baud=%lu poll=%lu ring=%lu drain=%lu waits=%lu\n",
+            BENCH_LINES, after.queued - before.queued, ser_get_baud(),
+            poll, ring, drain, after.waits - before.waits);
+}
@@ -1,27 +1,170 @@
 /*
- * serial.c - Serial port output (polling)
+ * serial.c - Serial port output (interrupt-driven)
  *
  * Uses Paula's UART at $DFF000.
- * 9600 baud, 8N1.
+ * SER_BAUD (default 9600), 8N1. ser_set_baud changes it at runtime.
+ *
+ * ser_putc queues into a ring buffer and returns; the level 1 TBE
+ * interrupt moves one byte to SERDAT each time the transmit buffer
+ * empties (docs/serial_design.md). Receive is still polled.
  */
 
 #include "serial.h"
 #include "amiga_hw.h"
+#include "cpu.h"
 
-void ser_init(void)
+#ifndef SER_BAUD
+#define SER_BAUD 9600
+#endif
+
+#define TX_MASK (SER_TX_SIZE - 1)
+
+/* Supported rates, as in the ROM's baud_table */
+static const struct {
+    unsigned long baud;
+    unsigned short serper;
+} baud_table[] = {
+    { 9600,   SERPER_9600 },
+    { 19200,  SERPER_19200 },
+    { 38400,  SERPER_38400 },
+    { 57600,  SERPER_57600 },
+    { 115200, SERPER_115200 },
+    { 0, 0 }
+};
+
+static unsigned long ser_baud;
+
+/* Ring buffer: head advanced by ser_putc, tail by the TBE interrupt */
+static char tx_buf[SER_TX_SIZE];
+static volatile unsigned short tx_head;
+static volatile unsigned short tx_tail;
+static int tx_policy = SER_TX_BLOCK;
+static struct ser_stats tx_stats;
+
+/*
+ * Hand the oldest queued byte to Paula if she can take it.
+ * Interrupts must be masked (ISR or critical section).
+ *
+ * An empty buffer turns the TBE interrupt off but leaves its request
+ * pending, so the next ser_putc re-enabling it is taken at once.
+ */
+static void tx_pump(void)
 {
-    /* 9600 baud - ROM should have set this, but be sure */
-    custom.serper = SERPER_9600;
+    if (tx_head == tx_tail) {
+        custom.intena = INTF_TBE;
+        return;
+    }
+    custom.intreq = INTF_TBE;
+    if (custom.serdatr & SERDATF_TBE) {
+        custom.serdat = (unsigned short)(unsigned char)tx_buf[tx_tail] | 0x100;
+        tx_tail = (tx_tail + 1) & TX_MASK;
+        tx_stats.sent++;
+    }
 }
 
-void ser_putc(char c)
+/* Called from cpu_level1_isr */
+void ser_tx_interrupt(void)
+{
+    tx_pump();
+}
+
+static void poll_putc(char c)
 {
     /* Wait for transmit buffer empty */
     while (!(custom.serdatr & SERDATF_TBE))
         ;
-    
+
     /* Send character with stop bit */
-    custom.serdat = (unsigned short)c | 0x100;
+    custom.serdat = (unsigned short)(unsigned char)c | 0x100;
+}
+
+void ser_init(void)
+{
+    custom.intena = INTF_TBE;
+    tx_head = tx_tail = 0;
+
+    /* The ROM may have left any rate; set ours */
+    if (ser_set_baud(SER_BAUD) != 0) {
+        custom.serper = SERPER_9600;
+        ser_baud = 9600;
+    }
+
+    *VEC_LEVEL1 = cpu_level1_isr;
+    /* Line is idle: a pending request starts the first transmit */
+    custom.intreq = INTF_SETCLR | INTF_TBE;
+    custom.intena = INTF_SETCLR | INTF_INTEN;
+}
+
+int ser_set_baud(unsigned long baud)
+{
+    int i;
+
+    for (i = 0; baud_table[i].baud; i++) {
+        if (baud_table[i].baud == baud) {
+            /* Let queued and last characters leave at the old rate */
+            ser_flush();
+            while (!(custom.serdatr & SERDATF_TSRE))
+                ;
+            custom.serper = baud_table[i].serper;
+            ser_baud = baud;
+            return 0;
+        }
+    }
+    return -1;
+}
+
+unsigned long ser_get_baud(void)
+{
+    return ser_baud;
+}
+
+void ser_set_policy(int policy)
+{
+    if (policy == SER_TX_POLL)
+        ser_flush();            /* Keep the byte order */
+    tx_policy = policy;
+}
+
+void ser_putc(char c)
+{
+    unsigned short saved;
+    unsigned short next;
+    unsigned short used;
+
+    if (tx_policy == SER_TX_POLL) {
+        poll_putc(c);
+        tx_stats.sent++;
+        return;
+    }
+
+    CRITICAL_ENTER(saved);
+    next = (tx_head + 1) & TX_MASK;
+    if (next == tx_tail) {
+        if (tx_policy == SER_TX_DROP_NEW) {
+            tx_stats.dropped++;
+            CRITICAL_EXIT(saved);
+            return;
+        }
+        if (tx_policy == SER_TX_DROP_OLDEST) {
+            tx_tail = (tx_tail + 1) & TX_MASK;
+            tx_stats.dropped++;
+        } else {
+            /* Send from here: works even if the caller masked interrupts */
+            tx_stats.waits++;
+            while (next == tx_tail)
+                tx_pump();
+        }
+    }
+
+    tx_buf[tx_head] = c;
+    tx_head = next;
+    tx_stats.queued++;
+    used = (tx_head - tx_tail) & TX_MASK;
+    if (used > tx_stats.high_water)
+        tx_stats.high_water = used;
+
+    custom.intena = INTF_SETCLR | INTF_TBE;
+    CRITICAL_EXIT(saved);
 }
 
 void ser_puts(const char *s)
@@ -30,6 +173,26 @@ void ser_puts(const char *s)
         ser_putc(*s++);
 }
 
+void ser_flush(void)
+{
+    unsigned short saved;
+
+    CRITICAL_ENTER(saved);
+    while (tx_head != tx_tail)
+        tx_pump();
+    CRITICAL_EXIT(saved);
+}
+
+void ser_get_stats(struct ser_stats *stats)
+{
+    unsigned short saved;
+
+    CRITICAL_ENTER(saved);
+    *stats = tx_stats;
+    stats->pending = (tx_head - tx_tail) & TX_MASK;
+    CRITICAL_EXIT(saved);
+}
+
 int ser_can_read(void)
 {
     return (custom.serdatr & SERDATF_RBF) != 0;
@@ -40,7 +203,7 @@ char ser_getc(void)
     /* Wait for receive buffer full */
     while (!(custom.serdatr & SERDATF_RBF))
         ;
-    
+
     /* Read data, clear RBF by reading */
     return (char)(custom.serdatr & 0xFF);
 }
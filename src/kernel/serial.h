@@ -5,17 +5,80 @@
 #ifndef SERIAL_H
 #define SERIAL_H
 
+/* Transmit ring buffer size (power of two; holds one byte less) */
+#define SER_TX_SIZE 1024
+
+/* What ser_putc does when the ring buffer is full */
+#define SER_TX_BLOCK        0   /* Wait, sending bytes itself (default) */
+#define SER_TX_DROP_OLDEST  1   /* Discard the oldest queued byte */
+#define SER_TX_DROP_NEW     2   /* Discard the new byte */
+#define SER_TX_POLL         3   /* Bypass the buffer: busy-wait per byte */
+
+/* Transmit counters, see ser_get_stats */
+struct ser_stats {
+    unsigned long queued;       /* Bytes put in the ring buffer */
+    unsigned long sent;         /* Bytes written to SERDAT */
+    unsigned long dropped;      /* Bytes lost to a DROP policy */
+    unsigned long waits;        /* ser_putc calls that found the buffer full */
+    unsigned short high_water;  /* Most bytes queued at once */
+    unsigned short pending;     /* Bytes queued now */
+};
+
 /*
  * Initialize serial port.
  * Call this even though ROM sets it up - ensures known state.
+ * Installs the level 1 interrupt handler; output only moves on its
+ * own once the CPU accepts interrupts (cpu_int_enable).
  */
 void ser_init(void);
 
 /*
- * Output single character. Blocks until transmit buffer ready.
+ * Change the baud rate (9600, 19200, 38400, 57600 or 115200).
+ * Waits for the ring buffer and transmitter to drain first.
+ * Returns 0, or -1 for an unsupported rate (rate unchanged).
+ */
+int ser_set_baud(unsigned long baud);
+
+/*
+ * Current baud rate.
+ */
+unsigned long ser_get_baud(void);
+
+/*
+ * Queue a single character. Returns at once unless the ring buffer
+ * is full, then does what the policy says. Safe with interrupts
+ * masked and from interrupt handlers.
  */
 void ser_putc(char c);
 
+/*
+ * Overflow policy for ser_putc, one of SER_TX_*.
+ */
+void ser_set_policy(int policy);
+
+/*
+ * Wait until everything queued has been handed to the UART, e.g.
+ * before entering the ROM debugger.
+ */
+void ser_flush(void);
+
+/*
+ * Copy the transmit counters.
+ */
+void ser_get_stats(struct ser_stats *stats);
+
+/*
+ * TBE interrupt handler body, called from cpu_level1_isr.
+ */
+void ser_tx_interrupt(void);
+
+#ifdef SER_BENCH
+/*
+ * Time a kprintf burst polled and buffered (serbench.c).
+ */
+void ser_bench(void);
+#endif
+
 /*
  * Output null-terminated string.
  */
@@ -87,8 +87,13 @@ start:
     bsr     serial_put_string
 
     ; ============================================================
-    ; 6. RDB DETECTION
+    ; 6. IDE SETUP AND RDB DETECTION
     ; ============================================================
+    bsr     ide_init                ; READ MULTIPLE if the drive allows it
+    ifd IDE_BENCH
+    bsr     ide_bench
+    endif
+
     bsr     find_rdb
     tst.l   d0
     bne     .enter_debugger         ; Skip partition if RDB not found
@@ -428,6 +433,7 @@ generic_exc_msg:
     include "debugger.s"
     include "ide.s"
     include "partition.s"
+    include "unpack.s"
     include "filesystem.s"
 
 ; ============================================================
@@ -1,5 +1,15 @@
 ; filesystem.s - FAT16 filesystem implementation
 ; Loads SYSTEM.BIN from a FAT16 partition to $200000
+;
+; The loader follows the FAT chain ahead of the data and reads each
+; run of consecutive clusters with one ide_read (up to 256 sectors)
+; straight to KERNEL_LOAD_ADDR. It reports the IDE commands, sectors
+; and CIA-B TOD ticks (PAL lines, 64us) the load took; fat16_sim.py
+; predicts the same counts from the disk image.
+;
+; A kernel packed by pack_kernel.py is recognised by its header in the
+; file's first sector, loaded to the top of its unpacked size and
+; unpacked in place (unpack.s).
 
 ; ============================================================================
 ; Constants
@@ -44,6 +54,12 @@ FSV_ROOT_DIR_START  equ 16          ; word
 FSV_ROOT_DIR_SECS   equ 18          ; word
 FSV_DATA_START_SEC  equ 20          ; long
 FSV_CACHED_FAT_SEC  equ 24          ; long (-1 if none)
+FSV_STAT_CMDS       equ 28          ; long: ide_read calls during the load
+FSV_STAT_SECS       equ 32          ; long: sectors they transferred
+FSV_STAT_START      equ 36          ; long: TOD count when the load began
+FSV_PACKED_AT       equ 40          ; long: packed image address, 0 if raw
+
+FS_MAX_RUN_SECS     equ 256         ; ide_read limit per command
 
 ; ============================================================================
 ; load_system_bin - Main entry point
@@ -63,6 +79,13 @@ load_system_bin:
     bsr     SerialPrintf
     addq.l  #4,sp
 
+    ; Start the load stats
+    lea     FS_VARS,a0
+    clr.l   FSV_STAT_CMDS(a0)
+    clr.l   FSV_STAT_SECS(a0)
+    bsr     fs_ticks
+    move.l  d0,FSV_STAT_START(a0)
+
     ; Initialize filesystem
     bsr     fat16_init
     tst.l   d0
@@ -84,43 +107,115 @@ load_system_bin:
     cmp.l   #$80000,d4
     bhi     .file_too_large
 
+    ; Packed kernel? The header is in the first sector
+    clr.l   FS_VARS+FSV_PACKED_AT
+    move.l  d3,d0
+    bsr     fat16_cluster_lba
+    lea     FS_DIR_BUFFER,a0
+    moveq   #1,d1
+    bsr     fs_read
+    tst.l   d0
+    bne     .error
+    lea     FS_DIR_BUFFER,a0
+    cmp.l   #PK_MAGIC,PK_ID(a0)
+    bne.s   .raw
+
+    ; Load it so that it ends PK_MARGIN past the unpacked image:
+    ; a2 = KERNEL_LOAD_ADDR + raw + margin - file size, word aligned
+    move.l  PK_PACKED_SIZE(a0),d0
+    add.l   #PK_HEADER_SIZE,d0
+    cmp.l   d5,d0
+    bhi     .bad_header         ; Header claims more than the file holds
+    move.l  PK_PACKED_SIZE(a0),d0
+    lsr.l   #8,d0               ; PK_MARGIN: packed / 256 + 32
+    add.l   #PK_MARGIN_EXTRA,d0
+    add.l   PK_RAW_SIZE(a0),d0
+    cmp.l   #$80000,d0
+    bhi     .file_too_large
+    sub.l   d5,d0
+    bmi     .bad_header         ; Packed is larger than unpacked
+    add.l   #KERNEL_LOAD_ADDR,d0
+    and.w   #$FFFE,d0
+    move.l  d0,a2
+    move.l  d0,FS_VARS+FSV_PACKED_AT
+
+.raw:
     pea     .msg_loading(pc)
     bsr     SerialPrintf
     addq.l  #4,sp
 
-.read_loop:
-    ; Read current cluster
-    move.l  a2,a0               ; destination
-    move.l  d3,d0               ; cluster number
-    bsr     fat16_read_cluster
-    tst.l   d0
-    bne     .error
-
-    ; Calculate bytes read
+    ; Cluster geometry: a3 = bytes per cluster, a4 = clusters per ide_read
     lea     FS_VARS,a0
     moveq   #0,d0
     move.b  FSV_SEC_PER_CLUS(a0),d0
-    lsl.w   #8,d0               ; multiply by 512 (assuming 512 bytes/sector)
-    lsl.w   #1,d0
+    move.l  #FS_MAX_RUN_SECS,d1
+    divu    d0,d1
+    and.l   #$FFFF,d1
+    move.l  d1,a4
+    lsl.l   #8,d0               ; multiply by 512 (assuming 512 bytes/sector)
+    lsl.l   #1,d0
+    move.l  d0,a3
+
+.run_loop:
+    ; Extend a run from cluster d3 while the chain is consecutive
+    move.l  d3,d7               ; d7 = last cluster in the run
+    moveq   #1,d6               ; d6 = clusters in the run
+    move.l  a3,a5               ; a5 = bytes in the run
+    moveq   #0,d2               ; d2 = cluster after the run (0 = not looked up)
+
+.extend:
+    cmp.l   a4,d6
+    bhs.s   .read_run           ; As many sectors as one command takes
+    cmp.l   a5,d4
+    bls.s   .read_run           ; File ends inside this run
+
+    move.l  d7,d0
+    bsr     fat16_get_next_cluster
+    tst.l   d0
+    bmi     .error
+    move.l  d0,d2
+
+    move.l  d7,d1
+    addq.l  #1,d1
+    cmp.l   d1,d2
+    bne.s   .read_run           ; Chain jumps (or ends): run stops here
+
+    move.l  d2,d7
+    addq.l  #1,d6
+    add.l   a3,a5
+    moveq   #0,d2
+    bra.s   .extend
+
+.read_run:
+    ; One ide_read for the whole run
+    move.l  a2,a0               ; destination
+    move.l  d3,d0               ; first cluster
+    move.l  d6,d1               ; cluster count
+    bsr     fat16_read_run
+    tst.l   d0
+    bne     .error
 
     ; Update pointers and counters
-    add.l   d0,a2               ; advance destination
-    sub.l   d0,d4               ; decrease remaining bytes
+    add.l   a5,a2               ; advance destination
+    sub.l   a5,d4               ; decrease remaining bytes
     ble     .done               ; if <= 0, we're done
 
-    ; Get next cluster
-    move.l  d3,d0
+    ; Cluster after the run, unless extending already looked it up
+    tst.l   d2
+    bne.s   .have_next
+    move.l  d7,d0
     bsr     fat16_get_next_cluster
     tst.l   d0
     bmi     .error
+    move.l  d0,d2
 
-    move.l  d0,d3               ; update current cluster
-
+.have_next:
     ; Check for EOF
-    cmp.w   #FAT16_EOF_MIN,d3
+    cmp.w   #FAT16_EOF_MIN,d2
     bhs     .done
 
-    bra     .read_loop
+    move.l  d2,d3               ; next run starts here
+    bra     .run_loop
 
 .done:
     move.l  d5,-(sp)            ; file size
@@ -128,11 +223,41 @@ load_system_bin:
     bsr     SerialPrintf
     addq.l  #8,sp
 
+    ; IDE commands, sectors and TOD ticks for the whole load
+    lea     FS_VARS,a0
+    bsr     fs_ticks
+    sub.l   FSV_STAT_START(a0),d0
+    and.l   #$FFFFFF,d0         ; TOD is 24 bits
+    move.l  d0,-(sp)
+    move.l  FSV_STAT_SECS(a0),-(sp)
+    move.l  FSV_STAT_CMDS(a0),-(sp)
+    pea     .msg_stats(pc)
+    bsr     SerialPrintf
+    lea     16(sp),sp
+
+    ; Unpack in place to KERNEL_LOAD_ADDR
+    move.l  FS_VARS+FSV_PACKED_AT,d0
+    beq.s   .loaded
+    move.l  d0,a0
+    bsr     unpack_kernel
+    tst.l   d0
+    bne.s   .error
+    move.l  d1,d5               ; unpacked size
+
+.loaded:
     moveq   #0,d0               ; success
     move.l  d5,d1               ; return file size
     movem.l (sp)+,d2-d7/a0-a6
     rts
 
+.bad_header:
+    pea     .msg_bad_header(pc)
+    bsr     SerialPrintf
+    addq.l  #4,sp
+    moveq   #-1,d0
+    movem.l (sp)+,d2-d7/a0-a6
+    rts
+
 .file_too_large:
     pea     .msg_too_large(pc)
     bsr     SerialPrintf
@@ -166,6 +291,43 @@ load_system_bin:
     dc.b    'FAT16: ERROR - File too large (>512KB)',13,10,0
     even
 
+.msg_stats:
+    dc.b    'FAT16: %d IDE commands, %d sectors, %d ticks',13,10,0
+    even
+
+.msg_bad_header:
+    dc.b    'FAT16: ERROR - Bad packed kernel header',13,10,0
+    even
+
+; ============================================================================
+; fs_read - ide_read, counted in the load stats
+; ============================================================================
+; Same inputs, outputs and scratch registers as ide_read
+; ============================================================================
+fs_read:
+    lea     FS_VARS,a1
+    addq.l  #1,FSV_STAT_CMDS(a1)
+    move.l  d1,-(sp)
+    and.l   #$FFFF,d1
+    add.l   d1,FSV_STAT_SECS(a1)
+    move.l  (sp)+,d1
+    bra     ide_read
+
+; ============================================================================
+; fs_ticks - CIA-B TOD count (horizontal lines)
+; ============================================================================
+; Output:
+;   D0.l = 24-bit count
+; ============================================================================
+fs_ticks:
+    moveq   #0,d0
+    move.b  CIAB_TODHI,d0       ; Reading hi latches the count
+    lsl.l   #8,d0
+    move.b  CIAB_TODMID,d0
+    lsl.l   #8,d0
+    move.b  CIAB_TODLO,d0       ; Reading lo releases it
+    rts
+
 ; ============================================================================
 ; fat16_init - Parse boot sector and initialize filesystem
 ; ============================================================================
@@ -193,7 +355,7 @@ fat16_init:
     lea     FS_BOOT_BUFFER,a0
     move.l  FSV_PARTITION_LBA(a3),d0    ; LBA
     moveq   #1,d1                       ; 1 sector
-    bsr     ide_read
+    bsr     fs_read
     tst.l   d0
     bne     .read_error
 
@@ -383,7 +545,7 @@ fat16_find_file:
     move.l  FSV_PARTITION_LBA(a3),d0
     add.l   d6,d0                       ; LBA = partition + root_start + offset
     moveq   #1,d1                       ; 1 sector
-    bsr     ide_read
+    bsr     fs_read
     tst.l   d0
     bne     .read_error
 
@@ -496,39 +658,30 @@ fat16_find_file:
     even
 
 ; ============================================================================
-; fat16_read_cluster - Read a cluster to memory
+; fat16_read_run - Read consecutive clusters to memory
 ; ============================================================================
 ; Input:
 ;   A0 = destination buffer
-;   D0.l = cluster number
+;   D0.l = first cluster number
+;   D1.l = number of clusters (at most 256 sectors in total)
 ; Output:
 ;   D0.l = 0 on success, -1 on error
 ; ============================================================================
-fat16_read_cluster:
+fat16_read_run:
     movem.l d1-d7/a0-a6,-(sp)
 
     move.l  a0,a4               ; save destination
-    move.l  d0,d4               ; save cluster number
+    move.l  d1,d5               ; save cluster count
 
-    ; Convert cluster to LBA
-    ; LBA = PartitionLBA + DataStart + (Cluster - 2) * SecPerCluster
-    lea     FS_VARS,a3
-
-    sub.l   #2,d4               ; cluster - 2
-    moveq   #0,d0
-    move.b  FSV_SEC_PER_CLUS(a3),d0
-    mulu    d0,d4               ; (cluster - 2) * sec_per_cluster
-
-    move.l  FSV_DATA_START_SEC(a3),d0
-    add.l   d4,d0               ; + data_start
-    move.l  FSV_PARTITION_LBA(a3),d4
-    add.l   d4,d0               ; + partition_lba
+    bsr     fat16_cluster_lba
 
     ; Read sectors
+    lea     FS_VARS,a3
     move.l  a4,a0               ; destination
     moveq   #0,d1
-    move.b  FSV_SEC_PER_CLUS(a3),d1     ; number of sectors
-    bsr     ide_read
+    move.b  FSV_SEC_PER_CLUS(a3),d1
+    mulu    d5,d1               ; number of sectors
+    bsr     fs_read
     tst.l   d0
     bne     .error
 
@@ -548,6 +701,29 @@ fat16_read_cluster:
     dc.b    'FAT16: ERROR - Failed to read cluster',13,10,0
     even
 
+; ============================================================================
+; fat16_cluster_lba - First sector of a cluster
+; ============================================================================
+; Input:
+;   D0.l = cluster number
+; Output:
+;   D0.l = LBA = PartitionLBA + DataStart + (Cluster - 2) * SecPerCluster
+; ============================================================================
+fat16_cluster_lba:
+    movem.l d1/a0,-(sp)
+    lea     FS_VARS,a0
+
+    subq.l  #2,d0               ; cluster - 2
+    moveq   #0,d1
+    move.b  FSV_SEC_PER_CLUS(a0),d1
+    mulu    d1,d0               ; (cluster - 2) * sec_per_cluster
+
+    add.l   FSV_DATA_START_SEC(a0),d0   ; + data_start
+    add.l   FSV_PARTITION_LBA(a0),d0    ; + partition_lba
+
+    movem.l (sp)+,d1/a0
+    rts
+
 ; ============================================================================
 ; fat16_get_next_cluster - Get next cluster from FAT chain
 ; ============================================================================
@@ -593,7 +769,7 @@ fat16_get_next_cluster:
     ; d0 already contains LBA
     lea     FS_FAT_BUFFER,a0
     moveq   #1,d1                       ; 1 sector
-    bsr     ide_read
+    bsr     fs_read
     tst.l   d0
     bne     .error
 
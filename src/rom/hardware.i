@@ -104,6 +104,9 @@ CIAB_TALO       equ $BFD400
 CIAB_TAHI       equ $BFD500
 CIAB_TBLO       equ $BFD600
 CIAB_TBHI       equ $BFD700
+CIAB_TODLO      equ $BFD800         ; TOD low (counts HSYNC)
+CIAB_TODMID     equ $BFD900         ; TOD mid
+CIAB_TODHI      equ $BFDA00         ; TOD high
 CIAB_ICR        equ $BFDD00
 CIAB_CRA        equ $BFDE00
 CIAB_CRB        equ $BFDF00
@@ -157,6 +160,7 @@ DBG_STACK       equ $00084F         ; Debugger stack top
 DBG_CMD_BUF     equ $000850         ; Command buffer (128 bytes)
 DBG_BUF_IDX     equ $0008D0         ; Command buffer index
 DBG_LAST_ADDR   equ $0008D4         ; Last examined address
+DBG_SERPER      equ $0008D8         ; Current SERPER value (word)
 COPPERLIST      equ $000950         ; Copper list (256 bytes)
 SCREEN          equ $000A50         ; Display bitplane (10KB)
 MEMMAP_TABLE    equ $003250         ; Memory map (432 bytes)
@@ -1,7 +1,9 @@
 ; ============================================================
 ; ide.s - IDE/ATA hard drive interface
 ; ============================================================
-; Provides basic IDE sector read functionality using LBA mode
+; Provides basic IDE sector read functionality using LBA mode.
+; ide_init switches the drive to READ MULTIPLE when it allows it,
+; so ide_read waits for DRQ once per block instead of per sector.
 ; ============================================================
 
 ; ============================================================
@@ -24,8 +26,18 @@ IDE_DRDY        equ 6               ; Drive ready
 IDE_DRQ         equ 3               ; Data request
 IDE_ERR         equ 0               ; Error
 
+; Error register bits
+IDE_ABRT        equ 2               ; Command aborted
+
 ; Commands
 IDE_CMD_READ    equ $20             ; Read sectors
+IDE_CMD_READ_MULTIPLE equ $C4       ; Read sectors, one DRQ per block
+IDE_CMD_SET_MULTIPLE  equ $C6       ; Set sectors per block (NSECTOR)
+IDE_CMD_IDENTIFY      equ $EC       ; Identify device (one sector)
+
+; IDENTIFY data: word 47 low byte = most sectors per READ MULTIPLE block
+IDE_ID_MULTIPLE equ 94
+IDE_MAX_MULTIPLE equ 128
 
 ; LBA mode + master drive
 IDE_LBA_MASTER  equ $E0
@@ -36,6 +48,12 @@ IDE_TIMEOUT     equ $100000         ; Timeout counter
 ; Destination address for test read
 IDE_DEST        equ $30000
 
+; Driver state, after the filesystem's variables
+IDE_IDENT_BUFFER equ $23200         ; IDENTIFY data (512 bytes)
+IDE_VARS        equ $23400
+IDV_MULTIPLE    equ 0               ; word: sectors per DRQ block, 0 = READ SECTORS
+IDV_WORD_COPY   equ 2               ; word: IDE_BENCH only, copy one word per loop
+
 ; ============================================================
 ; ide_read - Read sectors from IDE drive
 ; ============================================================
@@ -43,17 +61,20 @@ IDE_DEST        equ $30000
 ;   A0.l = Destination buffer (must be word-aligned)
 ;   D0.l = Starting LBA (bits 0-27 used)
 ;   D1.w = Number of sectors to read (1-256, 0 treated as error)
+; Uses READ MULTIPLE when ide_init has enabled it; a drive that
+; aborts it is switched back to READ SECTORS and the read retried.
 ; Output:
 ;   D0.l = 0 success, -1 error
 ; Preserves: D2-D7/A2-A6 (Amiga convention)
 ; Scratches: D0-D1/A0-A1
 ; ============================================================
 ide_read:
-    movem.l d2-d3,-(sp)
+    movem.l d2-d5/a2,-(sp)
 
     ; Save inputs immediately (before any calls that clobber D0/D1)
     move.l  d0,d2                   ; Save LBA
     move.w  d1,d3                   ; Save sector count
+    move.l  a0,a2                   ; Save destination for a retry
 
     ; Validate inputs
     tst.w   d3
@@ -61,6 +82,10 @@ ide_read:
     cmp.w   #256,d3
     bhi     .invalid                ; D3 > 256 is error
 
+.start:
+    move.l  a2,a0
+    move.w  d3,d5                   ; D5 = sectors still to copy
+
     ; Wait for drive not busy
     bsr     ide_wait_not_busy
     tst.l   d0
@@ -93,25 +118,62 @@ ide_read:
     nop
     nop
 
-    ; Issue read command
+    ; Issue read command: READ MULTIPLE if ide_init enabled it
+    moveq   #1,d4                   ; D4 = sectors per DRQ block
+    move.w  IDE_VARS+IDV_MULTIPLE,d0
+    cmp.w   #1,d0
+    bls.s   .read_sectors
+    move.w  d0,d4
+    move.b  #IDE_CMD_READ_MULTIPLE,IDE_COMMAND
+    bra.s   .block_loop
+.read_sectors:
     move.b  #IDE_CMD_READ,IDE_COMMAND
 
-    ; Read sectors
-.sector_loop:
+    ; Read blocks
+.block_loop:
     ; Wait for DRQ or error
     bsr     ide_wait_drq
     tst.l   d0
-    bne     .exit                   ; Error, return -1
-
-    ; Read 256 words (512 bytes)
-    move.w  #255,d2
+    bne     .drq_failed
+
+    ; This block is D4 sectors, or what is left if fewer
+    move.w  d4,d1
+    cmp.w   d5,d1
+    bls.s   .block_size
+    move.w  d5,d1
+.block_size:
+    sub.w   d1,d5
+    lsl.w   #4,d1                   ; 16 loops of 16 words per sector
+    subq.w  #1,d1
+    lea     IDE_DATA,a1
+
+    ifd IDE_BENCH
+    tst.w   IDE_VARS+IDV_WORD_COPY
+    bne.s   .word_copy
+    endif
+
+.copy_loop:
+    rept 16
+    move.w  (a1),(a0)+              ; (An) is 8 cycles faster than abs.l
+    endr
+    dbf     d1,.copy_loop
+
+    ifd IDE_BENCH
+    bra.s   .block_done
+.word_copy:
+    ; One word per loop, the copy ide_read used before, for ide_bench
+    addq.w  #1,d1
+    lsl.w   #4,d1
+    subq.w  #1,d1
 .word_loop:
     move.w  IDE_DATA,(a0)+
-    dbf     d2,.word_loop
+    dbf     d1,.word_loop
+.block_done:
+    endif
 
-    ; Next sector
-    subq.w  #1,d3
-    bne.s   .sector_loop
+    ; Next block
+    tst.w   d5
+    bne     .block_loop
 
     ; Wait for drive not busy after transfer
     bsr     ide_wait_not_busy
@@ -127,14 +189,144 @@ ide_read:
     moveq   #0,d0
     bra.s   .exit
 
+.drq_failed:
+    ; A drive that took SET MULTIPLE may still abort READ MULTIPLE.
+    ; If it did so before sending data, drop to READ SECTORS for good
+    ; and start this read again.
+    cmp.w   #1,d4
+    beq.s   .error
+    cmp.w   d3,d5
+    bne.s   .error
+    btst    #IDE_ERR,IDE_STATUS
+    beq.s   .error                  ; Timeout, not a refusal
+    btst    #IDE_ABRT,IDE_ERROR
+    beq.s   .error
+    clr.w   IDE_VARS+IDV_MULTIPLE
+    bra     .start
+
 .invalid:
 .error:
     moveq   #-1,d0
 
 .exit:
-    movem.l (sp)+,d2-d3
+    movem.l (sp)+,d2-d5/a2
     rts
 
+; ============================================================
+; ide_init - Choose the transfer mode for ide_read
+; ============================================================
+; Asks the drive (IDENTIFY) how many sectors it can send per DRQ
+; block and sets that with SET MULTIPLE. A drive without the
+; feature, or one that aborts the command, keeps READ SECTORS.
+; Input:  None
+; Output: D0.l = sectors per DRQ block (1 = READ SECTORS)
+; Preserves: All registers except D0
+; ============================================================
+ide_init:
+    movem.l d1-d2/a0-a1,-(sp)
+
+    clr.w   IDE_VARS+IDV_MULTIPLE
+    ifd IDE_BENCH
+    clr.w   IDE_VARS+IDV_WORD_COPY
+    endif
+
+    move.b  IDE_STATUS,d0
+    cmp.b   #$7F,d0
+    beq     .single                 ; No drive, find_rdb reports it
+
+    ; IDENTIFY DEVICE
+    bsr     ide_wait_not_busy
+    tst.l   d0
+    bne     .single
+    move.b  #IDE_LBA_MASTER,IDE_SELECT
+    nop
+    nop
+    move.b  #IDE_CMD_IDENTIFY,IDE_COMMAND
+    bsr     ide_wait_drq
+    tst.l   d0
+    bne     .single
+
+    lea     IDE_IDENT_BUFFER,a0
+    lea     IDE_DATA,a1
+    move.w  #255,d1
+.ident_loop:
+    move.w  (a1),(a0)+
+    dbf     d1,.ident_loop
+    bsr     ide_wait_not_busy
+
+    ; Word 47 is $80nn on current drives, nn = most sectors per block.
+    ; Accept either byte order; without the $80 marker use the low byte.
+    move.w  IDE_IDENT_BUFFER+IDE_ID_MULTIPLE,d0
+    move.w  d0,d1
+    and.w   #$FF00,d1
+    cmp.w   #$8000,d1
+    beq.s   .low_byte
+    move.w  d0,d1
+    and.w   #$00FF,d1
+    cmp.w   #$0080,d1
+    bne.s   .low_byte
+    lsr.w   #8,d0
+.low_byte:
+    and.w   #$00FF,d0
+    cmp.w   #1,d0
+    bls.s   .unsupported
+    cmp.w   #IDE_MAX_MULTIPLE,d0
+    bls.s   .set_multiple
+    move.w  #IDE_MAX_MULTIPLE,d0
+.set_multiple:
+    move.w  d0,d2                   ; D2 = block size to ask for
+
+    ; SET MULTIPLE MODE
+    bsr     ide_wait_not_busy
+    tst.l   d0
+    bne.s   .single
+    move.b  #IDE_LBA_MASTER,IDE_SELECT
+    nop
+    nop
+    move.b  d2,IDE_NSECTOR
+    nop
+    nop
+    move.b  #IDE_CMD_SET_MULTIPLE,IDE_COMMAND
+    bsr     ide_wait_not_busy
+    tst.l   d0
+    bne.s   .single
+    btst    #IDE_ERR,IDE_STATUS
+    bne.s   .refused
+
+    move.w  d2,IDE_VARS+IDV_MULTIPLE
+    moveq   #0,d0
+    move.w  d2,d0
+    move.l  d0,-(sp)
+    pea     .msg_multiple(pc)
+    bsr     SerialPrintf
+    addq.l  #8,sp
+    moveq   #0,d0
+    move.w  d2,d0
+    bra.s   .exit
+
+.refused:
+    pea     .msg_refused(pc)
+    bra.s   .print_single
+.unsupported:
+    pea     .msg_unsupported(pc)
+.print_single:
+    bsr     SerialPrintf
+    addq.l  #4,sp
+.single:
+    moveq   #1,d0
+
+.exit:
+    movem.l (sp)+,d1-d2/a0-a1
+    rts
+
+.msg_multiple:
+    dc.b    "IDE: READ MULTIPLE, %d sectors per block",13,10,0
+.msg_refused:
+    dc.b    "IDE: Drive refused SET MULTIPLE, using READ SECTORS",13,10,0
+.msg_unsupported:
+    dc.b    "IDE: No READ MULTIPLE, using READ SECTORS",13,10,0
+    even
+
 ; ============================================================
 ; ide_test_read - Read sector 0 to $30000
 ; ============================================================
@@ -258,3 +450,104 @@ ide_wait_drq:
 .exit:
     movem.l (sp)+,d1-d2
     rts
+
+    ifd IDE_BENCH
+; ============================================================
+; ide_bench - Time ide_read over a fixed span of the disk
+; ============================================================
+; Only in ROMs built with make IDE_BENCH=1. Reads the first
+; IDE_BENCH_SECTORS sectors to IDE_DEST, 256 per command, once
+; per transfer mode, and prints one line per mode for
+; bench.py ide. Ticks are CIA-B TOD (one per PAL line, 64us).
+; Input:  None
+; Output: None
+; Preserves: All registers
+; ============================================================
+IDE_BENCH_SECTORS equ 8192          ; 4MB
+IDE_BENCH_CHUNK   equ 256           ; Sectors per ide_read
+
+ide_bench:
+    movem.l d0-d4/a0-a2,-(sp)
+    move.w  IDE_VARS+IDV_MULTIPLE,d4    ; Mode ide_init chose
+
+    ; Before: READ SECTORS, one word per loop
+    clr.w   IDE_VARS+IDV_MULTIPLE
+    move.w  #1,IDE_VARS+IDV_WORD_COPY
+    lea     .mode_word(pc),a2
+    bsr.s   .pass
+
+    ; READ SECTORS, unrolled copy
+    clr.w   IDE_VARS+IDV_WORD_COPY
+    lea     .mode_unrolled(pc),a2
+    bsr.s   .pass
+
+    ; READ MULTIPLE, unrolled copy
+    move.w  d4,IDE_VARS+IDV_MULTIPLE
+    cmp.w   #1,d4
+    bls.s   .done
+    lea     .mode_multiple(pc),a2
+    bsr.s   .pass
+
+.done:
+    pea     .msg_done(pc)
+    bsr     SerialPrintf
+    addq.l  #4,sp
+    movem.l (sp)+,d0-d4/a0-a2
+    rts
+
+; A2 = mode name
+.pass:
+    bsr     fs_ticks
+    move.l  d0,d3                   ; D3 = start ticks
+    moveq   #0,d2                   ; D2 = LBA
+.chunk:
+    lea     IDE_DEST,a0
+    move.l  d2,d0
+    move.w  #IDE_BENCH_CHUNK,d1
+    bsr     ide_read
+    tst.l   d0
+    bne.s   .failed
+    add.l   #IDE_BENCH_CHUNK,d2
+    cmp.l   #IDE_BENCH_SECTORS,d2
+    blo.s   .chunk
+
+    bsr     fs_ticks
+    sub.l   d3,d0
+    and.l   #$FFFFFF,d0             ; TOD is 24 bits
+    move.l  d0,-(sp)
+    move.l  d2,-(sp)
+    moveq   #1,d0
+    move.w  IDE_VARS+IDV_MULTIPLE,d1
+    cmp.w   d0,d1
+    bls.s   .block
+    move.w  d1,d0
+.block:
+    move.l  d0,-(sp)
+    move.l  a2,-(sp)
+    pea     .msg_result(pc)
+    bsr     SerialPrintf
+    lea     20(sp),sp
+    rts
+
+.failed:
+    move.l  d2,-(sp)
+    move.l  a2,-(sp)
+    pea     .msg_failed(pc)
+    bsr     SerialPrintf
+    lea     12(sp),sp
+    rts
+
+.mode_word:
+    dc.b    "word",0
+.mode_unrolled:
+    dc.b    "unrolled",0
+.mode_multiple:
+    dc.b    "multiple",0
+.msg_result:
+    dc.b    "IDEBENCH mode=%s block=%d sectors=%d ticks=%d",13,10,0
+.msg_failed:
+    dc.b    "IDEBENCH mode=%s failed at LBA %d",13,10,0
+.msg_done:
+    dc.b    "IDEBENCH done",13,10,0
+    even
+    endif
@@ -14,6 +14,7 @@ serial_init:
     movem.l a6,-(sp)
     lea     CUSTOM,a6
     move.w  #$0170,SERPER(a6)       ; 9600 baud (368 decimal)
+    move.w  #$0170,DBG_SERPER       ; SERPER is write-only; cmd_baud reads this
     movem.l (sp)+,a6
     rts
 
@@ -0,0 +1,195 @@
+; unpack.s - Unpack a kernel packed by pack_kernel.py
+;
+; The file is a 16-byte header followed by LZ4 block data (sequences
+; of literals and matches, byte-aligned, no bit unpacking). load_system_bin
+; loads it so that it ends PK_MARGIN bytes past where the unpacked image
+; will end; decoding front to back then never overwrites packed bytes it
+; has not read yet. pack_kernel.py checks this for every image it writes.
+
+; ============================================================================
+; Constants
+; ============================================================================
+
+PK_MAGIC            equ $414D504B   ; 'AMPK'
+
+; Header offsets (all longs, big-endian)
+PK_ID               equ 0           ; PK_MAGIC
+PK_RAW_SIZE         equ 4           ; Unpacked bytes
+PK_PACKED_SIZE      equ 8           ; LZ4 bytes after the header
+PK_CHECKSUM         equ 12          ; Sum of the unpacked longs (zero-padded)
+PK_HEADER_SIZE      equ 16
+
+; In-place margin: packed size / 256 + PK_MARGIN_EXTRA
+PK_MARGIN_EXTRA     equ 32
+
+; ============================================================================
+; unpack_kernel - Unpack a loaded image to KERNEL_LOAD_ADDR
+; ============================================================================
+; Input:
+;   A0 = packed image (header), ending PK_MARGIN past the unpacked end
+; Output:
+;   D0.l = 0 on success, -1 on corrupt data or checksum mismatch
+;   D1.l = unpacked size
+; ============================================================================
+unpack_kernel:
+    movem.l d2-d7/a0-a6,-(sp)
+
+    ; The output overwrites the header: keep what we need
+    move.l  PK_RAW_SIZE(a0),d7  ; d7 = unpacked size
+    move.l  PK_CHECKSUM(a0),d5  ; d5 = expected checksum
+    move.l  PK_PACKED_SIZE(a0),d4
+    move.l  a0,a6               ; a6 = header
+
+    move.l  d4,-(sp)
+    move.l  d7,-(sp)
+    pea     .msg_start(pc)
+    bsr     SerialPrintf
+    lea     12(sp),sp
+
+    bsr     fs_ticks
+    move.l  d0,d6               ; d6 = start ticks
+
+    lea     PK_HEADER_SIZE(a6),a0   ; a0 = packed data
+    lea     (a0,d4.l),a2            ; a2 = end of packed data
+    lea     KERNEL_LOAD_ADDR,a1     ; a1 = output
+    lea     (a1,d7.l),a4            ; a4 = end of output
+    bsr     lz4_decode
+    tst.l   d0
+    bne.s   .corrupt
+    cmp.l   a4,a1
+    bne.s   .corrupt
+
+    ; Checksum: zero-pad the last long, then sum
+    clr.b   (a1)+
+    clr.b   (a1)+
+    clr.b   (a1)+
+    lea     KERNEL_LOAD_ADDR,a0
+    move.l  d7,d0
+    addq.l  #3,d0
+    lsr.l   #2,d0
+    moveq   #0,d1
+.sum:
+    add.l   (a0)+,d1
+    subq.l  #1,d0
+    bne.s   .sum
+    cmp.l   d5,d1
+    bne.s   .bad_checksum
+
+    bsr     fs_ticks
+    sub.l   d6,d0
+    and.l   #$FFFFFF,d0         ; TOD is 24 bits
+    move.l  d0,-(sp)
+    pea     .msg_done(pc)
+    bsr     SerialPrintf
+    addq.l  #8,sp
+
+    moveq   #0,d0
+    move.l  d7,d1
+    movem.l (sp)+,d2-d7/a0-a6
+    rts
+
+.corrupt:
+    pea     .msg_corrupt(pc)
+    bra.s   .fail
+.bad_checksum:
+    pea     .msg_checksum(pc)
+.fail:
+    bsr     SerialPrintf
+    addq.l  #4,sp
+    moveq   #-1,d0
+    move.l  d7,d1
+    movem.l (sp)+,d2-d7/a0-a6
+    rts
+
+.msg_start:
+    dc.b    'UNPACK: %d bytes from %d (LZ4)',13,10,0
+.msg_done:
+    dc.b    'UNPACK: Done in %d ticks',13,10,0
+.msg_corrupt:
+    dc.b    'UNPACK: ERROR - Corrupt data',13,10,0
+.msg_checksum:
+    dc.b    'UNPACK: ERROR - Checksum mismatch',13,10,0
+    even
+
+; ============================================================================
+; lz4_decode - Decode LZ4 block data
+; ============================================================================
+; Each sequence is a token (literal count << 4 | match length - 4), the
+; literals, a little-endian match offset and the match. A count of 15
+; continues in the following bytes, each added, until one is not 255.
+; The last sequence has literals only.
+; Input:
+;   A0 = packed data, A2 = its end
+;   A1 = output, A4 = output end
+; Output:
+;   D0.l = 0 on success, -1 if the data runs past either end
+;   A1 = end of the output written
+; Scratches: D0-D3/A0/A3
+; ============================================================================
+lz4_decode:
+.sequence:
+    cmp.l   a4,a1
+    bhi.s   .error
+    moveq   #0,d0
+    move.b  (a0)+,d0            ; token
+    move.l  d0,d1
+    lsr.w   #4,d1               ; literal count
+    beq.s   .match
+    cmp.w   #15,d1
+    bne.s   .literals
+    bsr.s   .length
+.literals:
+    subq.l  #1,d1
+.literal_loop:
+    move.b  (a0)+,(a1)+
+    dbf     d1,.literal_loop
+    sub.l   #$10000,d1          ; dbf counts 16 bits
+    bpl.s   .literal_loop
+    cmp.l   a2,a0
+    bhs.s   .end                ; Last sequence
+
+.match:
+    moveq   #0,d2
+    move.b  (a0)+,d2            ; offset, low byte first
+    moveq   #0,d3
+    move.b  (a0)+,d3
+    lsl.w   #8,d3
+    or.w    d3,d2
+    beq.s   .error              ; Offset 0 is invalid
+    move.l  a1,a3
+    sub.l   d2,a3               ; a3 = match source
+
+    moveq   #15,d1
+    and.w   d0,d1               ; match length - 4
+    cmp.w   #15,d1
+    bne.s   .match_copy
+    bsr.s   .length
+.match_copy:
+    addq.l  #3,d1               ; + 4, - 1 for dbf
+.match_loop:
+    move.b  (a3)+,(a1)+         ; Bytewise: matches may overlap
+    dbf     d1,.match_loop
+    sub.l   #$10000,d1
+    bpl.s   .match_loop
+    cmp.l   a2,a0
+    blo.s   .sequence
+
+.end:
+    cmp.l   a2,a0
+    bne.s   .error
+    moveq   #0,d0
+    rts
+
+.error:
+    moveq   #-1,d0
+    rts
+
+; Add continuation bytes to d1
+.length:
+    moveq   #0,d2
+.length_loop:
+    move.b  (a0)+,d2
+    add.l   d2,d1
+    cmp.b   #255,d2
+    beq.s   .length_loop
+    rts
@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+"""
+Address-to-symbol lookup for kick.rom and SYSTEM.BIN.
+
+Usage: python3 symbols.py ADDR...            Resolve addresses (hex, $ optional)
+       python3 symbols.py --annotate < FILE  Add <symbol+offset> after $ADDRs
+       python3 symbols.py --list
+
+Symbols come from the vasm listing of the ROM (src/rom/Makefile writes
+build/kick.lst) and the vlink map of the kernel (src/kernel/Makefile
+writes build/SYSTEM.map; SYSTEM.BIN is linked at $200000, see kernel.ld).
+Parsing them is slow next to a lookup, so each index is cached under
+build/symbols/ keyed by a hash of the binary it describes; a rebuilt
+ROM or kernel gets a fresh index, an unchanged one loads in
+milliseconds. Lookups bisect a sorted address list and are memoised,
+so annotating a dump with thousands of addresses stays cheap.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+from bisect import bisect_right
+
+ROM_IMAGE = 'src/rom/build/kick.rom'
+ROM_LISTING = 'src/rom/build/kick.lst'
+ROM_BASE = 0xFC0000             # org in bootstrap.s
+KERNEL_IMAGE = 'src/kernel/build/SYSTEM.BIN'
+KERNEL_MAP = 'src/kernel/build/SYSTEM.map'
+KERNEL_BASE = 0x200000          # kernel.ld
+KERNEL_END_SYMBOL = '__end'     # End of .bss, from kernel.ld
+CACHE_DIR = 'build/symbols'
+CACHE_VERSION = 1
+
+# vasm listing, "Symbols by name": name, then section/type letter and value
+_LISTING_NAME_RE = re.compile(r'^(\S+)\s+[A-Z]+:([0-9A-Fa-f]{8})\s*$')
+# vasm listing "Symbols by value", or any plain "ADDR name" line
+_VALUE_NAME_RE = re.compile(r'^\s*(?:0x)?([0-9A-Fa-f]{8})\s+([A-Za-z_.$][\w.$]*)\s*$')
+# vlink map: "  0x00200000 _start: global reloc, value 0x200000, size 0"
+_MAP_SYMBOL_RE = re.compile(r'^\s*0x([0-9A-Fa-f]+)\s+([A-Za-z_.$][\w.$]*):')
+# $XXXXXXXX as the ROM prints addresses
+_ADDRESS_RE = re.compile(r'\$([0-9A-Fa-f]{8})\b')
+_PARTIAL_RE = re.compile(r'\$[0-9A-Fa-f]{0,8}$')
+
+
+def file_hash(path):
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 16), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def parse_listing(text):
+    """{name: address} from a vasm listing's symbol tables"""
+    symbols = {}
+    for line in text.splitlines():
+        match = _LISTING_NAME_RE.match(line)
+        if match:
+            symbols[match.group(1)] = int(match.group(2), 16)
+            continue
+        match = _VALUE_NAME_RE.match(line)
+        if match:
+            symbols.setdefault(match.group(2), int(match.group(1), 16))
+    return symbols
+
+
+def parse_map(text):
+    """{name: address} from a vlink map, without vbcc's leading underscore"""
+    symbols = {}
+    for line in text.splitlines():
+        match = _MAP_SYMBOL_RE.match(line) or _VALUE_NAME_RE.match(line)
+        if not match:
+            continue
+        addr, name = match.group(1), match.group(2)
+        if name.startswith('_'):
+            name = name[1:]         # vbcc prefixes C names with _
+        symbols.setdefault(name, int(addr, 16))
+    return symbols
+
+
+def _preferred(name):
+    """Rank for names sharing an address: labels before EQU constants"""
+    return (name.isupper(), name.startswith('.'), len(name))
+
+
+class SymbolTable:
+    """Sorted symbols covering [start, end); lookups by bisect"""
+
+    def __init__(self, symbols, start, end):
+        by_addr = {}
+        for name, addr in symbols.items():
+            if start <= addr < end:
+                if addr not in by_addr or _preferred(name) < _preferred(by_addr[addr]):
+                    by_addr[addr] = name
+        self.addrs = sorted(by_addr)
+        self.names = [by_addr[addr] for addr in self.addrs]
+        self.start = start
+        self.end = end
+
+    def __len__(self):
+        return len(self.addrs)
+
+    def lookup(self, addr):
+        """(name, offset) of the symbol at or below addr, or None"""
+        if not self.start <= addr < self.end:
+            return None
+        i = bisect_right(self.addrs, addr) - 1
+        if i < 0:
+            return None
+        return self.names[i], addr - self.addrs[i]
+
+    def to_json(self):
+        return {'start': self.start, 'end': self.end, 'addrs': self.addrs, 'names': self.names}
+
+    @classmethod
+    def from_json(cls, data):
+        table = cls({}, data['start'], data['end'])
+        table.addrs, table.names = data['addrs'], data['names']
+        return table
+
+
+def _cached(kind, image, build, cache_dir):
+    """SymbolTable for image, from cache_dir or built by build()"""
+    key = file_hash(image)
+    path = os.path.join(cache_dir, f'{kind}-{key}.json')
+    try:
+        with open(path) as f:
+            data = json.load(f)
+        if data.get('version') == CACHE_VERSION:
+            return SymbolTable.from_json(data)
+    except (OSError, ValueError, KeyError):
+        pass
+    table = build()
+    os.makedirs(cache_dir, exist_ok=True)
+    # Old indexes for this kind describe binaries that no longer exist
+    for old in os.listdir(cache_dir):
+        if old.startswith(f'{kind}-') and old.endswith('.json'):
+            os.remove(os.path.join(cache_dir, old))
+    with open(path + '.tmp', 'w') as f:
+        json.dump(dict(table.to_json(), version=CACHE_VERSION), f)
+    os.replace(path + '.tmp', path)
+    return table
+
+
+def rom_table(image=ROM_IMAGE, listing=ROM_LISTING, cache_dir=CACHE_DIR):
+    """Symbols for kick.rom, or None if it or its listing is missing"""
+    if not (os.path.exists(image) and os.path.exists(listing)):
+        return None
+
+    def build():
+        with open(listing, errors='replace') as f:
+            symbols = parse_listing(f.read())
+        return SymbolTable(symbols, ROM_BASE, ROM_BASE + os.path.getsize(image))
+    return _cached('rom', image, build, cache_dir)
+
+
+def kernel_table(image=KERNEL_IMAGE, map_file=KERNEL_MAP, cache_dir=CACHE_DIR):
+    """Symbols for SYSTEM.BIN (text through bss), or None if missing"""
+    if not (os.path.exists(image) and os.path.exists(map_file)):
+        return None
+
+    def build():
+        with open(map_file, errors='replace') as f:
+            symbols = parse_map(f.read())
+        end = symbols.get(KERNEL_END_SYMBOL[1:])     # parse_map drops one underscore
+        end = max(end or 0, KERNEL_BASE + os.path.getsize(image))
+        return SymbolTable(symbols, KERNEL_BASE, end)
+    return _cached('kernel', image, build, cache_dir)
+
+
+class Symbols:
+    """ROM and kernel tables together, with memoised formatting"""
+
+    def __init__(self, tables):
+        self.tables = [table for table in tables if table]
+        self.memo = {}
+
+    def __len__(self):
+        return sum(len(table) for table in self.tables)
+
+    def lookup(self, addr):
+        for table in self.tables:
+            found = table.lookup(addr)
+            if found:
+                return found
+        return None
+
+    def describe(self, addr):
+        """'name' or 'name+$offset' for addr, or None"""
+        if addr in self.memo:
+            return self.memo[addr]
+        found = self.lookup(addr)
+        text = None
+        if found:
+            name, offset = found
+            text = f"{name}+${offset:X}" if offset else name
+        self.memo[addr] = text
+        return text
+
+    def annotate(self, text):
+        """Follow each $XXXXXXXX in text that hits a symbol with <name+$off>"""
+        def replace(match):
+            described = self.describe(int(match.group(1), 16))
+            return f"{match.group(0)} <{described}>" if described else match.group(0)
+        return _ADDRESS_RE.sub(replace, text)
+
+
+def load_symbols(rom=ROM_IMAGE, kernel=KERNEL_IMAGE, cache_dir=CACHE_DIR):
+    """Symbols for whatever has been built; empty if nothing has"""
+    return Symbols([rom_table(rom, os.path.splitext(rom)[0] + '.lst', cache_dir),
+                    kernel_table(kernel, os.path.splitext(kernel)[0] + '.map', cache_dir)])
+
+
+class StreamAnnotator:
+    """annotate() for text arriving in chunks
+
+    Holds back a trailing '$' and up to eight hex digits until the next
+    chunk shows whether it is a complete address.
+    """
+
+    def __init__(self, symbols):
+        self.symbols = symbols
+        self.pending = ''
+
+    def feed(self, text):
+        text = self.pending + text
+        match = _PARTIAL_RE.search(text)
+        if match:
+            text, self.pending = text[:match.start()], text[match.start():]
+        else:
+            self.pending = ''
+        return self.symbols.annotate(text)
+
+    def flush(self):
+        text, self.pending = self.pending, ''
+        return self.symbols.annotate(text)
+
+
+def parse_address(text):
+    return int(text.lstrip('$').removeprefix('0x'), 16)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Resolve addresses to ROM and kernel symbols")
+    parser.add_argument('addresses', nargs='*', type=parse_address)
+    parser.add_argument('--rom-image', default=ROM_IMAGE)
+    parser.add_argument('--kernel-image', default=KERNEL_IMAGE)
+    parser.add_argument('--annotate', action='store_true', help='annotate stdin')
+    parser.add_argument('--list', action='store_true', help='print the index')
+    args = parser.parse_args()
+
+    symbols = load_symbols(args.rom_image, args.kernel_image)
+    if not symbols.tables:
+        print("No symbols: build the ROM (kick.lst) or kernel (SYSTEM.map) first")
+        return 1
+
+    if args.annotate:
+        stream = StreamAnnotator(symbols)
+        for line in sys.stdin:
+            sys.stdout.write(stream.feed(line))
+        sys.stdout.write(stream.flush())
+    elif args.list:
+        for table in symbols.tables:
+            for addr, name in zip(table.addrs, table.names):
+                print(f"${addr:08X} {name}")
+    else:
+        for addr in args.addresses:
+            print(f"${addr:08X} {symbols.describe(addr) or '?'}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -2,106 +2,93 @@
 """
 Test script for IDE sector read functionality.
 Launches FS-UAE with A600 config and connects to serial port to verify output.
+
+The ROM reads the RDB, the partition and the FAT16 boot sector and root
+directory over IDE before it loads SYSTEM.BIN; "FAT16: Found!" means
+every one of those reads came back right.
 """
 
-import subprocess
-import time
-import socket
+import asyncio
+import re
 import sys
-import os
-import signal
 
-def run_test():
+from debugger_client import DebuggerError, DebuggerTimeout
+from emulator import Emulator
+
+# load_system_bin (filesystem.s) and find_rdb (partition.s) failures
+_ERROR_RE = re.compile(r"(?:FAT16: ERROR - |RDB: Error reading block )[^\r\n]*")
+
+def check_ide_output(output_str):
+    """Look for the FAT16 loader's result in boot output; return (passed, message)."""
+    if "FAT16: Found!" in output_str:
+        return True, "FAT16 loader found SYSTEM.BIN"
+    error = _ERROR_RE.search(output_str)
+    if error:
+        return False, error.group(0)
+    elif "RDB: Not found" in output_str:
+        return False, "No RDB on the drive"
+    elif "IDE:" in output_str or "RDB:" in output_str or "FAT16:" in output_str:
+        return False, "IDE messages received but no clear result"
+    else:
+        return False, "No IDE messages in output"
+
+async def case_boot_output(dbg):
+    """Check the boot log of an already running session."""
+    return check_ide_output(dbg.boot_log)
+
+CASES = [
+    ("IDE sector read at boot", case_boot_output),
+]
+
+async def run_test():
     """Run the IDE test and capture serial output."""
 
-    # Start FS-UAE in the background
+    # Start FS-UAE on its own instance config, HDF copy and serial port
     print("Starting FS-UAE with A600 configuration...")
-    config_path = os.path.join(os.getcwd(), "configs/a600.fs-uae")
-    emulator = subprocess.Popen(
-        ["/Applications/FS-UAE.app/Contents/MacOS/fs-uae", config_path],
-        stdout=subprocess.DEVNULL,
-        stderr=subprocess.DEVNULL
-    )
-
-    # Give emulator time to start
-    time.sleep(2)
+    emulator = Emulator(0)
+    await emulator.start()
 
+    dbg = None
     try:
-        # Connect to serial port
-        print("Connecting to serial port (localhost:5555)...")
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-
-        # Try to connect with retries
-        for i in range(10):
-            try:
-                sock.connect(('localhost', 5555))
-                print("Connected to serial port!")
-                break
-            except ConnectionRefusedError:
-                if i == 9:
-                    raise
-                time.sleep(1)
+        # Connect as soon as the ROM banner is up; boot output stays buffered
+        print(f"Connecting to serial port (localhost:{emulator.port})...")
+        dbg, progress = await emulator.connect(until='rom')
+        print(f"Connected to serial port! ({progress})")
 
         # Read serial output for up to 10 seconds
         print("\n--- Serial Output ---")
-        sock.settimeout(1.0)
-        start_time = time.time()
         output = b""
-
-        while time.time() - start_time < 10:
-            try:
-                data = sock.recv(1024)
-                if data:
-                    output += data
-                    print(data.decode('ascii', errors='replace'), end='', flush=True)
-
-                    # Check if we got the IDE test output
-                    if b"IDE:" in output:
-                        # Give it a bit more time to finish
-                        time.sleep(1)
-                        break
-            except socket.timeout:
-                continue
+        try:
+            # Stop at the end of the "FAT16: Found!" line
+            output = await dbg.read_until(b"FAT16: Found!", timeout=10) + b"FAT16: Found!"
+            output += await dbg.read_until(b"\n", timeout=1) + b"\n"
+        except DebuggerTimeout as e:
+            output += e.partial
+        except DebuggerError as e:
+            print(f"\n{e}")
+            output += bytes(dbg.buffer)
+        print(output.decode('ascii', errors='replace'), end='', flush=True)
 
         print("\n--- End Serial Output ---\n")
 
         # Analyze output
         output_str = output.decode('ascii', errors='replace')
 
-        if "IDE: FAT16 signature valid!" in output_str:
-            print("✓ SUCCESS: FAT16 signature verified!")
-            return True
-        elif "IDE: Invalid signature:" in output_str:
-            print("✗ FAIL: Invalid FAT16 signature")
-            return False
-        elif "IDE: Timeout" in output_str:
-            print("✗ FAIL: IDE timeout (no drive or drive not responding)")
-            return False
-        elif "IDE:" in output_str:
-            print("? PARTIAL: IDE messages received but no clear result")
-            return False
-        else:
-            print("✗ FAIL: No IDE messages in output")
-            return False
-
-    except Exception as e:
+        passed, message = check_ide_output(output_str)
+        print(f"{'✓ SUCCESS' if passed else '✗ FAIL'}: {message}")
+        return passed
+
+    except (DebuggerError, OSError) as e:
         print(f"Error: {e}")
         return False
     finally:
         # Clean up
-        try:
-            sock.close()
-        except:
-            pass
+        if dbg:
+            await dbg.close()
 
         print("\nStopping emulator...")
-        emulator.terminate()
-        try:
-            emulator.wait(timeout=5)
-        except subprocess.TimeoutExpired:
-            emulator.kill()
-            emulator.wait()
+        await emulator.stop()
 
 if __name__ == "__main__":
-    success = run_test()
+    success = asyncio.run(run_test())
     sys.exit(0 if success else 1)
@@ -2,25 +2,173 @@
 """
 Test script to verify memory configuration using the debugger.
 Tests that Zorro II autoconfig and memory detection work correctly.
+
+Usage: python3 test_memory_config.py [--stub]
+  --stub  Run against debugger_stub.py instead of FS-UAE
 """
 
-import socket
+import asyncio
 import subprocess
 import sys
-import time
 import os
 import signal
+import struct
+import time
+
+from debugger_client import wait_ready, DebuggerError, DEFAULT_PORT
+from debugger_stub import start_stub
+
+# build_memory_table (memory.s): 12-byte MemEntry records at MEMMAP_TABLE
+MEMMAP_TABLE = 0x3250
+MEMMAP_SIZE = 432
+MEMENTRY = struct.Struct('>LLHH')
+MEM_TYPE_END = 0
+MEM_TYPE_CHIP = 1
+MEM_TYPE_FAST = 2
+MEM_TYPE_ROM = 5
+MEM_TYPE_RESERVED = 6
+
+KERNEL_CHIP = 0x4000
+CHIP_SIZE = 0x100000            # chip_memory = 1024 in configs/*.fs-uae
+SLOW_BASE = 0xC00000
+SLOW_END = 0xDC0000
+FAST_BASE = 0x200000
+FAST_SIZE = 0x100000            # fast_memory = 1024 in configs/*.fs-uae
+KERNEL_STACK = 0x2000
+ROM_START = 0xFC0000
+ROM_SIZE = 0x40000
+
+async def read_long(dbg, address):
+    """Read one longword through m.l."""
+    data = await dbg.read_mem(address, 'l')
+    return int.from_bytes(data[:4], 'big')
+
+async def read_memory_map(dbg):
+    """MemEntry records (base, size, type, flags) up to the terminator."""
+    data = await dbg.read_memory(MEMMAP_TABLE, MEMMAP_SIZE)
+    entries = []
+    for base, size, mem_type, flags in MEMENTRY.iter_unpack(data):
+        if mem_type == MEM_TYPE_END:
+            break
+        entries.append((base, size, mem_type, flags))
+    return entries
+
+def memory_map_case(check):
+    """Test the memory map build_memory_table leaves at MEMMAP_TABLE."""
+    async def case(dbg):
+        try:
+            entries = await read_memory_map(dbg)
+        except DebuggerError as e:
+            return False, f"Error reading memory map: {e}"
+        return check(entries)
+    return case
+
+def find_entry(entries, mem_type):
+    return next((entry for entry in entries if entry[2] == mem_type), None)
+
+def check_chip(entries):
+    # 1MB chip RAM (chip_memory = 1024), below KERNEL_CHIP reserved
+    entry = find_entry(entries, MEM_TYPE_CHIP)
+    if entry is None:
+        return False, "No chip RAM entry"
+    base, size = entry[:2]
+    if (base, size) == (KERNEL_CHIP, CHIP_SIZE - KERNEL_CHIP):
+        return True, f"Chip RAM ${base:08X}-${base + size - 1:08X}"
+    return False, f"Expected ${KERNEL_CHIP:08X}+${CHIP_SIZE - KERNEL_CHIP:X}, got ${base:08X}+${size:X}"
+
+def check_no_slow(entries):
+    # The ROM does not size slow RAM at $C00000
+    slow = [entry for entry in entries if SLOW_BASE <= entry[0] < SLOW_END]
+    if not slow:
+        return True, "No slow RAM entry"
+    return False, f"Unexpected entry at ${slow[0][0]:08X}"
+
+def check_fast(entries):
+    # 1MB Zorro II board autoconfigured at $200000, less the kernel stack
+    entry = find_entry(entries, MEM_TYPE_FAST)
+    if entry is None:
+        return False, "No fast RAM entry"
+    base, size = entry[:2]
+    if (base, size) == (FAST_BASE, FAST_SIZE - KERNEL_STACK):
+        return True, f"Fast RAM ${base:08X}-${base + size - 1:08X}"
+    return False, f"Expected ${FAST_BASE:08X}+${FAST_SIZE - KERNEL_STACK:X}, got ${base:08X}+${size:X}"
+
+def check_kernel_stack(entries):
+    # Top 8KB of fast RAM is reserved for the kernel stack
+    entry = find_entry(entries, MEM_TYPE_FAST)
+    if entry is None:
+        return False, "No fast RAM entry"
+    top = entry[0] + entry[1]
+    if (top, KERNEL_STACK, MEM_TYPE_RESERVED) in [entry[:3] for entry in entries]:
+        return True, f"Kernel stack ${top:08X}-${top + KERNEL_STACK - 1:08X}"
+    return False, f"No 8KB reserved entry at ${top:08X}"
+
+def memory_write_case(address, test_value):
+    """Test writing and reading back from memory."""
+    async def case(dbg):
+        try:
+            await dbg.write_mem(address, test_value, 'l')
+            actual_value = await read_long(dbg, address)
+        except DebuggerError as e:
+            return False, str(e)
+        if actual_value == test_value:
+            return True, f"Write persisted (${actual_value:08X})"
+        return False, f"Expected ${test_value:08X}, got ${actual_value:08X}"
+    return case
+
+def check_layout(entries):
+    # build_memory_table: vectors, chip, fast, kernel stack, ROM, in that order
+    types = [entry[2] for entry in entries]
+    expected = [MEM_TYPE_RESERVED, MEM_TYPE_CHIP, MEM_TYPE_FAST, MEM_TYPE_RESERVED, MEM_TYPE_ROM]
+    if types != expected:
+        return False, f"Entry types {types}, expected {expected}"
+    if entries[0][:2] != (0, KERNEL_CHIP):
+        return False, f"Vectors entry ${entries[0][0]:08X}+${entries[0][1]:X}"
+    if entries[-1][:2] != (ROM_START, ROM_SIZE):
+        return False, f"ROM entry ${entries[-1][0]:08X}+${entries[-1][1]:X}"
+    return True, f"{len(entries)} entries and a terminator"
+
+SECTIONS = [
+    ("TESTING MEMORY MAP ENTRIES", [
+        ("Chip RAM entry", memory_map_case(check_chip)),
+        ("No slow RAM entry", memory_map_case(check_no_slow)),
+        ("Fast RAM entry at $00200000", memory_map_case(check_fast)),
+        ("Kernel stack at the top of fast RAM", memory_map_case(check_kernel_stack)),
+    ]),
+    ("TESTING FAST RAM ACCESS", [
+        # Fast RAM base, middle and last longword below the kernel stack
+        # of the 1MB board (fast_memory = 1024)
+        ("Write/Read test at $00200000", memory_write_case(0x200000, 0xDEADBEEF)),
+        ("Write/Read test at $00280000", memory_write_case(0x280000, 0xCAFEBABE)),
+        ("Write/Read test at $002FDFFC", memory_write_case(0x2FDFFC, 0x12345678)),
+    ]),
+    ("TESTING MEMORY MAP", [
+        ("Memory map layout", memory_map_case(check_layout)),
+    ]),
+]
+
+# Flat case list for run_tests.py
+CASES = [case for _, cases in SECTIONS for case in cases]
 
 class DebuggerTest:
-    def __init__(self):
+    def __init__(self, use_stub=False):
+        self.use_stub = use_stub
         self.emulator_proc = None
-        self.sock = None
+        self.stub = None
+        self.port = DEFAULT_PORT
+        self.launched = None
+        self.dbg = None
         self.test_count = 0
         self.pass_count = 0
         self.fail_count = 0
 
-    def start_emulator(self):
-        """Start FS-UAE emulator."""
+    async def start_emulator(self):
+        """Start FS-UAE emulator (or the stub)."""
+        self.launched = time.monotonic()
+        if self.use_stub:
+            print("Starting debugger stub...")
+            self.stub, self.port = await start_stub()
+            return
         print("Starting FS-UAE...")
         # Start FS-UAE via make run
         self.emulator_proc = subprocess.Popen(
@@ -29,168 +177,35 @@ class DebuggerTest:
             stderr=subprocess.DEVNULL,
             preexec_fn=os.setsid  # Create new process group for clean shutdown
         )
-        # Give it time to start
-        time.sleep(4)
 
-    def connect_debugger(self):
+    async def connect_debugger(self):
         """Connect to the debugger serial port."""
         print("Connecting to debugger...", end='', flush=True)
-        max_retries = 10
-        for i in range(max_retries):
-            try:
-                # Create new socket for each attempt
-                if self.sock:
-                    try:
-                        self.sock.close()
-                    except:
-                        pass
-                self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                self.sock.connect(('localhost', 5555))
-                print(" Connected!")
-                # Wait for prompt
-                time.sleep(1)
-                # Clear initial output
-                self.sock.settimeout(0.5)
-                try:
-                    while True:
-                        self.sock.recv(4096)
-                except socket.timeout:
-                    pass
-                self.sock.settimeout(5.0)
-                return True
-            except (ConnectionRefusedError, OSError) as e:
-                if i < max_retries - 1:
-                    print('.', end='', flush=True)
-                    time.sleep(1)
-                else:
-                    print(f" Failed! Error: {e}")
-                    return False
-        return False
-
-    def send_command(self, cmd):
-        """Send a command and get response."""
-        self.sock.sendall((cmd + '\n').encode())
-        time.sleep(0.3)
-        response = b''
-        self.sock.settimeout(1.0)
-        try:
-            while True:
-                chunk = self.sock.recv(4096)
-                if not chunk:
-                    break
-                response += chunk
-        except socket.timeout:
-            pass
-        self.sock.settimeout(5.0)
-        return response.decode('ascii', errors='replace')
-
-    def test_memory_var(self, name, address, expected_value):
-        """Test a memory variable has the expected value."""
-        self.test_count += 1
-        print(f"\nTest {self.test_count}: {name} at ${address:08X}")
-
-        cmd = f"m.l ${address:X}"
-        response = self.send_command(cmd)
-        print(f"  Command: {cmd}")
-        print(f"  Response: {response.strip()}")
-
-        # Extract hex value from response (format: $XXXXXXXX: $YYYYYYYY)
-        try:
-            # Look for pattern like "$XXXXXXXX: $YYYYYYYY"
-            if ':' in response:
-                value_str = response.split(':')[1].strip().split()[0]
-                # Remove $ if present
-                value_str = value_str.replace('$', '')
-                actual_value = int(value_str, 16)
-
-                if actual_value == expected_value:
-                    print(f"  ✓ PASS: {name} = ${actual_value:08X}")
-                    self.pass_count += 1
-                    return True
-                else:
-                    print(f"  ✗ FAIL: Expected ${expected_value:08X}, got ${actual_value:08X}")
-                    self.fail_count += 1
-                    return False
-            else:
-                print(f"  ✗ FAIL: Could not parse response")
-                self.fail_count += 1
-                return False
-        except (ValueError, IndexError) as e:
-            print(f"  ✗ FAIL: Error parsing response: {e}")
-            self.fail_count += 1
-            return False
-
-    def test_memory_write(self, address, test_value):
-        """Test writing and reading back from memory."""
-        self.test_count += 1
-        print(f"\nTest {self.test_count}: Write/Read test at ${address:08X}")
-
-        # Write value
-        cmd = f"m ${address:X} {test_value:X}"
-        response = self.send_command(cmd)
-        print(f"  Write: {cmd}")
-
-        # Read back
-        cmd = f"m.l ${address:X}"
-        response = self.send_command(cmd)
-        print(f"  Read: {cmd}")
-        print(f"  Response: {response.strip()}")
-
         try:
-            if ':' in response:
-                value_str = response.split(':')[1].strip().split()[0]
-                value_str = value_str.replace('$', '')
-                actual_value = int(value_str, 16)
-
-                if actual_value == test_value:
-                    print(f"  ✓ PASS: Write persisted (${actual_value:08X})")
-                    self.pass_count += 1
-                    return True
-                else:
-                    print(f"  ✗ FAIL: Expected ${test_value:08X}, got ${actual_value:08X}")
-                    self.fail_count += 1
-                    return False
-            else:
-                print(f"  ✗ FAIL: Could not parse response")
-                self.fail_count += 1
-                return False
-        except (ValueError, IndexError) as e:
-            print(f"  ✗ FAIL: Error parsing response: {e}")
-            self.fail_count += 1
-            return False
-
-    def test_memory_map(self):
-        """Test reading the memory map."""
-        self.test_count += 1
-        print(f"\nTest {self.test_count}: Memory map")
-
-        cmd = "m $3250"
-        response = self.send_command(cmd)
-        print(f"  Command: {cmd}")
-        print(f"  Response:")
-        for line in response.split('\n')[:10]:
-            if line.strip():
-                print(f"    {line}")
-
-        # Just check we got some response
-        if len(response) > 50:
-            print(f"  ✓ PASS: Memory map retrieved")
-            self.pass_count += 1
+            # Returns once boot output up to the first prompt is consumed
+            self.dbg, progress = await wait_ready(port=self.port, started=self.launched)
+            print(f" Connected! ({progress})")
             return True
-        else:
-            print(f"  ✗ FAIL: Memory map too short")
-            self.fail_count += 1
+        except (DebuggerError, OSError) as e:
+            print(f" Failed! Error: {e}")
             return False
 
-    def cleanup(self):
+    async def send_command(self, cmd):
+        """Send a command and get response."""
+        return await self.dbg.command(cmd)
+
+    async def cleanup(self):
         """Clean up resources."""
         print("\nCleaning up...")
-        if self.sock:
+        if self.dbg:
             try:
-                self.send_command('q')
+                await self.send_command('q')
             except:
                 pass
-            self.sock.close()
+            await self.dbg.close()
+        if self.stub:
+            self.stub.close()
+            await self.stub.wait_closed()
         if self.emulator_proc:
             self.emulator_proc.terminate()
             try:
@@ -198,52 +213,33 @@ class DebuggerTest:
             except subprocess.TimeoutExpired:
                 self.emulator_proc.kill()
 
-    def run_tests(self):
+    async def run_tests(self):
         """Run all memory configuration tests."""
         print("=" * 60)
         print("MEMORY CONFIGURATION TEST")
         print("=" * 60)
 
         try:
-            self.start_emulator()
-            if not self.connect_debugger():
+            await self.start_emulator()
+            if not await self.connect_debugger():
                 print("Failed to connect to debugger")
                 return False
 
-            print("\n" + "=" * 60)
-            print("TESTING MEMORY VARIABLES")
-            print("=" * 60)
-
-            # Test chip RAM (should be 1MB = $100000)
-            self.test_memory_var("CHIP_RAM_VAR", 0x460, 0x100000)
-
-            # Test slow RAM (should be 0)
-            self.test_memory_var("SLOW_RAM_VAR", 0x464, 0x000000)
-
-            # Test fast RAM size (should be 8MB = $800000)
-            self.test_memory_var("FAST_RAM_VAR", 0x468, 0x800000)
-
-            # Test fast RAM base (should be $200000 after autoconfig)
-            self.test_memory_var("FAST_RAM_BASE", 0x46C, 0x200000)
-
-            print("\n" + "=" * 60)
-            print("TESTING FAST RAM ACCESS")
-            print("=" * 60)
-
-            # Test writing to fast RAM base
-            self.test_memory_write(0x200000, 0xDEADBEEF)
-
-            # Test writing to fast RAM at +1MB
-            self.test_memory_write(0x300000, 0xCAFEBABE)
-
-            # Test writing to fast RAM at +7MB (near end)
-            self.test_memory_write(0x900000, 0x12345678)
-
-            print("\n" + "=" * 60)
-            print("TESTING MEMORY MAP")
-            print("=" * 60)
-
-            self.test_memory_map()
+            for section, cases in SECTIONS:
+                print("\n" + "=" * 60)
+                print(section)
+                print("=" * 60)
+
+                for name, case in cases:
+                    self.test_count += 1
+                    print(f"\nTest {self.test_count}: {name}")
+                    passed, message = await case(self.dbg)
+                    if passed:
+                        print(f"  ✓ PASS: {message}")
+                        self.pass_count += 1
+                    else:
+                        print(f"  ✗ FAIL: {message}")
+                        self.fail_count += 1
 
             print("\n" + "=" * 60)
             print("TEST SUMMARY")
@@ -260,11 +256,11 @@ class DebuggerTest:
                 return False
 
         finally:
-            self.cleanup()
+            await self.cleanup()
 
 def main():
-    tester = DebuggerTest()
-    success = tester.run_tests()
+    tester = DebuggerTest(use_stub='--stub' in sys.argv[1:])
+    success = asyncio.run(tester.run_tests())
     return 0 if success else 1
 
 if __name__ == '__main__':
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""Test serial_reader's capture index and queries, no emulator needed
+
+Usage: python3 test_serial_reader.py
+
+Each case writes a small SerialLog in a temporary directory and checks
+what LogQuery reads back.
+"""
+
+import os
+import sys
+import tempfile
+
+from serial_reader import SerialLog, LogQuery
+
+# The ROM ends lines with LF CR (dc.b ...,10,13), kprintf with CR LF
+ROM_LINES = [b"AMAG ROM v0.1\n\r", b"Memory Map:\n\r", b"IDE: bar\n\r"]
+KERNEL_LINES = [b"[    0.001] foo bar\r\n", b"[    0.002] bar foo\r\n"]
+
+def write_log(directory, chunks):
+    """Capture chunks, one timestamp each; return the log path"""
+    path = os.path.join(directory, 'serial.log')
+    with SerialLog(path) as log:
+        for stamp, chunk in enumerate(chunks):
+            log.write(chunk, 1000.0 + stamp)
+    return path
+
+def grep(directory, pattern):
+    with LogQuery(write_log(directory, ROM_LINES + KERNEL_LINES)) as log:
+        return [text for _, _, text in log.grep(pattern)]
+
+def case_anchor_end(directory):
+    found = grep(directory, rb'bar$')
+    expected = ["IDE: bar", "[    0.001] foo bar"]
+    return found == expected, f"bar$ matched {found}"
+
+def case_anchor_start(directory):
+    found = grep(directory, r'^(Memory|\[)')
+    expected = ["Memory Map:", "[    0.001] foo bar", "[    0.002] bar foo"]
+    return found == expected, f"^ matched {found}"
+
+def case_whole_line(directory):
+    found = grep(directory, rb'^AMAG ROM v0\.1$')
+    return found == ["AMAG ROM v0.1"], f"^...$ matched {found}"
+
+def case_no_match_across_lines(directory):
+    found = grep(directory, rb'foo\s+\[')
+    return found == [], f"matched across a line break: {found}"
+
+def case_time_range(directory):
+    path = write_log(directory, ROM_LINES + KERNEL_LINES)
+    with LogQuery(path) as log:
+        found = [n for _, n, _ in log.grep(rb'bar', 1003.0, 1005.0)]
+    return found == [4], f"lines {found} in [3s, 5s)"
+
+CASES = [
+    ("$ matches before LF CR and CR LF", case_anchor_end),
+    ("^ matches after a leading CR", case_anchor_start),
+    ("^ and $ around a whole ROM line", case_whole_line),
+    ("Matches stay within a line", case_no_match_across_lines),
+    ("grep within a time range", case_time_range),
+]
+
+def main():
+    failed = 0
+    for name, case in CASES:
+        with tempfile.TemporaryDirectory() as directory:
+            passed, message = case(directory)
+        if passed:
+            print(f"✓ {name}")
+        else:
+            print(f"✗ {name}: {message}")
+            failed += 1
+    print(f"\n{len(CASES) - failed}/{len(CASES)} passed")
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
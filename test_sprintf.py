@@ -2,11 +2,68 @@
 """Test sprintf implementation in the ROM"""
 
 import subprocess
+import select
 import time
 import os
 import signal
 import sys
 
+from debugger_client import BOOT_STAGES, READY_TIMEOUT
+
+# Boot output is complete once debugger_main prints its banner
+END_OF_BOOT = dict(BOOT_STAGES)['debugger']
+
+# Checks on the boot output: (name, predicate)
+BOOT_CHECKS = [
+    ("ROM boots", lambda out: "AMAG ROM" in out),
+    ("Memory map displayed", lambda out: "Memory Map:" in out),
+    ("Chip RAM detected", lambda out: ": Chip (" in out and "$" in out),
+    ("Serial working", lambda out: len(out) > 100),
+]
+
+def boot_case(check):
+    """Run a boot output check against a session's boot log"""
+    async def case(dbg):
+        passed = check(dbg.boot_log)
+        return passed, "found in boot log" if passed else "not in boot log"
+    return case
+
+CASES = [(name, boot_case(check)) for name, check in BOOT_CHECKS]
+
+def wait_for_path(path, timeout=5):
+    """Poll for path with short backoff; True once it exists"""
+    deadline = time.monotonic() + timeout
+    delay = 0.01
+    while not os.path.exists(path):
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(delay)
+        delay = min(delay * 2, 0.25)
+    return True
+
+def read_boot_output(path, timeout=READY_TIMEOUT):
+    """Read the pty until the boot finishes; return (output, seconds)"""
+    start = time.monotonic()
+    output = bytearray()
+    fd = os.open(path, os.O_RDONLY | os.O_NOCTTY)
+    try:
+        while END_OF_BOOT not in output:
+            remaining = start + timeout - time.monotonic()
+            if remaining <= 0:
+                break
+            ready, _, _ = select.select([fd], [], [], remaining)
+            if not ready:
+                break
+            data = os.read(fd, 1024)
+            if not data:
+                break
+            output += data
+            sys.stdout.buffer.write(data)
+            sys.stdout.buffer.flush()
+    finally:
+        os.close(fd)
+    return bytes(output), time.monotonic() - start
+
 def cleanup(fsuae_proc, socat_proc):
     """Clean up processes"""
     if fsuae_proc:
@@ -41,7 +98,10 @@ def main():
         stderr=subprocess.PIPE,
         stdout=subprocess.PIPE
     )
-    time.sleep(1)
+    if not wait_for_path("/tmp/ttyS0") or not wait_for_path("/tmp/ttyS1"):
+        print("ERROR: socat did not create /tmp/ttyS0 and /tmp/ttyS1")
+        cleanup(None, socat_proc)
+        return 1
 
     # Start FS-UAE
     print("Starting FS-UAE...")
@@ -58,30 +118,17 @@ def main():
     )
 
     try:
-        # Wait for emulator to start
-        time.sleep(3)
-
-        # Open serial port
+        # Open serial port; socat buffers whatever the ROM printed already
         print("\nReading serial output...")
         print("-" * 60)
 
-        with open("/tmp/ttyS0", "rb") as serial:
-            # Read for 5 seconds
-            start_time = time.time()
-            output = b""
-
-            while time.time() - start_time < 5:
-                try:
-                    data = serial.read(1024)
-                    if data:
-                        output += data
-                        sys.stdout.buffer.write(data)
-                        sys.stdout.buffer.flush()
-                except:
-                    break
-                time.sleep(0.1)
+        output, elapsed = read_boot_output("/tmp/ttyS0")
 
         print("\n" + "-" * 60)
+        if END_OF_BOOT in output:
+            print(f"Boot finished after {elapsed:.2f}s")
+        else:
+            print(f"No debugger banner after {elapsed:.2f}s")
 
         # Check for expected outputs
         output_str = output.decode('latin-1', errors='ignore')
@@ -89,12 +136,7 @@ def main():
         print("\nVerification:")
         print("=" * 60)
 
-        tests = [
-            ("ROM boots", "AMAG ROM" in output_str),
-            ("Memory map displayed", "Memory Map:" in output_str),
-            ("Chip RAM detected", "Chip RAM:" in output_str and "$" in output_str),
-            ("Serial working", len(output_str) > 100),
-        ]
+        tests = [(name, check(output_str)) for name, check in BOOT_CHECKS]
 
         passed = 0
         for test_name, result in tests:
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Check target memory against a local file, reading back only what differs.
+
+Usage: python3 verify.py [src/kernel/build/SYSTEM.BIN] [--addr 200000]
+                         [--offset 0] [--length N] [--window 8] [--show 16]
+
+Asks the ROM for the CRC-32 of the whole range (c command) and compares
+it with zlib.crc32 of the file. A range that differs is halved and both
+halves are checked again, down to 16-byte lines; each round of the
+bisection is one pipelined batch of c commands. Only the lines that
+still differ are then read back, with b. A single changed byte in 512KB
+costs about 30 CRC commands instead of 32768 m.l dumps.
+
+SYSTEM.BIN is checked at $200000 (KERNEL_LOAD_ADDR; a packed kernel is
+compared after the ROM unpacked it) and kick.rom at $FC0000. Other
+files need --addr. --offset and --length select part of the file.
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+import zlib
+
+from debugger_client import (open_debugger, DebuggerError, DEFAULT_HOST, DEFAULT_PORT,
+                             PIPELINE_WINDOW, LINE_SIZE, DEFAULT_BAUD)
+
+DEFAULT_FILE = 'src/kernel/build/SYSTEM.BIN'
+LOAD_ADDRESSES = {
+    'SYSTEM.BIN': 0x200000,     # KERNEL_LOAD_ADDR
+    'kick.rom': 0xFC0000,       # ROM_START
+}
+SHOW_LINES = 16
+
+# What one m.l line costs on the wire: echo, CR, dump and prompt
+DUMP_LINE_BYTES = 64
+
+
+def halves(addr, length):
+    """Split a range in two at a line boundary"""
+    half = max(LINE_SIZE, length // LINE_SIZE // 2 * LINE_SIZE)
+    return [(addr, half), (addr + half, length - half)]
+
+
+async def differing_lines(dbg, data, addr, window=PIPELINE_WINDOW):
+    """Bisect with CRCs; return (line ranges that differ, CRC commands sent)"""
+    pending = [(addr, len(data))]
+    lines = []
+    commands = 0
+    while pending:
+        crcs = await dbg.crc32_ranges(pending, window)
+        commands += len(pending)
+        split = []
+        for (start, length), crc in zip(pending, crcs):
+            offset = start - addr
+            if crc == zlib.crc32(data[offset:offset + length]):
+                continue
+            if length <= LINE_SIZE:
+                lines.append((start, length))
+            else:
+                split += halves(start, length)
+        pending = split
+    return sorted(lines), commands
+
+
+def runs(lines):
+    """Merge adjacent line ranges into (addr, length) runs"""
+    merged = []
+    for start, length in lines:
+        if merged and merged[-1][0] + merged[-1][1] == start:
+            merged[-1] = (merged[-1][0], merged[-1][1] + length)
+        else:
+            merged.append((start, length))
+    return merged
+
+
+def show_line(start, expected, actual):
+    marks = ''.join('^^ ' if e != a else '   ' for e, a in zip(expected, actual))
+    print(f"  ${start:08X}  file:   {expected.hex(' ').upper()}")
+    print(f"             target: {actual.hex(' ').upper()}")
+    print(f"                     {marks.rstrip()}")
+
+
+async def verify(args):
+    with open(args.file, 'rb') as f:
+        data = f.read()
+    data = data[args.offset:args.offset + args.length if args.length else None]
+    if not data:
+        print(f"✗ {args.file}: nothing to compare")
+        return 1
+    addr = args.addr
+    if addr is None:
+        addr = LOAD_ADDRESSES.get(os.path.basename(args.file))
+    if addr is None:
+        print(f"✗ No load address known for {args.file}; use --addr")
+        return 1
+    addr += args.offset
+
+    dbg = await open_debugger(args.host, args.port)
+    async with dbg:
+        await dbg.sync(timeout=10)
+        print(f"{args.file}: {len(data):,d} bytes at ${addr:08X}")
+        start = time.perf_counter()
+        lines, commands = await differing_lines(dbg, data, addr, args.window)
+        target = {}
+        for run_addr, run_length in runs(lines):
+            target[run_addr] = await dbg.read_binary(run_addr, run_length)
+        elapsed = time.perf_counter() - start
+
+    dump = len(data) / LINE_SIZE * DUMP_LINE_BYTES * 10 / DEFAULT_BAUD
+    print(f"{commands} CRC command(s), {len(lines)} line(s) read back in {elapsed:.1f}s "
+          f"(an m.l dump takes {dump:.0f}s at {DEFAULT_BAUD} baud)")
+    if not lines:
+        print("✓ Target memory matches the file")
+        return 0
+
+    differing = 0
+    shown = 0
+    for run_addr, run_data in target.items():
+        for pos in range(0, len(run_data), LINE_SIZE):
+            start = run_addr + pos
+            actual = run_data[pos:pos + LINE_SIZE]
+            expected = data[start - addr:start - addr + len(actual)]
+            differing += sum(e != a for e, a in zip(expected, actual))
+            if shown < args.show:
+                show_line(start, expected, actual)
+                shown += 1
+    if shown < len(lines):
+        print(f"  ... {len(lines) - shown} more line(s)")
+    print(f"✗ {differing} byte(s) differ in {len(lines)} line(s)")
+    return 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare target memory with a file by CRC bisection")
+    parser.add_argument('file', nargs='?', default=DEFAULT_FILE)
+    parser.add_argument('--addr', type=lambda s: int(s.lstrip('$'), 16),
+                        help='target address of the file (hex)')
+    parser.add_argument('--offset', type=lambda s: int(s, 0), default=0,
+                        help='start at this file offset')
+    parser.add_argument('--length', type=lambda s: int(s, 0), default=0,
+                        help='bytes to compare (default: to the end of the file)')
+    parser.add_argument('--window', type=int, default=PIPELINE_WINDOW,
+                        help='CRC commands in flight')
+    parser.add_argument('--show', type=int, default=SHOW_LINES,
+                        help='differing lines to print')
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    args = parser.parse_args()
+
+    try:
+        return asyncio.run(verify(args))
+    except (DebuggerError, OSError) as e:
+        print(f"Error: {e}")
+        return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())